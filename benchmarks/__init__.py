@@ -0,0 +1,2 @@
+# Run benchmarks from the repository root, e.g.
+# python -m benchmarks.float_render
@@ -0,0 +1,61 @@
+"""
+Plays through AudioStreamer (push mode, whatever output device miniaudio opens) with a producer that stalls now and
+then like the player does on a loaded machine, and compares fixed buffer targets against the adaptive one:
+how many underruns we get against how much audio sits in the buffer (i.e. latency on top of the device's period).
+"""
+import random
+import time
+from threading import Thread
+import numpy as np
+
+from tools.audioplayer import AudioStreamer
+
+RATE = 44_100
+CHANNELS = 2
+BUFFERSIZE_MS = 50
+CHUNK_LEN = 25 # ms
+SECONDS = 8
+STALL_CHANCE = 0.05 # Per chunk
+STALL_MS = (20, 90)
+
+
+def play(buffer_target_ms, adaptive):
+    stream = AudioStreamer(CHANNELS, RATE, BUFFERSIZE_MS, 16)
+    stream.adaptive = adaptive
+    stream.shrink_after = 1
+    stream.buffer_target_ms = buffer_target_ms
+    chunk = np.zeros(shape=(RATE * CHUNK_LEN // 1000, CHANNELS), dtype=np.int16).tobytes()
+    rng = random.Random(0)
+    running = True
+
+    def producer():
+        while running:
+            if rng.random() < STALL_CHANCE:
+                time.sleep(rng.uniform(*STALL_MS) / 1000)
+            stream.write(chunk)
+
+    thread = Thread(target=producer, daemon=True)
+    thread.start()
+    buffered = []
+    end = time.perf_counter() + SECONDS
+    while time.perf_counter() < end:
+        time.sleep(0.01)
+        buffered.append(stream.buffered_ms)
+    underruns = stream.underruns
+    running = False
+    thread.join(1)
+    stream.miniaudio_running = False
+    stream.playback_device.close()
+    return underruns, np.mean(buffered), stream.buffer_target_ms, stream.jitter_ms
+
+
+def main():
+    print(f"{SECONDS} s of playback, {CHUNK_LEN} ms chunks, {STALL_CHANCE:.0%} of chunks stall for {STALL_MS[0]}-{STALL_MS[1]} ms")
+    for name, target, adaptive in (("fixed 50 ms", 50, False), ("fixed 150 ms", 150, False), ("adaptive from 50 ms", 50, True)):
+        underruns, buffered, final_target, jitter = play(target, adaptive)
+        print(f"{name:>20}: {underruns:3} underruns, {buffered:5.1f} ms buffered on average "
+              f"(target at the end {final_target:.0f} ms, callback jitter {jitter:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
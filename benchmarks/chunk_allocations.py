@@ -0,0 +1,65 @@
+"""
+Counts buffer allocations per chunk along the playback path: decoder -> AudioSegment -> float32 working buffer
+-> volume -> mix with the soft limiter -> quantized output buffer -> stream buffer. After the first few chunks every buffer should come
+out of the chunk pool again, i.e. zero new allocations per chunk, and the traced memory stays flat
+(only small python objects like the AudioSegment wrappers are created per chunk).
+
+Usage: python -m benchmarks.chunk_allocations file1.wav file2.ogg file3.mp3 ...
+"""
+import os
+import sys
+import tracemalloc
+import miniaudio
+
+from tools.audioplayer import AudioDecoder
+from tools.audioprocessing import SoftLimiter, amp_to_db
+from tools.audiosegment import mix
+
+CHUNK_LEN = 50
+WARMUP_CHUNKS = 10
+
+
+def main(files):
+    decoder = AudioDecoder()
+    stream_buffer = memoryview(bytearray(1 << 20))
+
+    print(f"{'file':>24} | {'chunks':>6} {'warmup allocs':>14} {'steady allocs/chunk':>20} {'steady traced peak':>19}")
+    for file in files:
+        info = miniaudio.get_file_info(file)
+        rate = info.sample_rate
+        chunk_frame_len = round(rate * CHUNK_LEN / 1000)
+        num_chunks = -(-info.num_frames // chunk_frame_len)
+        _, file_type = os.path.splitext(file)
+        if file_type == ".wav":
+            generator = decoder.load_wav(file, 0, num_chunks, chunk_frame_len, frame_rate=rate)
+        elif file_type == ".ogg":
+            generator = decoder.load_ogg(file, 0, num_chunks, chunk_frame_len, frame_rate=rate)
+        else:
+            generator = decoder.load_mp3(file, 0, 0, num_chunks, chunk_frame_len, frame_rate=rate)
+        limiter = SoftLimiter(rate, 2)
+
+        decoder.pool.reset_stats()
+        num_chunks = 0
+        for audio in generator:
+            if num_chunks == WARMUP_CHUNKS:
+                warmup_allocations = decoder.pool.allocations
+                decoder.pool.reset_stats()
+                tracemalloc.start()
+                tracemalloc.reset_peak()
+                traced_start, _ = tracemalloc.get_traced_memory()
+            # Same steps as AudioPlayer.write_to_buffer at 1x speed with the volume turned up, so the limiter has work to do
+            audio.to_float()
+            audio = audio + amp_to_db(2)
+            data = mix([audio], limiter=limiter).buffer
+            stream_buffer[:len(data)] = data
+            num_chunks += 1
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        steady_chunks = num_chunks - WARMUP_CHUNKS
+        print(f"{os.path.basename(file):>24} | {num_chunks:>6} {warmup_allocations:>14} " + 
+              f"{decoder.pool.allocations / steady_chunks:>20.3f} {(traced_peak - traced_start) / 1024:>16.1f} KB")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
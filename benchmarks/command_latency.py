@@ -0,0 +1,54 @@
+"""
+Measures command to output latency of AudioStreamer in push and pull mode: a producer thread renders 50 ms chunks
+the way AudioPlayer.run does (check for a command after every write), and commands get issued at random times.
+The latency is the time from AudioStreamer.mark_command() until the first chunk rendered after it reaches the device,
+plus the period it then waits behind. Uses whatever output device miniaudio opens.
+"""
+import random
+import time
+from threading import Thread
+import numpy as np
+
+from tools.audioplayer import AudioStreamer
+
+RATE = 44_100
+CHANNELS = 2
+BUFFERSIZE_MS = 50
+CHUNK_LEN = 50 # ms
+COMMANDS = 20
+
+
+def measure(pull):
+    stream = AudioStreamer(CHANNELS, RATE, BUFFERSIZE_MS, 16, pull=pull)
+    t = np.arange(RATE * CHUNK_LEN // 1000) / RATE
+    chunk = (np.repeat(np.sin(2 * np.pi * 440 * t)[:, None], CHANNELS, axis=1) * 3000).astype(np.int16).tobytes()
+    running = True
+
+    def producer():
+        while running:
+            stream.write(chunk)
+
+    thread = Thread(target=producer, daemon=True)
+    thread.start()
+    time.sleep(0.5)
+    rng = random.Random(0)
+    for _ in range(COMMANDS):
+        stream.mark_command()
+        time.sleep(rng.uniform(0.3, 0.4))
+    running = False
+    thread.join(1)
+    stream.miniaudio_running = False
+    stream.playback_device.close()
+    return np.array(stream.command_latencies), stream.underruns
+
+
+def main():
+    print(f"{COMMANDS} commands, {BUFFERSIZE_MS} ms device period, {CHUNK_LEN} ms chunks")
+    for name, pull in (("push", False), ("pull", True)):
+        latencies, underruns = measure(pull)
+        print(f"{name}: mean {latencies.mean():6.1f} ms, min {latencies.min():6.1f} ms, max {latencies.max():6.1f} ms, "
+              f"{underruns} underruns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares decoding a 48 kHz mono WAV for a 44.1 kHz stereo float output the old way (int16 chunks at the file's rate,
+then to_float, upmix and StreamingResampler in Python) with AudioDecoder.sample_format = "f32" and output_rate = 44100,
+where miniaudio's ma_decoder does the format, channel and rate conversion in C.
+"""
+import os
+import tempfile
+import time
+import wave
+import numpy as np
+
+from tools.audioplayer import AudioDecoder
+from tools.audiosegment import AudioSegment
+from tools.audioprocessing import StreamingResampler
+
+FILE_RATE = 48_000
+OUTPUT_RATE = 44_100
+TRACK_LEN = 30 # s
+CHUNK_LEN = 50 # ms
+
+
+def write_test_file(path):
+    rng = np.random.default_rng(0)
+    t = np.arange(FILE_RATE * TRACK_LEN) / FILE_RATE
+    samples = 12_000 * np.sin(2 * np.pi * 440 * t) + rng.normal(0, 1_000, t.shape)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(1)
+        fp.setsampwidth(2)
+        fp.setframerate(FILE_RATE)
+        fp.writeframes(samples.astype(np.int16).tobytes())
+
+
+def decode(decoder, path):
+    chunk_frame_len = round(FILE_RATE * CHUNK_LEN / 1000)
+    num_chunks = -(-FILE_RATE * TRACK_LEN // chunk_frame_len)
+    resampler = StreamingResampler(2)
+    frames = 0
+    start = time.perf_counter()
+    for audio in decoder.load_wav(path, 0, num_chunks, chunk_frame_len, False, FILE_RATE):
+        audio.to_float()
+        if audio.frame_rate != OUTPUT_RATE:
+            audio = AudioSegment(resampler.process(audio._data, audio.frame_rate / OUTPUT_RATE), OUTPUT_RATE, 2, 2)
+        frames += len(audio._data)
+    return time.perf_counter() - start, frames
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "mono_48k.wav")
+        write_test_file(path)
+        print(f"{TRACK_LEN} s mono {FILE_RATE / 1000:g} kHz WAV -> stereo float32 at {OUTPUT_RATE / 1000:g} kHz, {CHUNK_LEN} ms chunks")
+
+        results = {}
+        for name, sample_format, output_rate in (("int16 + Python resample", None, None), ("miniaudio converters", "f32", OUTPUT_RATE)):
+            decoder = AudioDecoder()
+            decoder.sample_format = sample_format
+            decoder.output_rate = output_rate
+            decode(decoder, path) # warm up caches
+            elapsed, frames = min(decode(decoder, path) for _ in range(3))
+            results[name] = elapsed
+            print(f"{name:>24}: {elapsed * 1000:7.1f} ms ({frames} frames out, {100 * elapsed / TRACK_LEN:.2f}% of real time)")
+        old, new = results.values()
+        print(f"{'speedup':>24}: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
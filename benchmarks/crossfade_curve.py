@@ -0,0 +1,48 @@
+"""
+Measures the cost of setting up a crossfade: building step_fade's old per chunk dB table (a sum over
+the preceding chunks for every chunk, O(n^2)) against building the per sample CrossfadeCurve once
+and looking it up from the cache afterwards.
+"""
+import time
+from math import ceil
+
+from tools.audioprocessing import amp_to_db, crossfade_curve, CrossfadeCurve
+
+RATE = 44_100
+CHUNK_LEN = 50 # ms
+FADE_DURATIONS = (3_000, 12_000, 30_000) # ms
+REPEATS = 20
+
+
+def legacy_db_list(fade_duration, chunk_len):
+    fade_list = [chunk_len / fade_duration] * (fade_duration // chunk_len) + [fade_duration % chunk_len / fade_duration]
+    if fade_list[-1] == 0:
+        fade_list.pop(-1)
+    return [(amp_to_db(j[0]), amp_to_db(j[1]))
+            for j in [(1 - sum(fade_list[:i]), 1 - sum(fade_list[:i+1])) for i in range(len(fade_list))]]
+
+
+def best_of(func, *args):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter_ns()
+        func(*args)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(f"Crossfade setup with {CHUNK_LEN} ms chunks at {RATE} Hz, best of {REPEATS}")
+    print(f"{'fade':>6} {'chunks':>7} | {'dB table':>10} | {'curve build':>12} {'cached':>10}")
+    for duration in FADE_DURATIONS:
+        legacy_time = best_of(legacy_db_list, duration, CHUNK_LEN)
+        build_time = best_of(CrossfadeCurve, duration, CHUNK_LEN, "equal_power", RATE)
+        crossfade_curve(duration, CHUNK_LEN, "equal_power", RATE)
+        cached_time = best_of(crossfade_curve, duration, CHUNK_LEN, "equal_power", RATE)
+        print(f"{duration / 1000:>5.0f}s {ceil(duration / CHUNK_LEN):>7} | {legacy_time / 1000:>7.1f} us | " +
+              f"{build_time / 1000:>9.1f} us {cached_time / 1000:>7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Plays a generated track in real time into a sink that drains like a sound card with a 100 ms buffer, while the
+decoder stalls for 150 ms every 2 s (like a read from a slow network share or a disk spinning up).
+Compares decoding on the player thread (decode_queue_depth = 0) against the decode thread with a 500 ms queue,
+counting how often the device ran dry.
+
+    python -m benchmarks.decode_queue
+"""
+import os
+import tempfile
+import time
+import wave
+from threading import Thread, Lock
+import numpy as np
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosinks import AudioSink
+
+RATE = 44_100
+PLAY_SECONDS = 10
+STALL_EVERY = 40 # chunks
+STALL_MS = 150
+
+
+class RealTimeSink(AudioSink):
+    """
+    Plays out at RATE frames per second from a buffer of buffer_ms, write() waits while it's full
+    and a write that finds it empty counts as an underrun
+    """
+
+    def __init__(self, buffer_ms=100, **kwargs):
+        super().__init__(**kwargs)
+        self.buffer_ms = buffer_ms
+        self.buffered_ms = 0
+        self._last_time = None
+
+    def _drain(self):
+        now = time.perf_counter()
+        if self._last_time is not None:
+            played = (now - self._last_time) * 1000
+            if played > self.buffered_ms and self.frames_written:
+                self.underruns += 1
+            self.buffered_ms = max(self.buffered_ms - played, 0)
+        self._last_time = now
+
+    def write(self, data):
+        super().write(data)
+        self._drain()
+        self.buffered_ms += len(memoryview(data).cast("B")) / self.frame_size / self.rate * 1000
+        while self.buffered_ms > self.buffer_ms:
+            time.sleep((self.buffered_ms - self.buffer_ms) / 1000)
+            self._drain()
+
+
+def write_track(path, seconds=30):
+    t = np.arange(RATE * seconds) / RATE
+    samples = np.repeat((8_000 * np.sin(2 * np.pi * 440 * t))[:, None], 2, axis=1).astype(np.int16)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(RATE)
+        fp.writeframes(samples.tobytes())
+
+
+def stalling(load):
+    def load_with_stalls(*args, **kwargs):
+        for chunk_index, chunk in enumerate(load(*args, **kwargs)):
+            if chunk_index % STALL_EVERY == STALL_EVERY - 1:
+                time.sleep(STALL_MS / 1000)
+            yield chunk
+    return load_with_stalls
+
+
+def play(path, decode_queue_depth):
+    sink = RealTimeSink(rate=RATE)
+    player = AudioPlayer(lock=Lock(), rate=RATE, sink=sink)
+    player.decode_queue_depth = decode_queue_depth
+    player.decoder.load_wav = stalling(player.decoder.load_wav)
+    player.track_data = {0: {"file": path, "rate": RATE, "length": RATE * 30, "persistent_id": 0}}
+    player.track_id = 0
+    player.status = "playing"
+
+    thread = Thread(target=player.run, daemon=True)
+    thread.start()
+    while sink.seconds_written < PLAY_SECONDS:
+        time.sleep(0.05)
+    player.status = "stopped"
+    thread.join(5)
+    player.osc_server.shutdown()
+    player.osc_server.server_close()
+    return sink.underruns, player.decode_waits, player.decode_time_ms
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "track.wav")
+        write_track(path)
+        print(f"{PLAY_SECONDS} s in real time, decoder stalls {STALL_MS} ms every {STALL_EVERY} chunks, 100 ms device buffer")
+        for depth in (0, 500):
+            underruns, waits, decode_time = play(path, depth)
+            if not depth:
+                print(f" player thread: {underruns} underruns")
+            else:
+                print(f"{depth:>5} ms queue: {underruns} underruns, {waits} decode waits, "
+                      f"{decode_time:.2f} ms per chunk decoded (stalls included)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Compares FIRLowpassFilter's direct and overlap-save FFT backends (and what method="auto" picks) against
+the old implementation (np.apply_along_axis(np.convolve) on history + chunk concatenated every call),
+across tap counts and the chunk sizes you get from slowing audio down.
+
+Before timing anything it checks the outputs against each other: direct and FFT against a single
+np.convolve over the whole stream (tests/test_fir_filter.py asserts that part), and the old implementation
+against the new one. The old one reads its output 2 samples further along the convolution and treats the 2 samples
+past the end of each chunk as silence, so it's compared shifted by 2 samples, skipping the first chunk and the last
+2 samples of each chunk.
+
+Finally it times set_new_filter over a slider drag (0.99x to 0.5x in 0.01 steps), with empty and warm kernel caches.
+"""
+import time
+import numpy as np
+
+from tools.audioprocessing import FIRLowpassFilter, lowpass_kernel, lowpass_spectrum
+
+RATE = 44_100
+CHUNK_LEN = 50 # ms, before slowing down
+TAP_COUNTS = (51, 101, 201, 401, 1001)
+SPEEDS = (0.9, 0.75, 0.5)
+NUM_CHUNKS = 40
+
+
+class LegacyFIRLowpassFilter(FIRLowpassFilter):
+
+    def __init__(self, cutoff_freq, sample_rate=44_100, num_taps=201, num_channels=2):
+        super().__init__(cutoff_freq, sample_rate, num_taps, num_channels)
+        self.padding = np.zeros(shape=(0, num_channels))
+
+    def filter_signal(self, data: np.ndarray, dt):
+        num_samples = data.shape[0]
+        padded_data = np.concatenate([self.padding, data])
+        self.padding = padded_data[-(self.filter_len - 1):]
+        start = self.filter_len + 1
+        end = start + num_samples
+        filtered_data = np.apply_along_axis(np.convolve, 0, padded_data, self.fir_filter, mode="full")[start:end]
+        if dt is None:
+            return filtered_data
+        return np.clip(filtered_data, np.iinfo(dt).min, np.iinfo(dt).max)
+
+
+def run(filter: FIRLowpassFilter, chunks):
+    start = time.perf_counter_ns()
+    out = [filter.filter_signal(chunk, None) for chunk in chunks]
+    return (time.perf_counter_ns() - start) / len(chunks), out
+
+
+def check_equivalence(chunks, cutoff, num_taps):
+    stream = np.concatenate(chunks)
+    reference = np.stack([np.convolve(stream[:, c].astype(np.float64), FIRLowpassFilter(cutoff, RATE, num_taps).fir_filter)[:stream.shape[0]]
+                          for c in range(stream.shape[1])], axis=1)
+    errors = {}
+    for method in ("direct", "fft"):
+        _, out = run(FIRLowpassFilter(cutoff, RATE, num_taps, method=method), chunks)
+        errors[method] = np.max(np.abs(np.concatenate(out) - reference))
+
+    _, legacy = run(LegacyFIRLowpassFilter(cutoff, RATE, num_taps), chunks)
+    chunk_frames = chunks[0].shape[0]
+    legacy_error = 0
+    for i in range(1, len(chunks)):
+        start = i * chunk_frames
+        expected = reference[start + 2:start + chunk_frames]
+        legacy_error = max(legacy_error, np.max(np.abs(legacy[i][:chunk_frames - 2] - expected)))
+    errors["old"] = legacy_error
+    return errors
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"Per chunk filtering time, {CHUNK_LEN} ms chunks slowed down to the given speed")
+    print(f"{'speed':>5} {'taps':>5} | {'old':>9} {'direct':>9} {'fft':>9} {'auto':>9} ({'pick':>6}) | max error vs reference (old, direct, fft)")
+    for speed in SPEEDS:
+        chunk_frames = round(RATE * CHUNK_LEN / 1000 / speed)
+        cutoff = round(speed * RATE / 2)
+        chunks = [rng.uniform(-1, 1, size=(chunk_frames, 2)).astype(np.float32) for _ in range(NUM_CHUNKS)]
+        for num_taps in TAP_COUNTS:
+            times = {}
+            times["old"], _ = run(LegacyFIRLowpassFilter(cutoff, RATE, num_taps), chunks)
+            for method in ("direct", "fft", "auto"):
+                times[method], _ = run(FIRLowpassFilter(cutoff, RATE, num_taps, method=method), chunks)
+            pick = "fft" if FIRLowpassFilter(cutoff, RATE, num_taps)._use_fft(chunk_frames) else "direct"
+            errors = check_equivalence(chunks, cutoff, num_taps)
+            print(f"{speed:>5} {num_taps:>5} | " + " ".join(f"{times[m] / 1000:>6.0f} us" for m in ("old", "direct", "fft", "auto")) +
+                  f" ({pick:>6}) | {errors['old']:.1e}, {errors['direct']:.1e}, {errors['fft']:.1e}")
+
+    speeds = np.arange(0.99, 0.495, -0.01)
+    filter = FIRLowpassFilter(round(RATE / 2 * speeds[0]), RATE, 201)
+    for label in ("cold cache", "warm cache"):
+        if label == "cold cache":
+            lowpass_kernel.cache_clear()
+            lowpass_spectrum.cache_clear()
+        start = time.perf_counter_ns()
+        for speed in speeds:
+            filter.set_new_filter(round(RATE / 2 * speed), RATE, 201)
+        print(f"set_new_filter during a slider drag ({label}): {(time.perf_counter_ns() - start) / len(speeds) / 1000:.1f} us per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares the per-chunk CPU time of a crossfade rendered through the old integer AudioSegment path
+(clip and cast after every gain, fade and mix) against the float32 working buffer path
+(quantized to int16 once, when the chunk is handed to the output).
+"""
+import time
+import numpy as np
+
+from tools.audiosegment import AudioSegment
+from tools.audioprocessing import step_fade, amp_to_db
+
+RATE = 44_100
+CHUNK_LEN = 50
+FADE_DURATION = 3000
+VOLUME = 0.5
+REPEATS = 20
+
+
+def chunk_generator(samples: np.ndarray, float_render: bool):
+    chunk_frame_len = round(RATE * CHUNK_LEN / 1000)
+    for start in range(0, samples.shape[0], chunk_frame_len):
+        audio = AudioSegment(samples[start:start+chunk_frame_len].tobytes(), RATE, 2, 2)
+        if float_render:
+            audio.to_float()
+        yield audio
+
+
+def render_crossfade(track_a: np.ndarray, track_b: np.ndarray, float_render: bool):
+    num_chunks = 0
+    for chunk, _, _ in step_fade(chunk_generator(track_a, float_render), chunk_generator(track_b, float_render),
+                                 fade_duration=FADE_DURATION, chunk_len=CHUNK_LEN, fade_type="crossfade"):
+        # Mirrors AudioPlayer.write_to_buffer at 1x speed
+        chunk = chunk + amp_to_db(VOLUME)
+        chunk.data
+        num_chunks += 1
+    return num_chunks
+
+
+def main():
+    rng = np.random.default_rng(0)
+    num_frames = round(RATE * (FADE_DURATION + CHUNK_LEN) / 1000)
+    track_a = rng.integers(-20_000, 20_000, size=(num_frames, 2), dtype=np.int16)
+    track_b = rng.integers(-20_000, 20_000, size=(num_frames, 2), dtype=np.int16)
+
+    print(f"Crossfade of {FADE_DURATION} ms in {CHUNK_LEN} ms chunks, best of {REPEATS} runs")
+    results = {}
+    for name, float_render in (("int16 (old)", False), ("float32", True)):
+        best = None
+        for _ in range(REPEATS):
+            start = time.process_time_ns()
+            num_chunks = render_crossfade(track_a, track_b, float_render)
+            elapsed = time.process_time_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best / num_chunks
+        print(f"{name:>12}: {best / num_chunks / 1000:8.1f} us/chunk ({num_chunks} chunks)")
+    print(f"{'speedup':>12}: {results['int16 (old)'] / results['float32']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Measures the per chunk cost of the fade -> volume -> ducking gain chain zawarudo runs on every chunk,
+applied eagerly (one multiply, clip and cast per operation, which is what AudioSegment used to do)
+and through AudioSegment's pending operations, which get fused into a single pass when the data is read.
+"""
+import time
+import numpy as np
+
+from tools.audiosegment import AudioSegment
+from tools.audioprocessing import db_to_amp
+
+RATE = 44_100
+CHUNK_LEN = 50 # ms
+REPEATS = 2_000
+FADE = (0, -5) # dB
+VOLUME = -6 # dB
+DUCKING = -5 # dB
+
+
+def eager_chain(samples: np.ndarray):
+    info = np.iinfo(samples.dtype)
+    amp = np.linspace(db_to_amp(FADE[0]), db_to_amp(FADE[1]), num=samples.shape[0], endpoint=True)
+    data = np.clip(samples.T * amp, a_min=info.min, a_max=info.max).T.astype(samples.dtype)
+    data = np.clip(data * db_to_amp(VOLUME), a_min=info.min, a_max=info.max).astype(samples.dtype)
+    data = np.clip(data * db_to_amp(DUCKING), a_min=info.min, a_max=info.max).astype(samples.dtype)
+    return data.tobytes()
+
+
+def fused_chain(samples: np.ndarray):
+    segment = AudioSegment(samples, RATE, 2, 2)
+    segment = segment.fade(from_gain=FADE[0], to_gain=FADE[1], start=0, duration=CHUNK_LEN) + VOLUME + DUCKING
+    return segment.data
+
+
+def measure(func, samples):
+    start = time.perf_counter_ns()
+    for _ in range(REPEATS):
+        func(samples)
+    return (time.perf_counter_ns() - start) / REPEATS
+
+
+def main():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-20_000, 20_000, size=(round(RATE * CHUNK_LEN / 1000), 2), dtype=np.int16)
+
+    eager = np.frombuffer(eager_chain(samples), dtype=np.int16)
+    fused = np.frombuffer(fused_chain(samples), dtype=np.int16)
+    print(f"Max sample difference between eager and fused: {np.max(np.abs(eager.astype(np.int32) - fused))}")
+
+    eager_time = measure(eager_chain, samples)
+    fused_time = measure(fused_chain, samples)
+    print(f"fade + gain + gain on a {CHUNK_LEN} ms chunk, mean of {REPEATS} runs")
+    print(f"  eager: {eager_time / 1000:>8.1f} us/chunk")
+    print(f"  fused: {fused_time / 1000:>8.1f} us/chunk")
+    print(f"speedup: {eager_time / fused_time:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures how long starting a track from the top takes to get its first chunk (and its first second), decoding it on
+demand against playing the start from the head cache while the decoder opens the file in the background.
+This is what selecting a song, skipping or starting from idle waits on. Prefetching is off, so nothing else hides it.
+
+    python -m benchmarks.head_cache file [file ...]
+
+It needs MP3 or OGG files, WAVs don't get cached since they're read straight from the file anyway.
+"""
+import os
+import sys
+import tempfile
+import time
+from threading import Lock
+import miniaudio
+import numpy as np
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosinks import NullSink
+from tools.headcache import HeadCache
+
+TRIALS = 20
+FIRST_SECOND = 20 # chunks
+
+
+def start_times(player):
+    first_chunk, first_second = [], []
+    for trial in range(TRIALS):
+        track_id = trial % len(player.track_data)
+        player.decoder.close_streams() # Like starting a track that isn't open yet
+        start = time.perf_counter()
+        generator = player.load_chunks(track_id)
+        next(generator)
+        first_chunk.append(time.perf_counter() - start)
+        for _ in range(FIRST_SECOND - 1):
+            next(generator)
+        first_second.append(time.perf_counter() - start)
+        generator.close()
+    return np.array(first_chunk) * 1000, np.array(first_second) * 1000
+
+
+def main():
+    files = sys.argv[1:]
+    if not files:
+        print(__doc__)
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        player = AudioPlayer(lock=Lock(), rate=44_100, sink=NullSink(rate=44_100))
+        player.prefetch_next_track = False
+        player.bootup = False
+        player.decoder.app_folder = folder # Keep seek indexes out of the real cache
+        player.head_cache = HeadCache(os.path.join(folder, "head"))
+        player.track_data = {}
+        for track_id, file in enumerate(files):
+            info = miniaudio.get_file_info(file)
+            player.track_data[track_id] = {"file": file, "rate": info.sample_rate, "length": info.num_frames, "persistent_id": track_id}
+
+        print(f"Starting {TRIALS} tracks over {len(files)} files")
+        for cached in (False, True):
+            if cached:
+                for track_id in player.track_data:
+                    player.cache_head(track_id)
+            first_chunk, first_second = start_times(player)
+            print(f"{'head cache' if cached else 'on demand':>10}: first chunk mean {first_chunk.mean():6.2f} ms, worst {first_chunk.max():6.2f} ms, "
+                  f"first second mean {first_second.mean():6.2f} ms")
+
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Times decoding a track with ma_decoder reading the file itself as it goes against decoding it from a MemoryFile
+(a memory map the OS reads ahead of the decoder): opening it and decoding the first chunk, decoding it start to end,
+then seeking to random positions and decoding a chunk at each.
+Files on slow storage (network shares, SD cards) are where reading ahead in the background matters most,
+on a local disk with the file in the OS cache the two should be close.
+
+    python -m benchmarks.memory_decode [file ...]
+
+Without arguments it uses a generated 48 kHz WAV.
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+import miniaudio
+import numpy as np
+
+from tools.audioplayer import AudioDecoder
+from tools.memoryfile import MemoryFile
+
+SEEKS = 50
+CHUNK_FRAME_LEN = 2048
+
+
+def write_test_file(path, rate=48_000, seconds=120):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-10_000, 10_000, size=(rate * seconds, 2), dtype=np.int16)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(rate)
+        fp.writeframes(samples.tobytes())
+
+
+def open_stream(file, mapped):
+    return AudioDecoder.MiniaudioDecoderStream(file, data=MemoryFile(file) if mapped else None)
+
+
+def time_first_chunk(file, mapped):
+    block = np.empty(shape=(CHUNK_FRAME_LEN, 2), dtype=np.int16)
+    start = time.perf_counter()
+    with open_stream(file, mapped) as stream:
+        stream.read_into(block)
+        return (time.perf_counter() - start) * 1000
+
+
+def time_decode(file, mapped):
+    block = np.empty(shape=(CHUNK_FRAME_LEN, 2), dtype=np.int16)
+    start = time.perf_counter()
+    with open_stream(file, mapped) as stream:
+        while stream.read_into(block):
+            pass
+    return (time.perf_counter() - start) * 1000
+
+
+def time_seeks(file, mapped, positions):
+    block = np.empty(shape=(CHUNK_FRAME_LEN, 2), dtype=np.int16)
+    start = time.perf_counter()
+    with open_stream(file, mapped) as stream:
+        for position in positions:
+            stream.seek(int(position))
+            stream.read_into(block)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    files = sys.argv[1:]
+    with tempfile.TemporaryDirectory() as folder:
+        if not files:
+            files = [os.path.join(folder, "test.wav")]
+            write_test_file(files[0])
+
+        for file in files:
+            info = miniaudio.get_file_info(file)
+            positions = np.random.default_rng(0).integers(0, info.num_frames - CHUNK_FRAME_LEN, size=SEEKS)
+            size = os.path.getsize(file)
+            print(f"{os.path.basename(file)}: {size / 2**20:.1f} MB, {info.duration:.0f} s")
+            # Not indexed, so MP3 seeks decode forwards here whichever way the data gets read
+            for name, mapped in (("file", False), ("mapped", True)):
+                time_decode(file, mapped) # Warm up the OS cache
+                first_chunk_time = time_first_chunk(file, mapped)
+                decode_time = time_decode(file, mapped)
+                seek_time = time_seeks(file, mapped, positions)
+                print(f"  {name:>6}: first chunk {first_chunk_time:6.2f} ms, full decode {decode_time:8.1f} ms, "
+                      f"{SEEKS} seeks {seek_time:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
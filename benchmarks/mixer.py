@@ -0,0 +1,96 @@
+"""
+Measures the per chunk cost of mixing 2, 4 and 8 inputs: the old way (chaining the two input AudioSegment
+mix pairwise, renormalizing the sum of every pair that clips) against mix, which sums every input in one
+float32 pass, on its own and with the result going through a SoftLimiter.
+
+Also prints how much the gain applied to a loud, steady signal moves between consecutive chunks,
+which is what you hear as pumping with per chunk normalization.
+"""
+import time
+import numpy as np
+
+from tools.audiosegment import AudioSegment, mix
+from tools.audioprocessing import SoftLimiter
+
+RATE = 44_100
+CHUNK_LEN = 50 # ms
+NUM_CHUNKS = 200
+INPUT_COUNTS = (2, 4, 8)
+
+
+def legacy_mix_pair(samples: np.ndarray, other: np.ndarray):
+    """
+    What AudioSegment.__mul__ used to do for int16 segments
+    """
+    mixed = samples.astype(np.float32) + other
+    max_val = np.max(np.abs(mixed))
+    if max_val > 32767:
+        mixed = mixed * (32767 / max_val)
+    return mixed.astype(np.int16)
+
+
+def legacy_mix(inputs: list[np.ndarray]):
+    mixed = inputs[0]
+    for other in inputs[1:]:
+        mixed = legacy_mix_pair(mixed, other)
+    return mixed.tobytes()
+
+
+def make_inputs(rng, num_inputs, num_frames):
+    # Sines at different frequencies with slowly changing loudness, loud enough that the sum clips
+    t = np.arange(num_frames) / RATE
+    inputs = []
+    for i in range(num_inputs):
+        loudness = 0.6 + 0.3 * np.sin(2 * np.pi * (0.3 + 0.1 * i) * t)
+        tone = np.sin(2 * np.pi * (110 * (i + 1) + rng.random()) * t) * loudness * 32_767 * 1.5 / num_inputs
+        inputs.append(np.repeat(tone[:, None], 2, axis=1).astype(np.int16))
+    return inputs
+
+
+def gain_jumps(mixed_chunks: list[bytes], unclipped_chunks: list[np.ndarray]):
+    """
+    Largest change in the (peak based) gain between consecutive chunks, in dB
+    """
+    gains = []
+    for data, reference in zip(mixed_chunks, unclipped_chunks):
+        out = np.frombuffer(data, dtype=np.int16)
+        gains.append(20 * np.log10(np.max(np.abs(out)) / np.max(np.abs(reference))))
+    return np.max(np.abs(np.diff(gains)))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    chunk_frames = round(RATE * CHUNK_LEN / 1000)
+    print(f"Mixing {NUM_CHUNKS} chunks of {CHUNK_LEN} ms")
+    print(f"{'inputs':>6} | {'pairwise':>12} {'gain jumps':>11} | {'mix':>12} | {'mix+limiter':>12} {'gain jumps':>11}")
+    for num_inputs in INPUT_COUNTS:
+        inputs = make_inputs(rng, num_inputs, chunk_frames * NUM_CHUNKS)
+        chunks = [[samples[i*chunk_frames:(i+1)*chunk_frames] for samples in inputs] for i in range(NUM_CHUNKS)]
+        unclipped = [np.sum([c.astype(np.float32) for c in chunk], axis=0) for chunk in chunks]
+
+        start = time.perf_counter_ns()
+        legacy_out = [legacy_mix(chunk) for chunk in chunks]
+        legacy_time = (time.perf_counter_ns() - start) / NUM_CHUNKS
+
+        start = time.perf_counter_ns()
+        for chunk in chunks:
+            mix([AudioSegment(c, RATE, 2, 2) for c in chunk]).data
+        sum_time = (time.perf_counter_ns() - start) / NUM_CHUNKS
+
+        limiter = SoftLimiter(RATE, 2)
+        start = time.perf_counter_ns()
+        mix_out = [mix([AudioSegment(c, RATE, 2, 2) for c in chunk], limiter=limiter).data for chunk in chunks]
+        mix_time = (time.perf_counter_ns() - start) / NUM_CHUNKS
+
+        # The limiter delays its output, compare the gain against the input it actually came from
+        delay = limiter.lookahead
+        delayed = np.concatenate(unclipped)[:-delay] if delay else np.concatenate(unclipped)
+        delayed = np.concatenate((np.zeros((delay, 2), dtype=np.float32), delayed))
+        delayed = [delayed[i*chunk_frames:(i+1)*chunk_frames] for i in range(NUM_CHUNKS)]
+
+        print(f"{num_inputs:>6} | {legacy_time / 1000:>9.1f} us {gain_jumps(legacy_out, unclipped):>8.2f} dB | " +
+              f"{sum_time / 1000:>9.1f} us | {mix_time / 1000:>9.1f} us {gain_jumps(mix_out[1:], delayed[1:]):>8.2f} dB")
+
+
+if __name__ == "__main__":
+    main()
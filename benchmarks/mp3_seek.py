@@ -0,0 +1,73 @@
+"""
+Compares seeking around MP3s with ma_decoder on its own (forwards seeks decode up to the target, backwards seeks
+start again from the beginning of the file) against seeking through an Mp3SeekIndex. Also reports how long building,
+saving and loading the index takes, that's paid once per file.
+
+    python -m benchmarks.mp3_seek file.mp3 [file.mp3 ...]
+
+Every seek reads a 50 ms chunk afterwards, which gets checked against a full decode of the file (so this needs
+enough memory to hold the whole file as int16). Long files show the difference best.
+"""
+import os
+import sys
+import tempfile
+import time
+import miniaudio
+import numpy as np
+
+from tools.audioplayer import AudioDecoder
+from tools.seekindex import Mp3SeekIndex
+
+SEEKS = 50
+CHUNK_LEN = 50 # ms
+
+
+def time_seeks(stream, positions, chunk):
+    times = []
+    chunks = []
+    for position in positions:
+        start = time.perf_counter()
+        stream.seek(int(position))
+        num_frames = stream.read_into(chunk)
+        times.append(time.perf_counter() - start)
+        chunks.append(chunk[:num_frames].copy())
+    return np.array(times) * 1000, chunks
+
+
+def main():
+    files = sys.argv[1:]
+    if not files:
+        print(__doc__)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        for file in files:
+            info = miniaudio.get_file_info(file)
+            print(f"{os.path.basename(file)}: {info.num_frames / info.sample_rate / 60:.1f} min, {SEEKS} random seeks")
+
+            start = time.perf_counter()
+            index = Mp3SeekIndex.build(file)
+            built = time.perf_counter()
+            index.save(os.path.join(folder, "index.npz"))
+            saved = time.perf_counter()
+            Mp3SeekIndex.load(os.path.join(folder, "index.npz"))
+            loaded = time.perf_counter()
+            print(f"  index of {len(index.offsets) - 1} frames: built in {(built - start) * 1000:.1f} ms, "
+                  f"saved in {(saved - built) * 1000:.1f} ms, loaded in {(loaded - saved) * 1000:.1f} ms")
+
+            with AudioDecoder.MiniaudioDecoderStream(file) as stream:
+                full = np.empty(shape=(info.num_frames, 2), dtype=np.int16)
+                stream.read_into(full)
+
+            positions = np.random.default_rng(0).integers(0, info.num_frames, size=SEEKS)
+            chunk = np.empty(shape=(round(info.sample_rate * CHUNK_LEN / 1000), 2), dtype=np.int16)
+            for name, seek_index in (("ma_decoder", None), ("seek index", index)):
+                with AudioDecoder.MiniaudioDecoderStream(file, seek_index=seek_index) as stream:
+                    times, chunks = time_seeks(stream, positions, chunk)
+                wrong = sum(not np.array_equal(c, full[p:p + len(c)]) for p, c in zip(positions, chunks))
+                print(f"  {name:>10}: {times.sum():8.1f} ms total, mean {times.mean():7.2f} ms, worst {times.max():7.2f} ms, "
+                      f"{wrong} wrong chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Estimates the CPU time saved by opening the output at each track's own sample rate (AudioPlayer.follow_track_rate)
+rather than resampling everything to 44.1 kHz, for a playlist alternating between 44.1 kHz and 48 kHz tracks
+at 1x speed. Each chunk goes through the same steps as AudioPlayer.write_to_buffer (volume, resampling if needed,
+limiter, quantizing), the output device itself isn't involved.
+"""
+import time
+import numpy as np
+
+from tools.audiosegment import AudioSegment, mix
+from tools.audioprocessing import SoftLimiter, StreamingResampler, amp_to_db
+
+OUTPUT_RATE = 44_100
+PLAYLIST_RATES = (44_100, 48_000, 44_100, 48_000)
+TRACK_LEN = 20 # s
+CHUNK_LEN = 50 # ms
+VOLUME = 0.8
+
+
+def track_chunks(rng, rate):
+    chunk_frames = round(rate * CHUNK_LEN / 1000)
+    samples = rng.integers(-20_000, 20_000, size=(rate * TRACK_LEN, 2), dtype=np.int16)
+    for start in range(0, samples.shape[0], chunk_frames):
+        yield AudioSegment(samples[start:start + chunk_frames], rate, 2, 2).to_float()
+
+
+def render(playlist, follow_track_rate):
+    output_rate = OUTPUT_RATE
+    limiter = SoftLimiter(output_rate, 2)
+    resampler = StreamingResampler(2)
+    cpu_time = {rate: 0 for rate in set(PLAYLIST_RATES)}
+    for rate, chunks in playlist:
+        if follow_track_rate and rate != output_rate:
+            output_rate = rate
+            limiter = SoftLimiter(output_rate, 2)
+            resampler.reset()
+        for audio in chunks:
+            start = time.process_time_ns()
+            audio = audio + amp_to_db(VOLUME)
+            if audio.frame_rate != output_rate:
+                audio = audio.change_speed(audio.frame_rate / output_rate, resampler=resampler)
+            mix([audio], limiter=limiter).buffer
+            cpu_time[rate] += time.process_time_ns() - start
+    return cpu_time
+
+
+def main():
+    rng = np.random.default_rng(0)
+    playlist = [(rate, list(track_chunks(rng, rate))) for rate in PLAYLIST_RATES]
+    audio_time = TRACK_LEN * len(PLAYLIST_RATES)
+
+    print(f"Playlist of {len(PLAYLIST_RATES)} x {TRACK_LEN} s tracks at {', '.join(f'{r / 1000:g}' for r in PLAYLIST_RATES)} kHz, 1x speed")
+    results = {}
+    for name, follow in (("fixed 44.1 kHz output", False), ("output at track rate", True)):
+        cpu_time = render(playlist, follow)
+        total = sum(cpu_time.values())
+        results[name] = total
+        per_rate = ", ".join(f"{rate / 1000:g} kHz tracks {cpu_time[rate] / 1e9:.2f} s" for rate in sorted(cpu_time))
+        print(f"{name:>22}: {total / 1e9:.2f} s CPU ({100 * total / 1e9 / audio_time:.2f}% of real time; {per_rate})")
+    saved = results["fixed 44.1 kHz output"] - results["output at track rate"]
+    print(f"{'saved':>22}: {saved / 1e9:.2f} s CPU ({100 * saved / results['fixed 44.1 kHz output']:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
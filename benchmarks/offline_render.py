@@ -0,0 +1,73 @@
+"""
+Runs the whole AudioPlayer loop (decoding, crossfades between tracks, speed changes, limiter) into a NullSink,
+which doesn't wait for a sound card, and reports how much faster than real time it renders.
+The playlist is a few generated WAV files, half of them played at 0.8x speed.
+"""
+import os
+import tempfile
+import time
+import wave
+from threading import Thread, Lock
+import numpy as np
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosinks import NullSink
+
+RATE = 44_100
+TRACKS = 4
+TRACK_LEN = 20 # s
+RENDER_SECONDS = 120
+
+
+def write_track(path, freq):
+    t = np.arange(RATE * TRACK_LEN) / RATE
+    samples = np.repeat((8_000 * np.sin(2 * np.pi * freq * t))[:, None], 2, axis=1).astype(np.int16)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(RATE)
+        fp.writeframes(samples.tobytes())
+
+
+def render(track_data, speed):
+    sink = NullSink(rate=RATE)
+    player = AudioPlayer(lock=Lock(), rate=RATE, sink=sink)
+    player.track_data = track_data
+    player.track_id = 0
+    player.next_track_id = 1
+    player.speed = speed
+    player.status = "playing"
+
+    thread = Thread(target=player.run, daemon=True)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    thread.start()
+    while sink.seconds_written < RENDER_SECONDS:
+        time.sleep(0.001)
+        player.next_track_id = (player.track_id + 1) % TRACKS
+    elapsed = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+    player.status = "stopped"
+    thread.join(5)
+    player.osc_server.shutdown()
+    player.osc_server.server_close()
+    return sink.seconds_written, elapsed, cpu_time
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        track_data = {}
+        for track_id in range(TRACKS):
+            path = os.path.join(folder, f"track_{track_id}.wav")
+            write_track(path, 220 * (track_id + 1))
+            track_data[track_id] = {"file": path, "rate": RATE, "length": RATE * TRACK_LEN, "persistent_id": track_id}
+
+        print(f"Rendering {RENDER_SECONDS} s of a {TRACKS} track playlist ({TRACK_LEN} s tracks) into a NullSink")
+        for speed in (1, 0.8):
+            seconds, elapsed, cpu_time = render(track_data, speed)
+            print(f"{speed:g}x speed: {seconds:.1f} s of audio in {elapsed:.2f} s ({seconds / elapsed:.0f}x real time, "
+                  f"{cpu_time:.2f} s CPU)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares resampling a 50 ms stereo chunk the old way (np.apply_along_axis over np.interp, rebuilding both
+np.linspace grids for every channel of every chunk) against resample, which looks the grid up in the
+ResamplePlan cache and does a gather and multiply-add over both channels. Prints the plan cache counters at the end.
+"""
+import time
+import numpy as np
+
+from tools.audioprocessing import resample, resample_plan
+
+RATE = 44_100
+CHUNK_LEN = 50 # ms
+SCALES = {"44.1 -> 48 kHz": 48_000 / 44_100, "48 -> 44.1 kHz": 44_100 / 48_000, "0.5x speed": 2.0, "0.8x speed": 1 / 0.8, "1.5x speed": 1 / 1.5}
+REPEATS = 500
+
+
+def legacy_resample(channel_samples, scale=1.0):
+    n = round(len(channel_samples) * scale)
+    return np.interp(
+        np.linspace(0.0, 1.0, n, endpoint=False),
+        np.linspace(0.0, 1.0, len(channel_samples), endpoint=False),
+        channel_samples,
+        )
+
+
+def measure(func, *args):
+    start = time.perf_counter_ns()
+    for _ in range(REPEATS):
+        func(*args)
+    return (time.perf_counter_ns() - start) / REPEATS
+
+
+def main():
+    rng = np.random.default_rng(0)
+    chunk = rng.integers(-20_000, 20_000, size=(round(RATE * CHUNK_LEN / 1000), 2), dtype=np.int16)
+    chunk_f32 = (chunk / 32768).astype(np.float32)
+
+    resample_plan.cache_clear()
+    print(f"Resampling a {CHUNK_LEN} ms stereo chunk, mean of {REPEATS} runs")
+    print(f"{'':>15} | {'old':>9} | {'plan int16':>10} {'plan f32':>9} | max difference")
+    for name, scale in SCALES.items():
+        legacy_time = measure(lambda: np.apply_along_axis(legacy_resample, axis=0, arr=chunk, scale=scale))
+        plan_time = measure(resample, chunk, scale)
+        plan_f32_time = measure(resample, chunk_f32, scale)
+        difference = np.max(np.abs(resample(chunk, scale) - np.apply_along_axis(legacy_resample, axis=0, arr=chunk, scale=scale)))
+        print(f"{name:>15} | {legacy_time / 1000:>6.1f} us | {plan_time / 1000:>7.1f} us {plan_f32_time / 1000:>6.1f} us | {difference:.1e}")
+
+    info = resample_plan.cache_info()
+    print(f"Plan cache: {info.hits} hits, {info.misses} misses, {info.currsize}/{info.maxsize} plans")
+
+
+if __name__ == "__main__":
+    main()
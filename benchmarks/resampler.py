@@ -0,0 +1,61 @@
+"""
+Compares the per chunk cost of changing speed with the old per chunk resample (np.apply_along_axis over
+two np.linspace grids per channel, starting every chunk at phase zero) against StreamingResampler,
+for speeds from 0.5x to 2.0x.
+
+It also resamples a sine chunk by chunk with both and compares the result against resampling the
+whole stream in one go. The error for the old approach comes from the chunk edges, where each chunk
+gets stretched to a whole number of samples and restarts at phase zero.
+"""
+import time
+import numpy as np
+
+from tools.audioprocessing import StreamingResampler, change_speed_array
+
+RATE = 44_100
+CHUNK_LEN = 50 # ms
+SPEEDS = (0.5, 0.75, 0.9, 1.1, 1.25, 1.5, 2.0)
+NUM_CHUNKS = 100
+
+
+def old_resample(chunks, speed):
+    return [change_speed_array(chunk, speed, dt=None) for chunk in chunks]
+
+
+def streaming_resample(chunks, speed):
+    resampler = StreamingResampler(2)
+    return [change_speed_array(chunk, speed, dt=None, resampler=resampler) for chunk in chunks]
+
+
+def timed(func, chunks, speed):
+    start = time.perf_counter_ns()
+    out = func(chunks, speed)
+    return (time.perf_counter_ns() - start) / len(chunks), np.concatenate(out)
+
+
+def one_shot(stream: np.ndarray, speed, num_out):
+    positions = np.arange(num_out) * speed
+    return np.stack([np.interp(positions, np.arange(stream.shape[0]), stream[:, c]) for c in range(stream.shape[1])], axis=1)
+
+
+def main():
+    chunk_frames = round(RATE * CHUNK_LEN / 1000)
+    t = np.arange(chunk_frames * NUM_CHUNKS) / RATE
+    stream = np.repeat(np.sin(2 * np.pi * 1000 * t)[:, None], 2, axis=1).astype(np.float32)
+    chunks = [stream[i*chunk_frames:(i+1)*chunk_frames] for i in range(NUM_CHUNKS)]
+
+    print(f"Changing the speed of {NUM_CHUNKS} chunks of {CHUNK_LEN} ms (1 kHz sine at full scale)")
+    print(f"{'speed':>5} | {'old':>9} {'max error':>10} | {'streaming':>9} {'max error':>10}")
+    for speed in SPEEDS:
+        old_time, old_out = timed(old_resample, chunks, speed)
+        new_time, new_out = timed(streaming_resample, chunks, speed)
+        # Leave out the last few frames, the streaming resampler holds on to them until the next chunk
+        num_out = min(old_out.shape[0], new_out.shape[0]) - 2
+        reference = one_shot(stream, speed, num_out)
+        old_error = np.max(np.abs(old_out[:num_out] - reference))
+        new_error = np.max(np.abs(new_out[:num_out] - reference))
+        print(f"{speed:>5} | {old_time / 1000:>6.0f} us {old_error:>10.2e} | {new_time / 1000:>6.0f} us {new_error:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
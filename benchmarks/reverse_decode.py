@@ -0,0 +1,78 @@
+"""
+Compares the two ways of playing a file backwards: seeking the decoder before every 50 ms chunk (what the OGG and
+converted loaders used to do) against AudioDecoder's block reverse (decode 2 s forwards, hand it out back to front).
+Reports total time and the worst single chunk, which is what the audio thread actually has to absorb.
+
+    python -m benchmarks.reverse_decode [file ...]
+
+Without arguments it uses a generated 60 s WAV. MP3 seeks go back to the start of the file, so try one of those too.
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+import miniaudio
+import numpy as np
+
+from tools.audioplayer import AudioDecoder
+
+CHUNK_LEN = 50 # ms
+REVERSE_SECONDS = 30
+
+
+def write_test_file(path, rate=44_100, seconds=60):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-10_000, 10_000, size=(rate * seconds, 2), dtype=np.int16)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(rate)
+        fp.writeframes(samples.tobytes())
+
+
+def per_chunk_seek(decoder, file, start_frame, num_chunks, chunk_frame_len):
+    with decoder._open_decoder_stream(file, 0) as stream:
+        block = np.empty(shape=(chunk_frame_len, 2), dtype=np.float32)
+        for chunk_index in range(num_chunks):
+            frame_pos = max(start_frame - chunk_frame_len * (chunk_index + 1), 0)
+            stream.seek(frame_pos)
+            stream.read_into(block)
+            yield block[::-1]
+
+
+def time_chunks(generator):
+    times = []
+    start = time.perf_counter()
+    for _ in generator:
+        now = time.perf_counter()
+        times.append(now - start)
+        start = now
+    return np.array(times) * 1000
+
+
+def main():
+    files = sys.argv[1:]
+    with tempfile.TemporaryDirectory() as folder:
+        if not files:
+            files = [os.path.join(folder, "test.wav")]
+            write_test_file(files[0])
+
+        decoder = AudioDecoder()
+        decoder.sample_format = "f32"
+        for file in files:
+            info = miniaudio.get_file_info(file)
+            chunk_frame_len = round(info.sample_rate * CHUNK_LEN / 1000)
+            start_frame = info.num_frames
+            num_chunks = min(round(REVERSE_SECONDS * 1000 / CHUNK_LEN), start_frame // chunk_frame_len)
+            print(f"{os.path.basename(file)}: last {num_chunks * CHUNK_LEN / 1000:g} s backwards in {CHUNK_LEN} ms chunks")
+
+            for name, generator in (
+                    ("seek per chunk", per_chunk_seek(decoder, file, start_frame, num_chunks, chunk_frame_len)),
+                    ("block reverse", decoder._load_reversed(file, start_frame, num_chunks, chunk_frame_len, info.sample_rate))):
+                times = time_chunks(generator)
+                print(f"{name:>16}: {times.sum():8.1f} ms total, worst chunk {times.max():6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
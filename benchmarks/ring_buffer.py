@@ -0,0 +1,107 @@
+"""
+Compares AudioStreamer's old buffer (a bytearray the device callback slices and deletes from, with write()
+polling on time.sleep(0.01) while it's full) against RingBuffer.
+
+  a) Callback cost: the time the device callback spends taking one period out of the buffer.
+  b) Producer wakeup lag: with a simulated device taking a period every 25 ms from its own thread,
+     how long after the callback that made room a blocked write() actually gets its chunk in.
+     The longer this is, the less audio is left buffered when the next callback comes around.
+"""
+import time
+from threading import Thread
+import numpy as np
+
+from tools.ringbuffer import RingBuffer
+
+RATE = 44_100
+CHANNELS = 2
+BUFFERSIZE_MS = 50
+PERIOD_FRAMES = RATE * BUFFERSIZE_MS // 1000 // 2 # callback_periods=2
+CALLBACKS = 20_000
+SIMULATED_SECONDS = 3
+
+
+class BytearrayBuffer():
+    """
+    The buffer AudioStreamer used before RingBuffer
+    """
+    def __init__(self, capacity):
+        self.req_size = capacity * CHANNELS * 2 // 2
+        self.audio_buffer = bytearray()
+
+    def free(self):
+        # write() takes a whole chunk as long as there's less than req_size in there
+        return (2 * self.req_size - 1 - len(self.audio_buffer)) // (CHANNELS * 2)
+
+    def write(self, data):
+        while data:
+            if len(self.audio_buffer) < self.req_size:
+                self.audio_buffer.extend(data)
+                break
+            else:
+                time.sleep(0.01)
+
+    def read(self, max_frames):
+        size = max_frames * CHANNELS * 2
+        data = self.audio_buffer[0:size]
+        del self.audio_buffer[0:size]
+        return data
+
+
+def callback_cost(buffer, chunk):
+    times = np.empty(CALLBACKS)
+    for i in range(CALLBACKS):
+        while buffer.free() >= len(chunk) // (CHANNELS * 2):
+            buffer.write(chunk)
+        start = time.perf_counter_ns()
+        buffer.read(PERIOD_FRAMES)
+        times[i] = time.perf_counter_ns() - start
+    return times / 1000
+
+
+def wakeup_lag(buffer, chunk):
+    callback_times = []
+    running = True
+
+    def device():
+        next_callback = time.perf_counter()
+        while running:
+            buffer.read(PERIOD_FRAMES)
+            callback_times.append(time.perf_counter())
+            next_callback += PERIOD_FRAMES / RATE
+            time.sleep(max(next_callback - time.perf_counter(), 0))
+
+    thread = Thread(target=device, daemon=True)
+    thread.start()
+    lags = []
+    end = time.perf_counter() + SIMULATED_SECONDS
+    while time.perf_counter() < end:
+        num_callbacks = len(callback_times)
+        buffer.write(chunk)
+        if len(callback_times) > num_callbacks: # We had to wait for the device
+            lags.append(time.perf_counter() - callback_times[-1])
+    running = False
+    thread.join()
+    return np.array(lags) * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    chunk_frames = RATE * BUFFERSIZE_MS // 1000
+    chunk = rng.integers(-20_000, 20_000, size=(chunk_frames, CHANNELS), dtype=np.int16).tobytes()
+    buffers = (("bytearray", lambda: BytearrayBuffer(2 * chunk_frames)),
+               ("RingBuffer", lambda: RingBuffer(2 * chunk_frames, CHANNELS, np.int16)))
+
+    print(f"Callback cost, {CALLBACKS} callbacks of {PERIOD_FRAMES} frames, buffer topped up with {BUFFERSIZE_MS} ms chunks")
+    for name, make_buffer in buffers:
+        times = callback_cost(make_buffer(), chunk)
+        print(f"{name:>10}: mean {times.mean():6.2f} us, p99 {np.percentile(times, 99):6.2f} us, max {times.max():7.2f} us")
+
+    print(f"\nProducer wakeup lag over {SIMULATED_SECONDS} s of simulated playback")
+    for name, make_buffer in buffers:
+        lags = wakeup_lag(make_buffer(), chunk)
+        print(f"{name:>10}: mean {lags.mean():6.2f} ms, max {lags.max():6.2f} ms ({len(lags)} blocked writes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures the cost of the accumulate-and-pop pattern zawarudo uses (append decoded chunks until
+there's enough audio buffered, then cut a chunk off the front) for a plain AudioSegment, which
+copies everything that's buffered on every append, and for an AudioRope.
+"""
+import time
+import numpy as np
+
+from tools.audiosegment import AudioSegment, AudioRope
+
+RATE = 44_100
+DECODE_CHUNK_LEN = 50 # ms, what the chunk generator hands out
+BUFFERED_LENGTHS = (0, 1_000, 10_000, 60_000) # ms of audio already sitting in the buffer
+POP_LEN = 20 # ms, a slowed down chunk
+ITERATIONS = 500
+
+
+def make_chunks(rng, count):
+    num_frames = round(RATE * DECODE_CHUNK_LEN / 1000)
+    return [AudioSegment(rng.integers(-20_000, 20_000, size=(num_frames, 2), dtype=np.int16), RATE, 2, 2) for _ in range(count)]
+
+
+def run_segment(buffered: AudioSegment, chunks):
+    start = time.perf_counter_ns()
+    for i in range(ITERATIONS):
+        buffered = buffered + chunks[i % len(chunks)]
+        buffered[:POP_LEN].data
+        buffered = buffered[POP_LEN:]
+    return time.perf_counter_ns() - start
+
+
+def run_rope(buffered: AudioRope, chunks):
+    start = time.perf_counter_ns()
+    for i in range(ITERATIONS):
+        buffered.append(chunks[i % len(chunks)])
+        buffered.pop_front(POP_LEN).data
+    return time.perf_counter_ns() - start
+
+
+def main():
+    rng = np.random.default_rng(0)
+    chunks = make_chunks(rng, 16)
+    print(f"Append a {DECODE_CHUNK_LEN} ms chunk and pop {POP_LEN} ms off the front, mean of {ITERATIONS} iterations")
+    print(f"{'buffered':>10} | {'AudioSegment':>14} | {'AudioRope':>12}")
+    for length in BUFFERED_LENGTHS:
+        samples = rng.integers(-20_000, 20_000, size=(round(RATE * length / 1000), 2), dtype=np.int16)
+        segment_time = run_segment(AudioSegment(samples.copy(), RATE, 2, 2), chunks)
+        rope_time = run_rope(AudioRope(RATE) + AudioSegment(samples.copy(), RATE, 2, 2), chunks)
+        print(f"{length / 1000:>9.0f}s | {segment_time / ITERATIONS / 1000:>11.1f} us | {rope_time / ITERATIONS / 1000:>9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
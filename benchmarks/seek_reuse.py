@@ -0,0 +1,76 @@
+"""
+Times what a seek costs the decoder (getting a stream to the new position and decoding the first chunk there),
+opening the file again for every seek (max_open_streams = 0) against repositioning a decoder kept open.
+This is what scrubbing with the track slider does, many seeks in a row in the same track.
+
+    python -m benchmarks.seek_reuse [file ...]
+
+Everything plays at 44.1 kHz like it does in the player, the generated 48 kHz WAV used without arguments
+gets converted (so it goes through ma_decoder).
+MP3 decoders are only kept open once the file's seek index exists, which this builds first.
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+import miniaudio
+import numpy as np
+
+from tools.audioplayer import AudioDecoder
+
+SEEKS = 200
+CHUNK_LEN = 50 # ms
+
+
+def write_test_file(path, rate=48_000, seconds=60):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-10_000, 10_000, size=(rate * seconds, 2), dtype=np.int16)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(rate)
+        fp.writeframes(samples.tobytes())
+
+
+def time_seeks(decoder, file, positions, chunk_frame_len, frame_rate):
+    times = []
+    for position in positions:
+        start = time.perf_counter()
+        generator = decoder._load_converted(file, int(position), 10, chunk_frame_len, False, frame_rate, os.path.basename(file))
+        next(generator)
+        generator.close() # Like a seek dropping the track's generator
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def main():
+    files = sys.argv[1:]
+    with tempfile.TemporaryDirectory() as folder:
+        if not files:
+            files = [os.path.join(folder, "test.wav")]
+            write_test_file(files[0])
+
+        decoder = AudioDecoder()
+        decoder.app_folder = folder # Keep the seek indexes out of the real cache
+        decoder.sample_format = "f32"
+        for file in files:
+            info = miniaudio.get_file_info(file)
+            decoder.output_rate = 44_100
+            while decoder.seek_index(file, os.path.basename(file)) is None and decoder._indexing:
+                time.sleep(0.01)
+            chunk_frame_len = round(info.sample_rate * CHUNK_LEN / 1000)
+            positions = np.random.default_rng(0).integers(0, info.num_frames - chunk_frame_len, size=SEEKS)
+
+            print(f"{os.path.basename(file)}: {SEEKS} seeks")
+            for max_open_streams in (0, 4):
+                decoder.max_open_streams = max_open_streams
+                decoder.close_streams()
+                times = time_seeks(decoder, file, positions, chunk_frame_len, info.sample_rate)
+                name = "reopen" if not max_open_streams else "reuse"
+                print(f"  {name:>6}: mean {times.mean():6.3f} ms, worst {times.max():6.3f} ms")
+            decoder.close_streams()
+
+
+if __name__ == "__main__":
+    main()
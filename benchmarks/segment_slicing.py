@@ -0,0 +1,65 @@
+"""
+Measures how the time and memory needed to slice a 50 ms chunk out of an AudioSegment
+scales with the length of the segment being sliced, for the old copying implementation
+and the current view based one.
+"""
+import time
+import tracemalloc
+import numpy as np
+
+from tools.audiosegment import AudioSegment
+
+RATE = 44_100
+SLICE_LEN = 50
+SEGMENT_LENGTHS = (1_000, 10_000, 60_000, 300_000) # ms
+REPEATS = 50
+
+
+def legacy_slice(segment: AudioSegment, start, end):
+    """
+    The slicing code AudioSegment used to run: the bounds checks turned the whole segment
+    into bytes, then the slice got copied to bytes and again into a new bytearray
+    """
+    start = min(start, len(segment.data))
+    end = min(end, len(segment.data))
+    start_frame = round(start * segment.frame_rate / 1000)
+    end_frame = round(end * segment.frame_rate / 1000)
+    data = segment._data[start_frame:end_frame]
+    return AudioSegment(data.tobytes(), segment.frame_rate, segment.channels, segment.sample_width)
+
+
+def view_slice(segment: AudioSegment, start, end):
+    return segment[start:end]
+
+
+def measure(slice_func, segment: AudioSegment):
+    start_ms = len(segment) // 2
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter_ns()
+        slice_func(segment, start_ms, start_ms + SLICE_LEN)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    slice_func(segment, start_ms, start_ms + SLICE_LEN)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"Cost of slicing {SLICE_LEN} ms out of a segment, best of {REPEATS}")
+    print(f"{'segment':>10} | {'copy time':>12} {'copy peak mem':>14} | {'view time':>12} {'view peak mem':>14}")
+    for length in SEGMENT_LENGTHS:
+        samples = rng.integers(-20_000, 20_000, size=(round(RATE * length / 1000), 2), dtype=np.int16)
+        segment = AudioSegment(samples, RATE, 2, 2)
+        copy_time, copy_mem = measure(legacy_slice, segment)
+        view_time, view_mem = measure(view_slice, segment)
+        print(f"{length / 1000:>9.0f}s | {copy_time / 1000:>9.1f} us {copy_mem / 1024:>11.1f} KB | " +
+              f"{view_time / 1000:>9.1f} us {view_mem / 1024:>11.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures how long the audio thread waits for the first chunk of the next track when a crossfade starts,
+with the next track opened by load_chunks right there (prefetch_next_track off) and with it prefetched
+in the background as soon as next_track_id was set.
+
+    python -m benchmarks.track_prefetch [file ...]
+
+Without arguments it uses generated 48 kHz WAVs played on a 44.1 kHz output that doesn't follow the track rate,
+so they go through ma_decoder's resampler. Played backwards, a track starts by decoding a whole reverse block.
+Files on slow storage (network shares, spun down disks) are where this matters most.
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+from threading import Lock
+import miniaudio
+import numpy as np
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosinks import NullSink
+
+TRIALS = 20
+RATE = 48_000
+
+
+def write_track(path, seconds=30):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-10_000, 10_000, size=(RATE * seconds, 2), dtype=np.int16)
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(RATE)
+        fp.writeframes(samples.tobytes())
+
+
+def first_chunk_times(player, prefetch, reverse):
+    player.prefetch_next_track = prefetch
+    player.reverse_audio = reverse
+    times = []
+    for trial in range(TRIALS):
+        track_id = trial % len(player.track_data)
+        player.next_track_id = track_id
+        time.sleep(0.2) # The current track would be playing in the meantime
+
+        start_pos = player.get_track_length(track_id)[0] if reverse else 0
+        start = time.perf_counter()
+        next(player.load_chunks(track_id, start_pos=start_pos))
+        times.append(time.perf_counter() - start)
+        player.next_track_id = None
+    return np.array(times) * 1000
+
+
+def main():
+    files = sys.argv[1:]
+    with tempfile.TemporaryDirectory() as folder:
+        if not files:
+            files = [os.path.join(folder, f"track_{i}.wav") for i in range(2)]
+            for file in files:
+                write_track(file)
+
+        player = AudioPlayer(lock=Lock(), rate=44_100, sink=NullSink(rate=44_100))
+        player.follow_track_rate = False
+        player.bootup = False
+        player.track_data = {}
+        for track_id, file in enumerate(files):
+            info = miniaudio.get_file_info(file)
+            player.track_data[track_id] = {"file": file, "rate": info.sample_rate, "length": info.num_frames, "persistent_id": track_id}
+
+        print(f"Time to the first chunk of the next track, {TRIALS} track starts over {len(files)} files")
+        for reverse in (False, True):
+            for prefetch in (False, True):
+                times = first_chunk_times(player, prefetch, reverse)
+                print(f"{'reverse' if reverse else 'forward':>8}, prefetch {'on ' if prefetch else 'off'}: "
+                      f"mean {times.mean():6.2f} ms, worst {times.max():6.2f} ms")
+
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+
+
+if __name__ == "__main__":
+    main()
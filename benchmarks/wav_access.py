@@ -0,0 +1,86 @@
+"""
+Compares reading a large WAV (an hour-long ambience track is several hundred MB) through ma_decoder
+against AudioDecoder.load_wav's memory mapped views, for sequential, reverse and random-seek access.
+Each chunk gets converted to float like AudioPlayer.load_chunks does, so the mapped views actually get read.
+
+    python -m benchmarks.wav_access [size in MB]
+
+The test file is freshly written, so it's likely in the OS page cache for both, this measures CPU cost, not disk speed.
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+import numpy as np
+
+from tools.audioplayer import AudioDecoder
+
+RATE = 44_100
+CHUNK_FRAMES = RATE // 20 # 50 ms
+SEQUENTIAL_CHUNKS = 4_000
+SEEKS = 500
+CHUNKS_PER_SEEK = 4
+
+
+def write_test_file(path, size_mb):
+    rng = np.random.default_rng(0)
+    block = rng.integers(-10_000, 10_000, size=(RATE * 10, 2), dtype=np.int16).tobytes()
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(RATE)
+        for _ in range(size_mb * 2**20 // len(block)):
+            fp.writeframes(block)
+        return fp.getnframes()
+
+
+def consume(generator):
+    num_chunks = 0
+    for audio in generator:
+        audio.to_float()
+        num_chunks += 1
+    return num_chunks
+
+
+def run(load, num_frames):
+    rng = np.random.default_rng(1)
+    seek_positions = rng.integers(0, num_frames - CHUNK_FRAMES * CHUNKS_PER_SEEK, size=SEEKS)
+    results = {}
+
+    start = time.perf_counter()
+    consume(load(0, SEQUENTIAL_CHUNKS, False))
+    results["sequential"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    consume(load(num_frames, SEQUENTIAL_CHUNKS, True))
+    results["reverse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for position in seek_positions:
+        consume(load(int(position), CHUNKS_PER_SEEK, False))
+    results["random seek"] = time.perf_counter() - start
+    return results
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "ambience.wav")
+        num_frames = write_test_file(path, size_mb)
+        print(f"{size_mb} MB WAV ({num_frames / RATE / 60:.0f} min): {SEQUENTIAL_CHUNKS} chunks forwards, "
+              f"{SEQUENTIAL_CHUNKS} backwards, {SEEKS} seeks reading {CHUNKS_PER_SEEK} chunks each")
+
+        decoder = AudioDecoder()
+        decoder.sample_format = "s16"
+        loaders = {
+            "ma_decoder": lambda start, n, reverse: decoder._load_converted(path, start, n, CHUNK_FRAMES, reverse, RATE),
+            "mmap views": lambda start, n, reverse: decoder.load_wav(path, start, n, CHUNK_FRAMES, reverse, RATE),
+        }
+        for name, load in loaders.items():
+            results = run(load, num_frames)
+            print(f"{name:>10}: " + ", ".join(f"{kind} {seconds * 1000:7.1f} ms" for kind, seconds in results.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -576,6 +576,7 @@ class MainDisplay(Screen, EffectWidget):
         self.app.music_database.set_shuffle_state(shuffle_state)
         if len(self.app.music_database) != 0:
             self.app.set_audioplayer_attr("next_track_id", self.app.music_database.peek_right(1))
+            self.app.send_audioplayer_func("refresh_head_cache")
 
         if shuffle_state:
             self.shuffle_button.background_normal = f"{common_vars.app_folder}/assets/buttons/shuffle_active_normal.png"
@@ -1048,6 +1049,8 @@ class SongButton(Widget):
             # This won't change the shuffle state, but it will re-shuffle the tracks when a new track is selected
             if self.app.music_database._shuffle:
                 self.app.music_database.set_shuffle_state(self.app.music_database._shuffle)
+            # Have the audioplayer decode the start of the tracks around this one ahead of time
+            self.app.send_audioplayer_func("refresh_head_cache")
             
             touch.ungrab(self)
             return True
@@ -1812,6 +1815,10 @@ class DndAudio(App):
         self.osc_server.handle_request()
         return self.osc_returns
 
+    def send_audioplayer_func(self, func_name, *args):
+        # Like call_audioplayer_func, but doesn't wait for the audioplayer to get to it
+        self.osc_client.send_message("/send", (func_name, *args))
+
     def save_config(self):
         if len(self.music_database) == 0:
             return
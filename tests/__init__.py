@@ -0,0 +1,2 @@
+# Run the tests from the repository root, e.g.
+# python -m pytest tests
@@ -0,0 +1,117 @@
+import time
+import wave
+from threading import Lock, Thread
+import numpy as np
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosegment import AudioSegment
+from tools.audiosinks import NullSink
+from tools.headcache import HeadCache
+
+
+class RecordingSink(NullSink):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.written = []
+
+    def write(self, data):
+        super().write(data)
+        self.written.append(np.frombuffer(bytes(data), dtype=np.int16).reshape(-1, self.channels))
+
+
+def test_pause_plays_out_limiter_lookahead():
+    sink = RecordingSink(rate=44_100)
+    player = AudioPlayer(lock=Lock(), sink=sink)
+    player.get_debug_info = lambda: None # Needs a track loaded
+    try:
+        tone = np.sin(2 * np.pi * 440 * np.arange(2205) / 44_100)[:, None].repeat(2, axis=1).astype(np.float32) * 0.5
+        player.write_to_buffer(AudioSegment(tone, 44_100, 2, 2))
+        player.pause() # pause_flag isn't set, so this returns once it has written its silence
+        player.write_to_buffer(AudioSegment(np.zeros_like(tone), 44_100, 2, 2))
+    finally:
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+
+    before, pause, after = sink.written
+    lookahead = player.limiter.lookahead
+    played = np.concatenate((before, pause))[lookahead:lookahead + len(tone)]
+    assert np.allclose(played / 32768, tone, atol=1e-4) # Every bit of the tone before the pause, nothing after it
+    assert not np.any(pause[lookahead:])
+    assert not np.any(after)
+
+
+def test_frame_pos_counts_track_frames(tmp_path):
+    # A 48 kHz track played at 44.1 kHz, the decoder hands out 44.1 kHz chunks but frame_pos counts 48 kHz frames
+    path = tmp_path / "0.wav"
+    with wave.open(str(path), "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(48_000)
+        fp.writeframes(np.zeros((48_000 * 10, 2), dtype=np.int16).tobytes())
+
+    sink = NullSink(rate=44_100)
+    player = AudioPlayer(lock=Lock(), sink=sink)
+    player.decoder.app_folder = str(tmp_path)
+    player.head_cache = HeadCache(str(tmp_path / "head"))
+    player.track_data = {0: {"file": str(path), "rate": 48_000, "length": 48_000 * 10, "persistent_id": 0}}
+    player.track_id = 0
+    player.status = "playing"
+    thread = Thread(target=player.run, daemon=True)
+    thread.start()
+    try:
+        while sink.seconds_written < 3 and thread.is_alive():
+            time.sleep(0.001)
+    finally:
+        player.status = "stopped"
+        thread.join(5)
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+    assert player.pos > 2000
+    assert abs(player.frame_pos - player.pos * 48) <= 48
+
+
+def test_clearing_next_track_cancels_prefetch(tmp_path):
+    path = tmp_path / "0.wav"
+    with wave.open(str(path), "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(48_000)
+        fp.writeframes(np.zeros((48_000 * 10, 2), dtype=np.int16).tobytes())
+
+    player = AudioPlayer(lock=Lock(), sink=NullSink(rate=44_100))
+    player.decoder.app_folder = str(tmp_path)
+    player.head_cache = HeadCache(str(tmp_path / "head"))
+    try:
+        player.track_data = {0: {"file": str(path), "rate": 48_000, "length": 48_000 * 10, "persistent_id": 0}}
+        player.next_track_id = 0
+        prefetch = player._prefetch
+        assert prefetch is not None and prefetch.key[-1] == 44_100 # Decoded to the output rate
+        player.next_track_id = None
+        assert player._prefetch is None and prefetch._stop.is_set()
+        prefetch._thread.join(5)
+        assert all(chunk.frame_rate == 44_100 for chunk in prefetch.chunks)
+        assert player.decoder.output_rate is None # Left alone, the rate got passed along instead
+    finally:
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+
+
+def test_head_cache_failures_are_counted(tmp_path, capsys):
+    path = tmp_path / "0.mp3"
+    path.write_bytes(b"not an mp3" * 1000)
+
+    player = AudioPlayer(lock=Lock(), sink=NullSink(rate=44_100))
+    player.decoder.app_folder = str(tmp_path)
+    player.head_cache = HeadCache(str(tmp_path / "head"))
+    try:
+        player.track_data = {0: {"file": str(path), "rate": 44_100, "length": 44_100 * 10, "persistent_id": 0}}
+        player.head_cache_candidates = [0]
+        deadline = time.time() + 5
+        while player.head_cache_failures == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert player.head_cache_failures == 1 and player.head_cache_error is not None
+        assert capsys.readouterr().out == "" # Shows up in debug_string instead
+    finally:
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
@@ -0,0 +1,75 @@
+import numpy as np
+
+from tools.audioprocessing import db_to_amp
+from tools.audiosegment import AudioSegment, mix
+
+
+def segment(num_frames=1000, seed=0):
+    samples = np.random.default_rng(seed).integers(-20_000, 20_000, size=(num_frames, 2), dtype=np.int16)
+    return AudioSegment(samples, 44_100, 2, 2), samples.copy()
+
+
+def quantized(values):
+    return np.clip(values, -32768, 32767).astype(np.int16)
+
+
+def samples_of(audio):
+    return np.frombuffer(audio.data, dtype=np.int16).reshape(-1, 2)
+
+
+def test_operations_stay_pending():
+    audio, original = segment()
+    samples = audio._samples
+    audio = (audio + 3).fade(to_gain=-20, start=5, duration=10).reverse() # ms
+    assert audio._pending
+    assert audio._samples is samples and np.array_equal(samples, original) # Nothing computed yet
+
+    envelope = np.ones(1000, dtype=np.float32) # The fade only covers frames 220 to 661
+    envelope[220:661] = np.linspace(1, db_to_amp(-20), 441, dtype=np.float32)
+    expected = quantized(original * np.float32(db_to_amp(3)) * envelope[:, None])[::-1]
+    assert np.abs(samples_of(audio).astype(int) - expected).max() <= 1
+    assert audio._samples is samples # Reading the data doesn't store the result either
+
+
+def test_gains_fold_into_one_pass():
+    audio, original = segment()
+    audio = audio + 20 - 19 # Would clip if the +20 dB got applied on its own
+    assert audio._pending
+    assert np.abs(samples_of(audio).astype(int) - quantized(original * np.float32(db_to_amp(1)))).max() <= 1
+
+
+def test_slices_are_copy_on_write_views():
+    audio, original = segment()
+    part = audio[10:20] # ms
+    assert np.shares_memory(part._samples, audio._samples)
+    assert part.get_num_frames() == 441
+
+    part = part - 6
+    part._data # Evaluates into a new block
+    assert not np.shares_memory(part._samples, audio._samples)
+    assert np.array_equal(samples_of(audio), original)
+    assert np.abs(samples_of(part).astype(int) - quantized(original[441:882] * np.float32(db_to_amp(-6)))).max() <= 1
+
+
+def test_float_render_quantizes_once():
+    audio, original = segment()
+    audio.to_float()
+    assert audio.is_float
+    audio = audio + 30 # Way out of range, but float32 doesn't clip
+    audio = audio.change_speed(1.0)
+    audio = audio - 30
+    assert np.abs(samples_of(audio).astype(int) - original).max() <= 1
+
+    ints, _ = segment()
+    ints = ints + 30
+    ints._data # Integer segments clip when evaluated
+    assert np.abs((ints - 30)._data).max() < 32768 * db_to_amp(-30) + 1
+
+
+def test_mix_applies_pending_gains():
+    first, first_samples = segment(seed=1)
+    second, second_samples = segment(seed=2)
+    out = mix([first - 6, second.reverse()], gains=[0, -6])
+    assert out.is_float
+    expected = (first_samples * db_to_amp(-6) + second_samples[::-1] * db_to_amp(-6)) / 32768
+    assert np.allclose(out._data, expected, atol=1e-6)
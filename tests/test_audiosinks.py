@@ -0,0 +1,79 @@
+import time
+import wave
+from threading import Lock, Thread
+import numpy as np
+import pytest
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosinks import FileSink
+from tools.headcache import HeadCache
+
+
+def write_wav(path, rate, seconds, freq):
+    t = np.arange(rate * seconds) / rate
+    samples = (np.sin(2 * np.pi * freq * t) * 10_000).astype(np.int16)
+    with wave.open(str(path), "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(rate)
+        fp.writeframes(np.repeat(samples[:, None], 2, axis=1).tobytes())
+
+
+def test_wav_rate_locked_once_written(tmp_path):
+    sink = FileSink(str(tmp_path / "out.wav"), rate=44_100)
+    assert not sink.rate_locked
+    sink.set_rate(48_000) # Nothing written yet, the header just changes
+    sink.write(bytes(400))
+    assert sink.rate_locked
+    with pytest.raises(ValueError):
+        sink.set_rate(44_100)
+    sink.close()
+    with wave.open(str(tmp_path / "out.wav"), "rb") as fp:
+        assert fp.getframerate() == 48_000 and fp.getnframes() == 100
+
+    raw = FileSink(str(tmp_path / "out.raw"), rate=44_100)
+    raw.write(bytes(400))
+    assert not raw.rate_locked
+    raw.set_rate(48_000)
+    raw.close()
+
+
+def test_mixed_rates_into_wav(tmp_path):
+    # With follow_track_rate on, the 48 kHz track would need the output reopened, which a WAV that's been written
+    # to can't do, so it has to get resampled to the file's rate instead
+    track_data = {}
+    for track_id, rate in enumerate((44_100, 48_000)):
+        path = tmp_path / f"{track_id}.wav"
+        write_wav(path, rate, 5, 440)
+        track_data[track_id] = {"file": str(path), "rate": rate, "length": 5 * rate, "persistent_id": track_id}
+
+    sink = FileSink(str(tmp_path / "out.wav"), rate=44_100)
+    player = AudioPlayer(lock=Lock(), sink=sink)
+    player.follow_track_rate = True
+    player.decoder.app_folder = str(tmp_path)
+    player.head_cache = HeadCache(str(tmp_path / "head"))
+    player.track_data = track_data
+    player.track_id = 0
+    player.next_track_id = 1
+    player.status = "playing"
+    thread = Thread(target=player.run, daemon=True)
+    thread.start()
+    try:
+        while sink.seconds_written < 9 and thread.is_alive():
+            time.sleep(0.001)
+        alive = thread.is_alive()
+    finally:
+        player.status = "stopped"
+        thread.join(5)
+        sink.close()
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+    assert alive
+    assert player.track_id == 1
+    assert player.rate == 44_100
+    with wave.open(str(tmp_path / "out.wav"), "rb") as fp:
+        assert fp.getframerate() == 44_100
+        assert fp.getnframes() >= 9 * 44_100
+        fp.setpos(7 * 44_100) # Into the second track, played at its own pitch rather than 48/44.1 times too low
+        second = np.frombuffer(fp.readframes(44_100), dtype=np.int16)[::2]
+    assert np.argmax(np.abs(np.fft.rfft(second))) == 440
@@ -0,0 +1,116 @@
+import time
+import wave
+from threading import Lock, Thread
+import numpy as np
+
+from tools.audioplayer import AudioPlayer
+from tools.audiosinks import NullSink
+from tools.bufferpool import BufferPool, chunk_pool
+from tools.headcache import HeadCache
+
+
+def test_blocks_free_once_unused():
+    pool = BufferPool()
+    block = pool.acquire(1000, 2, np.float32)
+    assert block.shape == (1000, 2) and block.flags.writeable
+    view = block[10:20]
+    del block
+    assert pool.acquire(1000, 2, np.float32) is not None
+    assert pool.stats()[:2] == (2, 0) # The first block is still in use through view
+
+    del view
+    pool.acquire(500, 2, np.float32)
+    pool.acquire(1000, 1, np.float32) # Other channel counts and dtypes get their own blocks
+    pool.acquire(1000, 2, np.int16)
+    assert pool.stats() == (4, 1, 4)
+
+
+def test_max_blocks():
+    pool = BufferPool(max_blocks=2)
+    blocks = [pool.acquire(100) for _ in range(4)]
+    assert pool.stats() == (4, 0, 2)
+    pool.reserve(1)
+    assert pool.max_blocks == 2
+    del blocks
+    pool.acquire(100)
+    assert pool.stats() == (4, 1, 2)
+
+
+def test_free_list():
+    pool = BufferPool(max_blocks=152)
+    held = [pool.acquire(256) for _ in range(100)] # Still in use, acquire doesn't have to look at these
+    small, large = pool.acquire(256), pool.acquire(1024)
+    small_address, large_address = small.ctypes.data, large.ctypes.data
+    del small, large
+    assert pool.acquire(1000).ctypes.data == large_address # Skips the free block that's too small
+    assert pool.acquire(200).ctypes.data == small_address
+    assert pool.stats() == (102, 2, 102)
+    assert len(held) == 100
+
+
+def write_wav(path, rate, seconds):
+    t = np.arange(rate * seconds) / rate
+    samples = (np.sin(2 * np.pi * 440 * t) * 10_000).astype(np.int16)
+    with wave.open(str(path), "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(rate)
+        fp.writeframes(np.repeat(samples[:, None], 2, axis=1).tobytes())
+
+
+class PacedSink(NullSink):
+    """
+    A NullSink that takes a little while per chunk, so the prefetch and decode queues fill up the way they do
+    during real playback (just 25 times faster)
+    """
+
+    def write(self, data):
+        super().write(data)
+        time.sleep(0.002)
+
+
+def play(thread, sink, seconds):
+    while sink.seconds_written < seconds and thread.is_alive():
+        time.sleep(0.001)
+
+
+def test_steady_state_playback_doesnt_allocate(tmp_path):
+    # 48 kHz tracks played at 44.1 kHz, so every chunk gets decoded (and converted) into the pool
+    track_data = {}
+    for track_id in range(2):
+        path = tmp_path / f"{track_id}.wav"
+        write_wav(path, 48_000, 8)
+        track_data[track_id] = {"file": str(path), "rate": 48_000, "length": 8 * 48_000, "persistent_id": track_id}
+
+    sink = PacedSink(rate=44_100)
+    player = AudioPlayer(lock=Lock(), sink=sink)
+    player.decoder.app_folder = str(tmp_path)
+    player.head_cache = HeadCache(str(tmp_path / "head"))
+    player.track_data = track_data
+    player.track_id = 0
+    player.next_track_id = 1
+
+    def call_music_database_func(func_name, *args): # Stands in for the music database, the two tracks take turns
+        if func_name == "peek_right":
+            player.next_track_id = 1 - player.track_id
+    player.call_music_database_func = call_music_database_func
+    player.status = "playing"
+    thread = Thread(target=player.run, daemon=True)
+    thread.start()
+    try:
+        play(thread, sink, 40) # Warm up through a few crossfades with the next track prefetched
+        chunk_pool.reset_stats()
+        held_before = chunk_pool.stats()[2]
+        play(thread, sink, 80)
+        allocations, reuses, held = chunk_pool.stats()
+    finally:
+        player.status = "stopped"
+        thread.join(5)
+        player.osc_server.shutdown()
+        player.osc_server.server_close()
+    assert sink.seconds_written >= 80
+    assert reuses > 1000
+    # Every block allocated was kept, i.e. the pool never ran out of room and fell back to allocating per chunk.
+    # How many chunks are held at the busiest moment depends a little on thread timing, so a new high may still come up
+    assert held - held_before == allocations
+    assert allocations <= 2
@@ -0,0 +1,157 @@
+import struct
+import wave
+import miniaudio
+import numpy as np
+import pytest
+
+from tools.audioplayer import AudioDecoder
+from tools.memoryfile import MemoryFile
+
+RATE = 44_100
+CHUNK = 2205
+
+
+def write_mono_wav(path, num_frames=5 * RATE, seed=0):
+    samples = np.random.default_rng(seed).integers(-30_000, 30_000, size=num_frames, dtype=np.int16)
+    with wave.open(str(path), "wb") as fp:
+        fp.setnchannels(1)
+        fp.setsampwidth(2)
+        fp.setframerate(RATE)
+        fp.writeframes(samples.tobytes())
+    return str(path), np.repeat(samples[:, None], 2, axis=1)
+
+
+def write_mp3(path, num_frames=200, seed=0):
+    """
+    A LAME tagged MP3 (so dr_mp3 trims an encoder delay) of noise: every granule's side info points to a count1
+    region of table B, where any string of bits is valid huffman data, so the main data can just be random bits
+    """
+    header = b"\xff\xfb\x90\x00" # MPEG 1 layer 3, 128 kbps, 44.1 kHz, stereo, no CRC
+    frame_len, region_bits = 417, 400
+    info = bytearray(frame_len)
+    info[:4] = header
+    info[36:44] = b"Info" + struct.pack(">I", 0)
+    info[44:48] = b"LAME"
+    info[65:68] = bytes((576 >> 4, (576 & 15) << 4 | 1000 >> 8, 1000 & 255)) # 576 frames delay, 1000 padding
+
+    # part2_3_length, global_gain and count1table_select set, everything else 0
+    granule = f"{region_bits:012b}" + "0" * 9 + f"{175:08b}" + "0" * 29 + "1"
+    side_info = "0" * 20 + granule * 4
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(num_frames):
+        bits = side_info + "".join(rng.choice(["0", "1"], size=4 * region_bits))
+        bits += "0" * (-len(bits) % 8)
+        body = int(bits, 2).to_bytes(len(bits) // 8, "big")
+        frames.append(header + body + bytes(frame_len - 4 - len(body)))
+    with open(path, "wb") as fp:
+        fp.write(b"ID3\x04\x00\x00\x00\x00\x00\x00" + bytes(info) + b"".join(frames))
+    samples = miniaudio.decode_file(str(path), miniaudio.SampleFormat.SIGNED16, 2, RATE).samples
+    return str(path), np.array(samples, dtype=np.int16).reshape(-1, 2)
+
+
+@pytest.fixture
+def decoder():
+    # Mono files don't match the decoder's channels, so they go through ma_decoder (see _load_converted)
+    decoder = AudioDecoder()
+    decoder.sample_format = "s16"
+    yield decoder
+    decoder.close_streams()
+
+
+def read(decoder, file, start_frame, num_chunks, reverse=False, take=None):
+    chunks = []
+    generator = decoder.load_wav(file, start_frame, num_chunks, CHUNK, reverse, RATE)
+    for chunk in generator:
+        chunks.append(np.array(chunk._data))
+        if len(chunks) == take:
+            break
+    generator.close() # Like a seek dropping the generator
+    return np.concatenate(chunks)
+
+
+def test_seeks_reuse_one_stream(decoder, tmp_path):
+    file, reference = write_mono_wav(tmp_path / "track.wav")
+    positions = [0, 100_000, 3, 200_000, 100_000, 150_001, 0]
+    for position in positions:
+        assert np.array_equal(read(decoder, file, position, 10, take=4), reference[position:position + 4 * CHUNK])
+    assert decoder.streams_opened == 1
+    assert decoder.streams_reused == len(positions) - 1
+
+
+def test_read_to_the_end(decoder, tmp_path):
+    file, reference = write_mono_wav(tmp_path / "track.wav")
+    start = len(reference) - 3 * CHUNK - 100
+    assert np.array_equal(read(decoder, file, start, 10), reference[start:])
+
+
+def test_reverse(decoder, tmp_path):
+    file, reference = write_mono_wav(tmp_path / "track.wav")
+    decoder.reverse_block_len = 200 # ms, so this goes through a few blocks
+    for start in (len(reference), 123_456, CHUNK * 7):
+        out = read(decoder, file, start, 1000, reverse=True)
+        assert np.array_equal(out, reference[:start][::-1])
+
+    # Forwards again from the same stream, then backwards cut short
+    assert np.array_equal(read(decoder, file, 5000, 2), reference[5000:5000 + 2 * CHUNK])
+    assert np.array_equal(read(decoder, file, 90_000, 100, reverse=True, take=3), reference[90_000 - 3 * CHUNK:90_000][::-1])
+    assert decoder.streams_opened == 1
+    assert decoder.streams_reused == 4
+
+
+def test_streams_per_file_and_format(decoder, tmp_path):
+    files = [write_mono_wav(tmp_path / f"{i}.wav", RATE, seed=i) for i in range(decoder.max_open_streams + 1)]
+    for file, reference in files:
+        assert np.array_equal(read(decoder, file, 0, 1), reference[:CHUNK])
+    assert decoder.streams_opened == len(files)
+    assert len(decoder._open_streams) == decoder.max_open_streams
+
+    file, reference = files[-1]
+    read(decoder, file, 0, 1)
+    assert decoder.streams_reused == 1
+    read(decoder, files[0][0], 0, 1) # Closed to make room for the last one
+    assert decoder.streams_opened == len(files) + 1
+
+    decoder.sample_format = "f32" # A stream only gets reused for the same output format
+    out = read(decoder, file, 0, 1)
+    assert np.allclose(out, reference[:CHUNK] / 32768)
+    assert decoder.streams_opened == len(files) + 2
+
+
+def test_mp3_seeks_after_reading(tmp_path):
+    # Without a seek index
+    file, reference = write_mp3(tmp_path / "track.mp3")
+    stream = AudioDecoder.MiniaudioDecoderStream(file, 1000, data=MemoryFile(file))
+    out = np.empty((CHUNK, 2), dtype=np.int16)
+    for position in (50_000, 70_000, 20_000, 0, 100_000):
+        stream.seek(position)
+        num_frames = stream.read_into(out)
+        assert np.array_equal(out[:num_frames], reference[position:position + CHUNK])
+    stream.close()
+
+
+def test_mp3_reverse(decoder, tmp_path):
+    file, reference = write_mp3(tmp_path / "track.mp3")
+    assert np.abs(reference).mean() > 100 # Not silence, a jump would show
+    decoder.reverse_block_len = 200
+    for start in (len(reference), 123_456, CHUNK * 7):
+        out = np.concatenate([np.array(chunk._data) for chunk in decoder.load_mp3(file, None, start, 1000, CHUNK, RATE, True)])
+        assert np.array_equal(out, reference[:start][::-1])
+
+
+def test_read_ahead_follows_decoding(decoder, tmp_path, monkeypatch):
+    file, reference = write_mono_wav(tmp_path / "track.wav")
+    size = (tmp_path / "track.wav").stat().st_size
+    offsets = []
+    read_ahead = MemoryFile.read_ahead
+    monkeypatch.setattr(MemoryFile, "read_ahead", lambda self, offset: offsets.append(offset) or read_ahead(self, offset))
+    decoder.track_read_ahead = 2**16
+
+    out = np.concatenate([np.array(chunk._data) for chunk in decoder.load_wav(file, 0, 1000, CHUNK, False, RATE, len(reference))])
+    assert np.array_equal(out, reference)
+    assert offsets[0] == 0 and offsets == sorted(offsets)
+    assert max(np.diff(offsets + [size])) <= 2**16 # Never decoded past what was read ahead
+
+    offsets.clear()
+    read(decoder, file, 150_000, 1) # The stream gets reused and seeked
+    assert abs(offsets[0] - size * 150_000 / len(reference)) < 2 * CHUNK * 2
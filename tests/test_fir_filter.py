@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from tools.audioprocessing import FIRLowpassFilter, lowpass_kernel
+
+RATE = 44_100
+CUTOFF = 15_000
+
+
+def reference(stream, num_taps):
+    """
+    The whole stream filtered in one go, cut to the filter's output (the first num_taps - 1 samples see silence before the stream)
+    """
+    kernel = lowpass_kernel(CUTOFF, RATE, num_taps)
+    return np.stack([np.convolve(stream[:, c].astype(np.float64), kernel)[:stream.shape[0]] for c in range(stream.shape[1])], axis=1)
+
+
+def filter_chunks(filter, stream, chunk_sizes):
+    out, start = [], 0
+    for size in chunk_sizes:
+        out.append(filter.filter_signal(stream[start:start + size], None))
+        start += size
+    return np.concatenate(out)
+
+
+@pytest.mark.parametrize("method", ["direct", "fft", "auto"])
+@pytest.mark.parametrize("num_taps", [3, 51, 201, 1001])
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 2205, 4410])
+def test_chunked_matches_full_convolution(method, num_taps, chunk_size):
+    rng = np.random.default_rng(num_taps * chunk_size)
+    num_chunks = max(3 * num_taps // chunk_size, 8) # Enough to run through the history more than once
+    stream = rng.uniform(-1, 1, size=(num_chunks * chunk_size, 2))
+
+    out = filter_chunks(FIRLowpassFilter(CUTOFF, RATE, num_taps, method=method), stream, [chunk_size] * num_chunks)
+    assert out.shape == stream.shape
+    assert np.allclose(out, reference(stream, num_taps), atol=1e-9)
+
+
+@pytest.mark.parametrize("method", ["direct", "fft"])
+@pytest.mark.parametrize("num_taps", [51, 401])
+def test_uneven_chunks(method, num_taps):
+    # Slowing down gives chunks of varying length, some shorter than the kernel
+    rng = np.random.default_rng(num_taps)
+    chunk_sizes = list(rng.integers(1, 3 * num_taps, size=40))
+    stream = rng.uniform(-1, 1, size=(sum(chunk_sizes), 2)).astype(np.float32)
+
+    out = filter_chunks(FIRLowpassFilter(CUTOFF, RATE, num_taps, method=method), stream, chunk_sizes)
+    assert out.dtype == np.float32
+    assert np.allclose(out, reference(stream, num_taps), atol=1e-5)
+
+
+def test_mono_and_clipping():
+    stream = np.random.default_rng(0).uniform(-60_000, 60_000, size=500)
+    out = FIRLowpassFilter(CUTOFF, RATE, 51, num_channels=1).filter_signal(stream, np.int16)
+    assert out.shape == (500,)
+    assert np.allclose(out, np.clip(reference(stream[:, None], 51)[:, 0], -32768, 32767))
+    assert out.max() == 32767 and out.min() == -32768
+
+
+def tone_gains(cutoffs, change_chunks, chunk_size=110, num_chunks=40, freq=8_000):
+    """
+    Filters an 8 kHz tone chunk by chunk, switching to the next cutoff at each of change_chunks, and returns how loud
+    the tone comes out at every sample where it's far enough from a zero crossing to tell (the kernels all have the same
+    delay, so the output is just the delayed tone times the gain of whatever blend of kernels is playing)
+    """
+    num_taps = 201
+    tone = np.cos(2 * np.pi * freq * np.arange(chunk_size * num_chunks) / RATE)
+    filter = FIRLowpassFilter(cutoffs[0], RATE, num_taps, num_channels=1, method="direct")
+    out = []
+    for i in range(num_chunks):
+        if i in change_chunks:
+            filter.set_new_filter(cutoffs[change_chunks.index(i) + 1], RATE, num_taps)
+        out.append(filter.filter_signal(tone[i * chunk_size:(i + 1) * chunk_size], None))
+    out = np.concatenate(out)[num_taps:]
+    delayed = tone[num_taps - (num_taps - 1) // 2:len(tone) - (num_taps - 1) // 2]
+    usable = np.abs(delayed) > 0.5
+    return out[usable] / delayed[usable]
+
+
+def test_kernel_change_during_crossfade():
+    # 20 kHz and 10 kHz let the tone through, 5 kHz doesn't. The second change comes halfway through the first crossfade
+    gains = tone_gains((20_000, 5_000, 10_000), [4, 6])
+    assert np.max(np.abs(np.diff(gains))) < 0.02 # A jump would be about 0.5
+    assert gains.min() < 0.05 # Went all the way to 5 kHz first
+    assert abs(gains[-1] - 1) < 0.01
+
+
+def test_kernel_change_back_during_crossfade():
+    gains = tone_gains((20_000, 5_000, 20_000), [4, 6])
+    assert np.max(np.abs(np.diff(gains))) < 0.02
+    assert abs(gains[-1] - 1) < 0.01
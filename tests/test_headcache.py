@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pytest
+
+from tools.headcache import HeadCache
+
+ENTRY_BYTES = 1000 * 2 * 2
+
+
+def frames(seed):
+    return np.random.default_rng(seed).integers(-30_000, 30_000, size=(1000, 2), dtype=np.int16)
+
+
+def names(cache):
+    return [name for name in cache._entries]
+
+
+def test_put_get(tmp_path):
+    cache = HeadCache(str(tmp_path / "head"))
+    name = HeadCache.entry_name(1, "track.mp3", 1234, "s16")
+    assert name != HeadCache.entry_name(1, "track.mp3", 1235, "s16")
+    assert cache.get(name, np.int16, 2) is None
+    cache.put(name, frames(0))
+    assert name in cache
+
+    out = cache.get(name, np.int16, 2)
+    assert np.array_equal(out, frames(0))
+    assert not out.flags.writeable
+    assert (cache.hits, cache.misses, cache.size) == (1, 1, ENTRY_BYTES)
+
+
+def test_least_recently_used_goes_first(tmp_path):
+    cache = HeadCache(str(tmp_path), budget=3 * ENTRY_BYTES)
+    for name in "abc":
+        cache.put(name, frames(0))
+    cache.get("a", np.int16, 2)
+    cache.put("d", frames(0))
+    assert names(cache) == ["c", "a", "d"]
+    assert not os.path.exists(tmp_path / "b.pcm")
+    assert cache.size == 3 * ENTRY_BYTES
+
+    cache.put("c", frames(1)) # Replacing an entry makes it the most recent one, without counting it twice
+    assert names(cache) == ["a", "d", "c"]
+    assert cache.size == 3 * ENTRY_BYTES
+
+    cache.put("big", np.zeros((4000, 2), dtype=np.int16)) # Bigger than the whole budget
+    assert "big" not in cache and names(cache) == ["a", "d", "c"]
+
+
+def test_order_survives_restart(tmp_path):
+    cache = HeadCache(str(tmp_path), budget=3 * ENTRY_BYTES)
+    for i, name in enumerate("abc"):
+        cache.put(name, frames(i))
+        os.utime(tmp_path / f"{name}.pcm", ns=(10**18 + i, 10**18 + i))
+    os.utime(tmp_path / "a.pcm", ns=(10**18 + 5, 10**18 + 5)) # As if a was used last
+
+    cache = HeadCache(str(tmp_path), budget=3 * ENTRY_BYTES)
+    assert names(cache) == ["b", "c", "a"]
+    assert cache.size == 3 * ENTRY_BYTES
+    cache.put("d", frames(3))
+    assert names(cache) == ["c", "a", "d"]
+
+
+def test_writes_are_atomic(tmp_path, monkeypatch):
+    cache = HeadCache(str(tmp_path))
+    cache.put("a", frames(0))
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        cache.put("b", frames(1))
+    with pytest.raises(OSError):
+        cache.put("a", frames(1))
+    monkeypatch.undo()
+
+    # A write that didn't finish never shows up under the entry's name, the old entry is still intact
+    assert "b" not in cache and not os.path.exists(tmp_path / "b.pcm")
+    assert np.array_equal(cache.get("a", np.int16, 2), frames(0))
+
+    cache = HeadCache(str(tmp_path)) # Leftovers get cleaned up
+    assert sorted(os.listdir(tmp_path)) == ["a.pcm"]
+    assert names(cache) == ["a"]
+
+
+def test_deleted_from_under_us(tmp_path):
+    cache = HeadCache(str(tmp_path))
+    cache.put("a", frames(0))
+    os.remove(tmp_path / "a.pcm")
+    assert cache.get("a", np.int16, 2) is None
+    assert "a" not in cache and cache.size == 0
+
+
+def test_missing_folder(tmp_path):
+    cache = HeadCache(str(tmp_path / "not" / "there"))
+    assert cache.size == 0
+    cache.put("a", frames(0))
+    assert np.array_equal(cache.get("a", np.int16, 2), frames(0))
@@ -0,0 +1,48 @@
+import tracemalloc
+import numpy as np
+
+from tools.audioprocessing import SoftLimiter, db_to_amp
+
+
+def loud_stream(num_frames=40_000, seed=0):
+    rng = np.random.default_rng(seed)
+    envelope = np.repeat(rng.choice([0.3, 1.5, 4.0], size=num_frames // 1000), 1000)[:, None]
+    envelope[:1000] = 0.3 # Starts out quiet
+    return (rng.uniform(-1, 1, size=(num_frames, 2)) * envelope).astype(np.float32)
+
+
+def test_chunks_line_up():
+    stream = loud_stream()
+    whole = SoftLimiter().process(stream.copy())
+
+    limiter = SoftLimiter()
+    sizes = np.random.default_rng(1).choice([1, 5, 220, 221, 2205, 9000], size=100)
+    edges = np.concatenate(([0], np.cumsum(sizes)))
+    edges = edges[edges < len(stream)].tolist() + [len(stream)]
+    chunked = np.concatenate([limiter.process(stream[start:end].copy()) for start, end in zip(edges, edges[1:])])
+    assert np.array_equal(chunked, whole)
+
+
+def test_limits_in_place():
+    limiter = SoftLimiter()
+    stream = loud_stream()
+    out = limiter.process(stream)
+    assert out is stream
+    assert np.abs(out).max() <= db_to_amp(-0.1) + 1e-6
+    # Delayed by the lookahead, the first 1000 frames (at 0.3) are left alone
+    assert np.array_equal(out[limiter.lookahead:1000], loud_stream()[:1000 - limiter.lookahead])
+
+
+def test_no_allocations_once_warm():
+    limiter = SoftLimiter()
+    chunks = np.split(loud_stream(44_000), 20)
+    for chunk in chunks[:5]:
+        limiter.process(chunk.copy())
+    tracemalloc.start()
+    try:
+        for chunk in chunks:
+            limiter.process(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 8192 # Only python objects (views and the like), a chunk's worth of samples is 17 KB
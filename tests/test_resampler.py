@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from tools.audioprocessing import StreamingResampler
+
+
+@pytest.mark.parametrize("ratio", [0.5, 0.9, 1.0, 1.37, 2.0])
+def test_chunks_line_up(ratio):
+    rng = np.random.default_rng(0)
+    stream = rng.uniform(-1, 1, size=(20_000, 2))
+    whole = StreamingResampler().process(stream, ratio)
+
+    resampler = StreamingResampler()
+    sizes = rng.integers(1, 3000, size=100)
+    edges = np.concatenate(([0], np.cumsum(sizes)))
+    edges = edges[edges < len(stream)].tolist() + [len(stream)]
+    chunked = np.concatenate([resampler.process(stream[start:end], ratio) for start, end in zip(edges, edges[1:])])
+
+    assert chunked.shape == whole.shape
+    assert np.allclose(chunked, whole)
+    assert abs(len(chunked) - len(stream) / ratio) <= max(1 / ratio, 1) # What's past the last frame waits for the next chunk
+
+
+def test_interpolates_linearly():
+    ramp = np.arange(100, dtype=np.float32)[:, None].repeat(2, axis=1)
+    out = StreamingResampler().process(ramp, 0.25)
+    assert out.dtype == np.float32
+    # Positions start at the first frame of the chunk, with silence before it
+    assert np.allclose(out[:, 0], np.arange(len(out)) * 0.25)
@@ -0,0 +1,96 @@
+from threading import Thread
+import numpy as np
+
+from tools.ringbuffer import RingBuffer
+
+
+def frames(start, num_frames):
+    return (np.arange(start * 2, (start + num_frames) * 2) % 2**15).astype(np.int16).reshape(-1, 2)
+
+
+def read_frames(buffer, num_frames):
+    return np.frombuffer(bytes(buffer.read(num_frames)), dtype=np.int16).reshape(-1, 2)
+
+
+def test_wraparound():
+    buffer = RingBuffer(100)
+    position = 0
+    for num_frames in (70, 60, 99, 1, 100, 37): # Every write after the first wraps or ends right at the end
+        assert buffer.write(frames(position, num_frames)) == num_frames
+        assert len(buffer) == num_frames
+        assert np.array_equal(read_frames(buffer, num_frames), frames(position, num_frames))
+        position += num_frames
+    assert buffer.frames_written == buffer.frames_read == position
+    assert buffer.underruns == 0 and buffer.overruns == 0
+
+
+def test_bytes_and_partial_reads():
+    buffer = RingBuffer(64)
+    buffer.write(frames(0, 50).tobytes())
+    assert np.array_equal(read_frames(buffer, 20), frames(0, 20))
+    buffer.write(memoryview(frames(50, 30).tobytes())) # Wraps
+    assert buffer.free() == 64 - 60
+    assert np.array_equal(read_frames(buffer, 60), frames(20, 60))
+
+
+def test_underruns():
+    buffer = RingBuffer(100)
+    assert len(buffer.read(10)) == 0
+    assert buffer.underruns == 0 # Nothing's been written yet, that's not an underrun
+
+    buffer.write(frames(0, 30))
+    assert len(read_frames(buffer, 20)) == 20
+    assert len(read_frames(buffer, 20)) == 10
+    assert buffer.underruns == 1
+    buffer.read(20)
+    assert buffer.underruns == 1 # Still the same one until something gets written
+
+    buffer.write(frames(30, 10))
+    buffer.read(20)
+    assert buffer.underruns == 2
+
+    buffer.write(frames(40, 10))
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.read(20)
+    assert buffer.underruns == 2 # clear() means we stopped on purpose
+
+    buffer.write(frames(50, 10))
+    buffer.mark_stopped() # Pausing, what's left still plays out
+    assert len(read_frames(buffer, 20)) == 10
+    buffer.read(20)
+    assert buffer.underruns == 2
+    buffer.write(frames(60, 10))
+    buffer.read(20)
+    assert buffer.underruns == 3
+
+
+def test_overruns():
+    buffer = RingBuffer(100)
+    buffer.target = 50
+    assert buffer.write(frames(0, 80), timeout=0.01) == 50
+    assert buffer.overruns == 1
+    assert buffer.write(frames(50, 10), timeout=0.01) == 0
+    assert buffer.overruns == 2
+
+
+def test_threads():
+    buffer = RingBuffer(97)
+    total = 5_000
+    out = []
+
+    def consume():
+        read = 0
+        while read < total:
+            chunk = read_frames(buffer, 13)
+            out.append(chunk)
+            read += len(chunk)
+
+    consumer = Thread(target=consume, daemon=True)
+    consumer.start()
+    for start in range(0, total, 250):
+        buffer.write(frames(start, 250)) # Waits for the consumer most of the time
+    consumer.join(10)
+    assert not consumer.is_alive()
+    assert np.array_equal(np.concatenate(out), frames(0, total))
+    assert buffer.overruns > 0
@@ -0,0 +1,68 @@
+import struct
+import numpy as np
+
+from tools.seekindex import Mp3SeekIndex, DECODER_DELAY
+
+HEADER = b"\xff\xfb\x90\x00" # MPEG 1 layer 3, 128 kbps, 44.1 kHz, stereo, no CRC
+FRAME_LEN = 417
+ENCODER_DELAY = 576
+ENCODER_PADDING = 1000
+
+
+def mp3_bytes(num_frames=20):
+    """
+    An ID3 tag, a Xing/LAME frame and num_frames silent audio frames (only the headers have to be right for the index)
+    """
+    info = bytearray(FRAME_LEN)
+    info[:4] = HEADER
+    tag = 4 + 32
+    info[tag:tag + 8] = b"Info" + struct.pack(">I", 0)
+    lame = tag + 8
+    info[lame:lame + 4] = b"LAME"
+    info[lame + 21:lame + 24] = bytes((ENCODER_DELAY >> 4, (ENCODER_DELAY & 15) << 4 | ENCODER_PADDING >> 8, ENCODER_PADDING & 255))
+    audio = (HEADER + bytes(FRAME_LEN - 4)) * num_frames
+    return b"ID3\x04\x00\x00\x00\x00\x00\x00" + bytes(info) + audio
+
+
+def build(tmp_path, data):
+    path = tmp_path / "track.mp3"
+    path.write_bytes(data)
+    return Mp3SeekIndex.build(str(path))
+
+
+def test_build(tmp_path):
+    index = build(tmp_path, mp3_bytes(20))
+    assert index.rate == 44_100
+    assert index.delay == ENCODER_DELAY + DECODER_DELAY
+    assert index.num_frames == 20 * 1152 - index.delay - (ENCODER_PADDING - DECODER_DELAY)
+    assert list(index.offsets[:2]) == [10 + FRAME_LEN, 10 + 2 * FRAME_LEN]
+    assert index.frame_at(0) == index.delay // 1152
+
+
+def test_truncated_and_corrupt_files(tmp_path):
+    """
+    Broken files either still give an index or raise ValueError, never anything else
+    """
+    data = mp3_bytes(4)
+    rng = np.random.default_rng(0)
+    broken = [data[:length] for length in range(len(data))]
+    for _ in range(200):
+        corrupt = bytearray(data[:rng.integers(0, len(data))])
+        for pos in rng.integers(0, max(len(corrupt), 1), size=8):
+            if pos < len(corrupt):
+                corrupt[pos] = int(rng.integers(0, 256))
+        broken.append(bytes(corrupt))
+
+    for file_data in broken:
+        try:
+            index = build(tmp_path, file_data)
+        except ValueError:
+            continue
+        assert index.num_frames > 0
+
+
+def test_load_unreadable(tmp_path):
+    path = tmp_path / "index.npz"
+    assert Mp3SeekIndex.load(str(path)) is None
+    path.write_bytes(b"PK\x03\x04 not really a zip")
+    assert Mp3SeekIndex.load(str(path)) is None
@@ -0,0 +1,106 @@
+import os
+import struct
+import wave
+import numpy as np
+
+from tools.wavfile import MappedWavFile, open_mapped_wav
+
+SUBFORMAT_GUID_TAIL = b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+
+def samples(num_frames=1000, channels=2, dtype=np.int16):
+    rng = np.random.default_rng(0)
+    if dtype == np.float32:
+        return rng.uniform(-1, 1, size=(num_frames, channels)).astype(np.float32)
+    return rng.integers(-30_000, 30_000, size=(num_frames, channels), dtype=np.int16)
+
+
+def wav_bytes(frames, rate=48_000, extensible=False, extra_chunks=(), data_size=None):
+    """
+    A WAV file laid out by hand: fmt (WAVE_FORMAT_EXTENSIBLE if extensible), extra_chunks ((id, payload) pairs) and data
+    """
+    channels = frames.shape[1]
+    bits = frames.dtype.itemsize * 8
+    format_tag = 3 if frames.dtype == np.float32 else 1
+    block_align = channels * bits // 8
+    fmt = struct.pack("<HHIIHH", 0xFFFE if extensible else format_tag, channels, rate, rate * block_align, block_align, bits)
+    if extensible:
+        fmt += struct.pack("<HHI", 22, bits, 3) + struct.pack("<H", format_tag) + SUBFORMAT_GUID_TAIL
+
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    for chunk_id, payload in extra_chunks:
+        body += chunk_id + struct.pack("<I", len(payload)) + payload + b"\x00" * (len(payload) & 1)
+    data = frames.tobytes()
+    body += b"data" + struct.pack("<I", len(data) if data_size is None else data_size) + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def write(tmp_path, data, name="test.wav"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_plain_pcm(tmp_path):
+    frames = samples()
+    path = str(tmp_path / "test.wav")
+    with wave.open(path, "wb") as fp:
+        fp.setnchannels(2)
+        fp.setsampwidth(2)
+        fp.setframerate(44_100)
+        fp.writeframes(frames.tobytes())
+
+    wav = MappedWavFile(path)
+    assert (wav.channels, wav.rate, wav.num_frames, wav.dtype) == (2, 44_100, 1000, np.int16)
+    assert np.array_equal(wav.frames, frames)
+    assert not wav.frames.flags.writeable
+
+
+def test_extensible(tmp_path):
+    for dtype in (np.int16, np.float32):
+        frames = samples(dtype=dtype)
+        # An odd sized chunk before the data has a pad byte after it
+        wav = MappedWavFile(write(tmp_path, wav_bytes(frames, extensible=True, extra_chunks=[(b"LIST", b"abc")])))
+        assert (wav.channels, wav.rate, wav.num_frames, wav.dtype) == (2, 48_000, 1000, dtype)
+        assert np.array_equal(wav.frames, frames)
+
+
+def test_chunks_are_views(tmp_path):
+    frames = samples(channels=1)
+    wav = MappedWavFile(write(tmp_path, wav_bytes(frames)))
+    forward = wav.chunk(100, 200)
+    backward = wav.chunk(100, 200, reverse=True)
+    assert np.array_equal(forward, frames[100:200])
+    assert np.array_equal(backward, frames[100:200][::-1])
+    assert np.shares_memory(forward, wav.frames) and np.shares_memory(backward, wav.frames)
+    assert wav.chunk(-50, 10).shape == (10, 1)
+    assert wav.chunk(990, 1100).shape == (10, 1)
+
+
+def test_streaming_placeholder_size(tmp_path):
+    frames = samples()
+    wav = MappedWavFile(write(tmp_path, wav_bytes(frames, data_size=0xFFFFFFFF)))
+    assert wav.num_frames == 1000
+    # Cut off halfway through a frame
+    wav = MappedWavFile(write(tmp_path, wav_bytes(frames)[:-3], "cut.wav"))
+    assert wav.num_frames == 999
+
+
+def test_unmappable(tmp_path):
+    frames = samples()
+    assert open_mapped_wav(write(tmp_path, b"RIFX" + wav_bytes(frames)[4:], "rifx.wav")) is None
+    assert open_mapped_wav(write(tmp_path, wav_bytes(frames)[:30], "short.wav")) is None
+    assert open_mapped_wav(write(tmp_path, wav_bytes(samples(dtype=np.float32).view(np.int32)), "int32.wav")) is None
+    assert open_mapped_wav(write(tmp_path, b"", "empty.wav")) is None
+    assert open_mapped_wav(str(tmp_path / "missing.wav")) is None
+
+
+def test_cache_follows_rewrites(tmp_path):
+    path = write(tmp_path, wav_bytes(samples()))
+    wav = open_mapped_wav(path)
+    assert open_mapped_wav(path) is wav
+
+    write(tmp_path, wav_bytes(samples(500)))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert open_mapped_wav(path).num_frames == 500
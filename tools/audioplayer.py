@@ -1,5 +1,11 @@
-from tools.audiosegment import AudioSegment
+from tools.audiosegment import AudioSegment, AudioRope, mix
 from tools.audioprocessing import *
+from tools.bufferpool import chunk_pool
+from tools.ringbuffer import RingBuffer
+from tools.wavfile import open_mapped_wav
+from tools.seekindex import Mp3SeekIndex
+from tools.memoryfile import MemoryFile
+from tools.headcache import HeadCache
 from tools.database import load_db
 import tools.common_vars as common_vars
 
@@ -7,10 +13,12 @@ import numpy as np
 from math import ceil
 import os
 import wave
-from glob import glob
-from threading import Thread, Lock
+from threading import Thread, Lock, Event, Condition
+from weakref import WeakSet
+from collections import deque
 import time
 from functools import reduce
+from contextlib import contextmanager
 
 from pythonosc.dispatcher import Dispatcher
 from pythonosc.osc_server import ThreadingOSCUDPServer
@@ -25,15 +33,52 @@ AUDIO_API = "miniaudio"
 class AudioStreamer():
     """
     Handles pushing bytes to the speaker depending on which audio api / OS we are using.
+
+    In push mode (the default) write() fills a buffer of up to two device periods as fast as the device frees room.
+    In pull mode the device callback asks for exactly the frames it needs: write() only takes data while there's a 
+    request waiting, and returns once the callback has its frames and has asked for the next ones. So the player 
+    renders each chunk right as the device needs it and anything it changes in between is heard one period later.
+
+    In push mode, how much gets buffered (buffer_target_ms) adapts between min_buffer_ms and max_buffer_ms:
+    every underrun grows it by half a period, and every shrink_after seconds without one it shrinks by shrink_step_ms,
+    though never below 4x the measured callback jitter. Set adaptive to False to keep it where it is.
     """
 
-    def __init__(self, channels=2, rate=44_100, buffersize_ms=50, encoding=16):
+    def __init__(self, channels=2, rate=44_100, buffersize_ms=50, encoding=16, pull=False, callback_periods=2,
+                 min_buffer_ms=None, max_buffer_ms=None):
 
         self.channels = channels
         self.rate = rate
         self.buffersize_ms = buffersize_ms
+        self.callback_periods = callback_periods
         self.encoding = encoding
-        
+        self.pull = pull
+
+        self.adaptive = True
+        # The device takes a whole period per callback, so there's no point buffering less than that
+        self.min_buffer_ms = min_buffer_ms if min_buffer_ms is not None else buffersize_ms
+        self.max_buffer_ms = max_buffer_ms if max_buffer_ms is not None else 8 * buffersize_ms
+        self.buffer_target_ms = min(max(2 * buffersize_ms, self.min_buffer_ms), self.max_buffer_ms)
+        self.shrink_after = 5 # s
+        self.shrink_step_ms = 5
+
+        # Callback timing, jitter_ms is a running average (like RTP's interarrival jitter) of how far the time between
+        # two callbacks is from the duration of the audio the first one asked for
+        self.jitter_ms = 0
+        self._last_callback = None
+        self._last_num_frames = 0
+        self._last_adjustment = time.perf_counter()
+
+        # Set by the callback when it needs frames (pull mode)
+        self._frames_wanted = 0
+        self._request = Event()
+        self._delivered = Event()
+        self._producer_idle = False # The callback stops waiting on write() after it timed out once, until the next write
+
+        # Command to output latency, see mark_command()
+        self._command_time = None
+        self._command_frame = None
+        self.command_latencies = deque(maxlen=32) # In ms
 
         if AUDIO_API == "miniaudio":
             self._miniaudio_init()
@@ -46,20 +91,27 @@ class AudioStreamer():
                 self.channels,
                 self.rate,
                 self.buffersize_ms,
-                callback_periods=2
+                callback_periods=self.callback_periods
                 )
         else:
             raise ValueError("8 bit encoding not supported for miniaudio!")
         
         def miniaudio_generator():
-            yield b""
+            num_frames = yield b""
             while self.miniaudio_running:
-                data = self.audio_buffer[0:self.req_audio_buffer_size]
-                del self.audio_buffer[0:self.req_audio_buffer_size]
-                yield data
+                if self.pull and len(self.audio_buffer) < num_frames and not self._producer_idle:
+                    self._wait_for_frames(num_frames)
+                underruns = self.audio_buffer.underruns
+                data = self.audio_buffer.read(num_frames)
+                self._update_telemetry(num_frames, self.audio_buffer.underruns != underruns)
+                if self._command_frame is not None and self.audio_buffer.frames_read > self._command_frame:
+                    self._record_command_latency()
+                num_frames = yield data
         
-        self.req_audio_buffer_size = (self.channels * self.rate * self.encoding//8) // round(1000/self.buffersize_ms)
-        self.audio_buffer = bytearray(self.req_audio_buffer_size)
+        # Allocated for the largest buffer target, write() blocks once the current target is reached
+        self.audio_buffer = RingBuffer(self.rate * self.max_buffer_ms // 1000, self.channels, np.int16)
+        self.buffer_target_ms = self.buffer_target_ms # Applies it to the new buffer
+        self._last_callback = None
         self.miniaudio_running = False
         self.data_generator = miniaudio_generator()
 
@@ -68,18 +120,294 @@ class AudioStreamer():
 
     def write(self, data: bytes):
         pass
+
+    def _wait_for_frames(self, num_frames):
+        """
+        Device side of pull mode: asks write() for num_frames and waits for them, for at most half a period 
+        so the device still has time to play whatever we've got if the player falls behind
+        """
+        self._frames_wanted = num_frames
+        self._delivered.clear()
+        self._request.set()
+        if not self._delivered.wait(self.buffersize_ms / 2000):
+            self._producer_idle = True
+        self._request.clear()
+
+    @property
+    def buffer_target_ms(self):
+        """
+        How much audio write() keeps buffered ahead of the device in push mode
+        """
+        return self._buffer_target_ms
+
+    @buffer_target_ms.setter
+    def buffer_target_ms(self, value):
+        self._buffer_target_ms = min(max(value, self.min_buffer_ms), self.max_buffer_ms)
+        if hasattr(self, "audio_buffer"):
+            self.audio_buffer.target = round(self.rate * self._buffer_target_ms / 1000)
+
+    def _update_telemetry(self, num_frames, underrun):
+        """
+        Called from the device callback after every read: updates jitter_ms and adapts buffer_target_ms
+        """
+        now = time.perf_counter()
+        if self._last_callback is not None:
+            deviation_ms = abs(now - self._last_callback - self._last_num_frames / self.rate) * 1000
+            self.jitter_ms += (deviation_ms - self.jitter_ms) / 16
+        self._last_callback = now
+        self._last_num_frames = num_frames
+
+        if not self.adaptive or self.pull:
+            return
+        if underrun:
+            self.buffer_target_ms += self.buffersize_ms / 2
+            self._last_adjustment = now
+        elif now - self._last_adjustment > self.shrink_after:
+            self._last_adjustment = now
+            floor = max(self.min_buffer_ms, 4 * self.jitter_ms)
+            if self.buffer_target_ms - self.shrink_step_ms >= floor:
+                self.buffer_target_ms -= self.shrink_step_ms
+
+    def mark_stopped(self):
+        """
+        Called when the player stops writing on purpose (pause, stop), so the buffer playing out isn't taken for an 
+        underrun and doesn't grow buffer_target_ms
+        """
+        self.audio_buffer.mark_stopped()
+
+    def mark_command(self):
+        """
+        Starts measuring command to output latency: the time from now until the first frame written after this call 
+        comes out of the device (estimated as the time it's handed to the device plus the one period it waits behind)
+        """
+        self._command_time = time.perf_counter()
+        self._command_frame = None
+
+    def _record_command_latency(self):
+        latency = time.perf_counter() - self._command_time + self.buffersize_ms / 1000
+        self.command_latencies.append(latency * 1000)
+        self._command_time = self._command_frame = None
+
+    @property
+    def buffered_ms(self):
+        """
+        How much audio is waiting in our buffer
+        """
+        return len(self.audio_buffer) / self.rate * 1000
+
+    @property
+    def latency_ms(self):
+        """
+        How far behind the device's output the next write() will be heard: what we've buffered plus the device's period
+        """
+        return len(self.audio_buffer) / self.rate * 1000 + self.buffersize_ms
+
+    @property
+    def underruns(self):
+        """
+        Number of times the device asked for more audio than we had buffered
+        """
+        return self.audio_buffer.underruns
+
+    @property
+    def overruns(self):
+        """
+        Number of times write() found the buffer full and had to wait for the device
+        """
+        return self.audio_buffer.overruns
+
+    @property
+    def rate_locked(self):
+        """
+        Whether set_rate can't be used right now, the device can always be reopened
+        """
+        return False
+
+    def set_rate(self, rate):
+        """
+        Reopens the output at a different sample rate. Everything already written gets played out first
+        """
+        if rate == self.rate:
+            return
+        if AUDIO_API == "miniaudio":
+            self._miniaudio_set_rate(rate)
+    
+    def _miniaudio_set_rate(self, rate):
+        if self.miniaudio_running:
+            # Wait for the device to take everything out of our buffer, then for it to play its own buffer
+            while len(self.audio_buffer):
+                time.sleep(0.002)
+            time.sleep(self.callback_periods * self.buffersize_ms / 1000)
+            self.miniaudio_running = False
+        self.playback_device.close()
+        self.rate = rate
+        self._miniaudio_init()
+
+        # Frame counts and callback timing were for the old device, start them over
+        self._command_frame = None
+        self._frames_wanted = 0
+        self._request.clear()
+        self._delivered.clear()
+        self._producer_idle = False
+        self.jitter_ms = 0
+        self._last_num_frames = 0
+        self._last_adjustment = time.perf_counter()
     
-    def _miniaudio_write(self, data: bytes):
+    def _miniaudio_write(self, data: bytes | memoryview):
         if not self.miniaudio_running:
             self.miniaudio_running = True
             next(self.data_generator)
             self.playback_device.start(self.data_generator)
-        while data:
-            if len(self.audio_buffer) < self.req_audio_buffer_size:
-                self.audio_buffer.extend(data)
-                break
-            else:
-                time.sleep(0.01)
+        if self._command_time is not None and self._command_frame is None:
+            self._command_frame = self.audio_buffer.frames_written
+
+        if not self.pull:
+            self.audio_buffer.write(data)
+            return
+
+        self._producer_idle = False
+        # If the callback gave up on us in the meantime it won't ask again until it runs short, don't wait forever for it
+        self._request.wait(self.buffersize_ms / 1000)
+        self.audio_buffer.write(data)
+        if len(self.audio_buffer) >= self._frames_wanted:
+            self._request.clear()
+            self._delivered.set()
+            # Don't go back to rendering until the device asks again, so the next chunk reflects any changes made until then
+            # (give up after a period so e.g. a stopped device can't hang us)
+            self._request.wait(2 * self.buffersize_ms / 1000)
+
+
+class TrackPrefetch():
+    """
+    Decodes the first few seconds of a track in a background thread, so starting it doesn't have to open, probe and seek
+    the file on the audio thread right as a crossfade begins. key says what was prefetched (see AudioPlayer._prefetch_key),
+    open_track returns the track's chunk generator, and buffer_ms is how much of it to decode ahead
+    """
+
+    def __init__(self, key, open_track, buffer_ms):
+        self.key = key
+        self.chunks = []
+        self.buffered_ms = 0
+        self.generator = None
+        self.error = None
+        self._stop = Event()
+        self._thread = Thread(target=self._run, args=(open_track, buffer_ms), daemon=True)
+        self._thread.start()
+
+    def _run(self, open_track, buffer_ms):
+        try:
+            self.generator = open_track()
+            while self.buffered_ms < buffer_ms and not self._stop.is_set():
+                chunk = next(self.generator, None)
+                if chunk is None:
+                    break
+                self.chunks.append(chunk)
+                self.buffered_ms += len(chunk)
+        except Exception as err: # Opening it again on the audio thread will run into this too, and raise it there
+            self.error = err
+
+    def take(self):
+        """
+        Returns a generator of the chunks decoded so far followed by the rest of the track, or None if it couldn't be opened.
+        If the thread is still decoding, this waits for the chunk it's on
+        """
+        self._stop.set()
+        self._thread.join()
+        if self.error is not None or self.generator is None:
+            return None
+        return self._play(self.chunks, self.generator)
+
+    @staticmethod
+    def _play(chunks, generator):
+        while chunks:
+            yield chunks.pop(0)
+        yield from generator
+
+    def cancel(self):
+        """
+        Stops decoding, the decoder closes once the thread lets go of it
+        """
+        self._stop.set()
+
+
+class DecodeQueue():
+    """
+    Runs a chunk generator on its own worker thread, which decodes up to depth_ms ahead into a queue that iterating over
+    this takes chunks from. So a slow read or a decoding hiccup eats into the queue instead of delaying the next write
+    to the device. miniaudio and numpy let go of the GIL while they work, so the two threads mostly don't get in each
+    other's way.
+
+    close() stops the worker and throws away what's queued (seeks and skips do this by dropping the generator).
+    Every chunk's decode time (ms) is added to decode_times, and waits counts the times a chunk was needed
+    before the worker had one ready (not counting the first one, which always has to wait for the file to open)
+    """
+
+    def __init__(self, generator, depth_ms=500, decode_times=None):
+        self.depth_ms = depth_ms
+        self.buffered_ms = 0
+        self.decode_times = decode_times if decode_times is not None else deque(maxlen=64)
+        self.waits = 0
+        self.error = None
+
+        self._chunks = deque()
+        self._condition = Condition()
+        self._done = False
+        self._stopped = False
+        self._thread = Thread(target=self._run, args=(generator,), daemon=True)
+        self._thread.start()
+
+    def _run(self, generator):
+        try:
+            while True:
+                with self._condition:
+                    while self.buffered_ms >= self.depth_ms and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        break
+
+                start = time.perf_counter()
+                chunk = next(generator, None)
+                if chunk is None:
+                    break
+                self.decode_times.append((time.perf_counter() - start) * 1000)
+
+                with self._condition:
+                    self._chunks.append(chunk)
+                    self.buffered_ms += len(chunk)
+                    self._condition.notify_all()
+        except Exception as err: # Handed over to whoever is reading, it would have hit this without the queue too
+            self.error = err
+        finally:
+            generator.close() # The worker is the only one using the decoder, so it's the one to close it
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def __iter__(self):
+        started = False
+        while True:
+            with self._condition:
+                if not self._chunks and not self._done:
+                    if started:
+                        self.waits += 1
+                    while not self._chunks and not self._done:
+                        self._condition.wait()
+                if not self._chunks:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                chunk = self._chunks.popleft()
+                self.buffered_ms -= len(chunk)
+                self._condition.notify_all()
+            started = True
+            yield chunk
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._chunks.clear()
+            self.buffered_ms = 0
+            self._condition.notify_all()
 
 
 class AudioDecoder():
@@ -88,6 +416,35 @@ class AudioDecoder():
 
         self.app_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
+        # Setting sample_format makes every loader decode through miniaudio's ma_decoder, which converts in C to this
+        # format ("f32" or "s16"), to output_rate (None -> the file's own rate) and to the given number of channels
+        # (so mono files come out as stereo). Left as None, files are decoded to int16 at their own rate like before.
+        # The loaders also take output_rate as an argument, which overrides this one for that call (the player decodes on
+        # more than one thread, so it passes the rate along instead of setting it here)
+        self.sample_format = None
+        self.output_rate = None
+        self.channels = 2
+
+        # Reverse playback decodes forwards through blocks this long (ms) and plays each one back to front
+        self.reverse_block_len = 2000
+
+        # Decoder streams that were done with (or cut short by a seek) stay open in here, so the next read of the same
+        # file (a seek, scrubbing, a repeat) repositions one instead of opening and parsing the file again.
+        # Enough for the playing track and the next one during a crossfade, plus a couple more
+        self.max_open_streams = 4
+        self._open_streams = [] # (key, stream), most recently used last
+        self._open_streams_lock = Lock()
+        self.streams_opened = 0
+        self.streams_reused = 0
+
+        # Tracks get decoded from a memory map of the file (see MemoryFile), which the OS is asked to read this many
+        # bytes ahead of the decoder in the background
+        self.track_read_ahead = 16 * 2**20
+
+        # MP3 seek indexes by persistent track id, see seek_index()
+        self.seek_indexes = {}
+        self._indexing = set()
+
         # if AUDIO_API == "audiotrack":
         #     self._android_init()
         
@@ -97,15 +454,51 @@ class AudioDecoder():
     def _miniaudio_init(self):
         self.load_ogg = self._miniaudio_load_ogg
         self.load_mp3 = self._miniaudio_load_mp3
-        self.mp3_to_wav = self._miniaudio_mp3_to_wav
     
-    def load_ogg(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100):
-        pass
-
-    def load_mp3(self, file, persistent_track_id, start_frame, num_chunks, chunk_frame_len, frame_rate=44_100):
+    @property
+    def pool(self):
+        """
+        The buffer pool decoded chunks are written into
+        """
+        return chunk_pool
+    
+    def seek_index(self, file, persistent_track_id):
+        """
+        Returns the Mp3SeekIndex for an MP3 file, or None while there isn't one yet. Indexes are saved to
+        cache/seek_index so a track only gets scanned once (unless the file changes), the scan runs in the
+        background so the first play of a track doesn't wait on it
+        """
+        if persistent_track_id is None or not file.lower().endswith(".mp3"):
+            return None
+        index = self.seek_indexes.get(persistent_track_id)
+        if index is not None and index.is_current(file):
+            return index
+
+        index_path = f"{self.app_folder}/cache/seek_index/{persistent_track_id}.npz"
+        index = Mp3SeekIndex.load(index_path)
+        if index is not None and index.is_current(file):
+            self.seek_indexes[persistent_track_id] = index
+            return index
+
+        if persistent_track_id not in self._indexing:
+            self._indexing.add(persistent_track_id)
+            Thread(target=self._build_seek_index, args=(file, persistent_track_id, index_path), daemon=True).start()
+        return None
+
+    def _build_seek_index(self, file, persistent_track_id, index_path):
+        try:
+            index = Mp3SeekIndex.build(file)
+            index.save(index_path)
+            self.seek_indexes[persistent_track_id] = index
+        except (OSError, ValueError):
+            pass # Unreadable or not really an MP3, seeks just stay slow
+        finally:
+            self._indexing.discard(persistent_track_id)
+
+    def load_ogg(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100, total_frames=None, output_rate=None):
         pass
 
-    def mp3_to_wav(self, file, persistent_track_id, frame_rate=44_100):
+    def load_mp3(self, file, persistent_track_id, start_frame, num_chunks, chunk_frame_len, frame_rate=44_100, reverse_audio=False, total_frames=None, output_rate=None):
         pass
 
 
@@ -114,19 +507,23 @@ class AudioDecoder():
         The generator for a vorbis file provided by miniaudio:
           a) Doesn't allow us to set a fixed chunk length
           b) Doesn't expose the actual stb_vorbis* pointer, which doesn't allow us to seek (for reversing)
-        Therefore, I made my own class that acts a lot like the pyogg variant to decode bytes and seek
+        Therefore, I made my own class that acts a lot like the pyogg variant to decode bytes and seek.
+        Samples are decoded straight into the array we're given, so there's no intermediate decode buffer.
+        Given a MemoryFile as data, it decodes from that instead of reading the file (and closes it along with itself)
         """
 
-        def __init__(self, file, start_frame=0, frames_to_read=1024):
-            filenamebytes = _get_filename_bytes(file)
+        def __init__(self, file, start_frame=0, frames_to_read=1024, channels=2, data=None):
+            self.data = data
             with ffi.new("int *") as error:
-                self.vorbis = lib.stb_vorbis_open_filename(filenamebytes, error, ffi.NULL)
+                if data is not None:
+                    self.vorbis = lib.stb_vorbis_open_memory(ffi.cast("unsigned char *", data.pointer), len(data), error, ffi.NULL)
+                else:
+                    self.vorbis = lib.stb_vorbis_open_filename(_get_filename_bytes(file), error, ffi.NULL)
                 if not self.vorbis:
                     raise miniaudio.DecodeError("Could not open/decode file")
             self.info = lib.stb_vorbis_get_info(self.vorbis)
-            self.decode_buffer = ffi.new("short[]", frames_to_read * self.info.channels)
-            self.decodebuf_ptr = ffi.cast("short *", self.decode_buffer)
-            self.bytes_per_sample = 2 * self.info.channels
+            self.channels = channels # stb_vorbis will up/downmix to this many channels for us
+            self.reusable = True # Seeks are exact wherever the stream is at
             if start_frame > 0:
                 self.seek(start_frame)
             self.frames_to_read = frames_to_read
@@ -134,131 +531,415 @@ class AudioDecoder():
         def __enter__(self):
             return self
         
-        def get_buffer(self):
-            num_samples = lib.stb_vorbis_get_samples_short_interleaved(self.vorbis, self.info.channels, self.decodebuf_ptr,
-                                                                                self.frames_to_read * self.info.channels)
-            if num_samples <= 0:
-                return bytes(0)
-                    
-            buffer = ffi.buffer(self.decode_buffer, num_samples * self.bytes_per_sample)
-            return bytes(buffer)
+        def read_into(self, out: np.ndarray):
+            """
+            Decodes up to out.shape[0] frames into out (int16, [num_frames, channels]), returns the number of frames read
+            """
+            num_frames = lib.stb_vorbis_get_samples_short_interleaved(self.vorbis, self.channels, 
+                                                                      ffi.cast("short *", ffi.from_buffer(out)), out.size)
+            if self.data is not None:
+                self.data.advance(lib.stb_vorbis_get_file_offset(self.vorbis))
+            return max(num_frames, 0)
         
         def seek(self, seek_frame):
             result = lib.stb_vorbis_seek(self.vorbis, seek_frame)
             if result <= 0:
                 raise miniaudio.DecodeError(f"Can't seek to frame {seek_frame}")
+            if self.data is not None:
+                self.data.read_ahead(lib.stb_vorbis_get_file_offset(self.vorbis))
             
         def close(self):
             self.__exit__()
 
         def __exit__(self, *args):
-            ffi.release(self.decode_buffer)
             lib.stb_vorbis_close(self.vorbis)
+            if self.data is not None:
+                self.data.close()
 
 
-    def load_wav(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100):
+    class MiniaudioDecoderStream():
+        """
+        Thin wrapper around a miniaudio ma_decoder that decodes straight into the array we're given.
+        miniaudio.mp3_stream_file copies every chunk into a new array.array, this avoids that.
+        Given a MemoryFile as data, it decodes from that instead of reading the file (and closes it along with itself).
 
-        with wave.open(file, "rb") as fp:
+        Given an Mp3SeekIndex, seeks jump to the right frame of the MP3 through a second decoder reading the file's data from a few frames before it. ma_decoder on its own can only seek 
+        MP3s by decoding forwards, and backwards seeks start again from the beginning of the file
 
-            for chunk_index in range(num_chunks):
-                if reverse_audio:
-                    frame_pos = -chunk_frame_len*(chunk_index+1) + start_frame
-                    if frame_pos < 0:
-                        chunk_frame_len += frame_pos # frame pos is negative here, so we're subtracting from chunk_frame_len
-                        frame_pos = 0
-                    fp.setpos(frame_pos)
-                else:
-                    fp.setpos(chunk_frame_len*chunk_index + start_frame)
-                byte_data = fp.readframes(chunk_frame_len)
-                audio = AudioSegment(data=byte_data, frame_rate=frame_rate, channels=2, sample_width=2)
-                if reverse_audio:
-                    yield audio.reverse()
-                else:
-                    yield audio
+        ma_decoder doesn't tell us where in the data it is, so the MemoryFile gets told (see MemoryFile.advance) where the
+        seek index puts the position, or failing that, where it would be at the file's average bitrate given total_frames
+        (the length of the file at the output rate)
+        """
 
-    def _miniaudio_load_ogg(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100):
+        # Memory decoders have no file extension to go by
+        ENCODING_FORMATS = {".mp3": lib.ma_encoding_format_mp3, ".ogg": lib.ma_encoding_format_vorbis, 
+                            ".wav": lib.ma_encoding_format_wav, ".flac": lib.ma_encoding_format_flac}
+
+        def __init__(self, file, start_frame=0, channels=2, sample_format=miniaudio.SampleFormat.SIGNED16, sample_rate=0, seek_index=None, data=None, total_frames=None):
+            self.file = file
+            self.total_frames = total_frames
+            self.data = data
+            self.channels = channels
+            self.sample_rate = sample_rate # 0 -> native rate
+            self.sample_format = sample_format
+            self.dtype = np.float32 if sample_format == miniaudio.SampleFormat.FLOAT32 else np.int16
+            self.frames_read = ffi.new("ma_uint64 *")
+            self.decoder = self._init_decoder()
+
+            self.seek_index = seek_index
+            # Positions are at the output rate, the index's are at the file's
+            self._index_scale = sample_rate / seek_index.rate if seek_index is not None and sample_rate else 1
+            # dr_mp3 drops the encoder delay when seeking forwards from anywhere but the start, so plain MP3 seeks
+            # reopen the decoder first (see seek). Without an index that decodes from the start of the file on every
+            # seek, which isn't worth keeping the stream open for
+            self.is_mp3 = file.lower().endswith(".mp3")
+            self.reusable = self.seek_index is not None or not self.is_mp3
+            self._memory_decoder = None # Set while reading from an indexed seek
+            self.position = 0
 
-        miniaudio_stream = self.MiniaudioVorbisFileStream(file, start_frame, frames_to_read=chunk_frame_len)
+            if start_frame > 0:
+                self.seek(start_frame)
+        
+        def __enter__(self):
+            return self
 
-        cut = False
+        def _init_decoder(self, start_byte=0, end_byte=None, encoding_format=None, sample_rate=None):
+            """
+            Opens an ma_decoder on the file, or on bytes start_byte to end_byte of data if there is data
+            """
+            decoder = ffi.new("ma_decoder *")
+            config = lib.ma_decoder_config_init(self.sample_format.value, self.channels, self.sample_rate if sample_rate is None else sample_rate)
+            if self.data is None:
+                result = lib.ma_decoder_init_file(_get_filename_bytes(self.file), ffi.addressof(config), decoder)
+            else:
+                if encoding_format is None:
+                    encoding_format = self.ENCODING_FORMATS.get(os.path.splitext(self.file)[1].lower(), lib.ma_encoding_format_unknown)
+                config.encodingFormat = encoding_format
+                end_byte = len(self.data) if end_byte is None else end_byte
+                self.data.read_ahead(start_byte)
+                result = lib.ma_decoder_init_memory(self.data.pointer + start_byte, end_byte - start_byte, ffi.addressof(config), decoder)
+            if result != lib.MA_SUCCESS:
+                raise miniaudio.DecodeError("Could not open/decode file", result)
+            return decoder
+        
+        def read_into(self, out: np.ndarray):
+            """
+            Decodes up to out.shape[0] frames into out ([num_frames, channels] of the decoder's sample format), 
+            returns the number of frames read
+            """
+            decoder = self.decoder
+            if self._memory_decoder is not None:
+                # Reading from the middle of the file, the end padding that ma_decoder would cut off is still there
+                decoder = self._memory_decoder
+                out = out[:max(round(self.seek_index.num_frames * self._index_scale) - self.position, 0)]
+                if not out.shape[0]:
+                    return 0
+            result = lib.ma_decoder_read_pcm_frames(decoder, ffi.from_buffer(out), out.shape[0], self.frames_read)
+            if result not in (lib.MA_SUCCESS, lib.MA_AT_END):
+                raise miniaudio.DecodeError("Error while decoding file", result)
+            self.position += self.frames_read[0]
+            offset = self._byte_offset(self.position)
+            if offset is not None:
+                self.data.advance(offset)
+            return self.frames_read[0]
+
+        def _byte_offset(self, frame):
+            """
+            Roughly where in the data frame is, None if there's no telling
+            """
+            if self.data is None:
+                return None
+            if self.seek_index is not None:
+                index = self.seek_index
+                mp3_frame = index.frame_at(min(round(frame / self._index_scale), index.num_frames))
+                return int(index.offsets[min(max(mp3_frame, 0), len(index.offsets) - 1)])
+            if self.total_frames:
+                return round(len(self.data) * min(frame / self.total_frames, 1))
+            return None
+        
+        def seek(self, seek_frame):
+            offset = self._byte_offset(seek_frame)
+            if offset is not None:
+                self.data.read_ahead(offset)
+            if self.seek_index is not None and self._seek_indexed(seek_frame):
+                return
+            self._close_memory_decoder()
+            if self.is_mp3:
+                # Near the start or without an index, reopen first: once dr_mp3 has read or seeked anywhere, later seeks
+                # forget the encoder delay and land about 1105 frames early (reverse playback would jump at every block)
+                lib.ma_decoder_uninit(self.decoder)
+                self.decoder = self._init_decoder()
+            result = lib.ma_decoder_seek_to_pcm_frame(self.decoder, seek_frame)
+            if result != lib.MA_SUCCESS:
+                raise miniaudio.DecodeError(f"Can't seek to frame {seek_frame}", result)
+            self.position = seek_frame
+
+        def _seek_indexed(self, seek_frame):
+            """
+            Seeks through the index, returns False if seek_frame is too close to the start for that (the normal seek
+            is cheap there anyway)
+            """
+            index = self.seek_index
+            seek_frame = min(seek_frame, round(index.num_frames * self._index_scale))
+            raw_frame = round(seek_frame / self._index_scale) + index.delay
+            frame = min(index.frame_at(raw_frame - index.delay), len(index.offsets) - 2)
+            if self.data is None:
+                self.data = MemoryFile(self.file)
+
+            warmup = index.WARMUP_FRAMES
+            while frame - warmup > 0:
+                first = frame - warmup
+                # The decoder skips the first frames of the range until it has enough of the bit reservoir and how
+                # many depends on the file, so decode up to the end of the frame we want to find out where output starts
+                decoder = self._init_decoder(int(index.offsets[first]), int(index.offsets[frame + 1]), lib.ma_encoding_format_mp3, 0)
+                max_frames = int(index.frame_starts[frame + 1] - index.frame_starts[first])
+                scratch = np.empty(shape=(max_frames, self.channels), dtype=self.dtype)
+                lib.ma_decoder_read_pcm_frames(decoder, ffi.from_buffer(scratch), max_frames, self.frames_read)
+                lib.ma_decoder_uninit(decoder)
+                first_output = int(index.frame_starts[frame + 1]) - self.frames_read[0]
+
+                # The first frame that does come out is missing its overlap with the one before, it has to be skipped too
+                if first_output + (index.frame_starts[first + 1] - index.frame_starts[first]) <= index.frame_starts[frame]:
+                    self._close_memory_decoder()
+                    self._memory_decoder = self._init_decoder(int(index.offsets[first]), None, lib.ma_encoding_format_mp3)
+                    # Converting rates, this lands as close to the frame as ma_decoder's own seeks do
+                    result = lib.ma_decoder_seek_to_pcm_frame(self._memory_decoder, round((raw_frame - first_output) * self._index_scale))
+                    if result != lib.MA_SUCCESS:
+                        raise miniaudio.DecodeError(f"Can't seek to frame {seek_frame}", result)
+                    self.position = seek_frame
+                    return True
+                warmup *= 2
+            return False
+
+        def _close_memory_decoder(self):
+            if self._memory_decoder is not None:
+                lib.ma_decoder_uninit(self._memory_decoder)
+                self._memory_decoder = None
+        
+        def close(self):
+            self.__exit__()
 
-        for chunk_index in range(num_chunks):
-            if reverse_audio:
-                frame_pos = -chunk_frame_len*(chunk_index+1) + start_frame
-                if frame_pos < 0:
-                    chunk_frame_len += frame_pos # frame pos is negative here, so we're subtracting from chunk_frame_len
-                    cut = True # Set flag indicating that we have to cut out a part of the AudioSegment
-                    frame_pos = 0
-                miniaudio_stream.seek(frame_pos)
+        def __exit__(self, *args):
+            self._close_memory_decoder()
+            lib.ma_decoder_uninit(self.decoder)
+            if self.data is not None:
+                self.data.close()
 
-            byte_data = miniaudio_stream.get_buffer()
 
-            if not byte_data:
-                break
+    def _open_decoder_stream(self, file, start_frame, output_rate, persistent_track_id=None, total_frames=None):
+        """
+        Opens a MiniaudioDecoderStream converting to sample_format/output_rate/channels, decoding from a memory map
+        of the file (see MemoryFile). total_frames is the file's length at the output rate, if known
+        """
+        sample_format = miniaudio.SampleFormat.FLOAT32 if self.sample_format == "f32" else miniaudio.SampleFormat.SIGNED16
+        seek_index = self.seek_index(file, persistent_track_id)
+        data = MemoryFile(file, self.track_read_ahead)
+        try:
+            return self.MiniaudioDecoderStream(file, start_frame, self.channels, sample_format, output_rate or 0, seek_index, data, total_frames)
+        except miniaudio.DecodeError:
+            data.close()
+            raise
 
-            audio = AudioSegment(data=byte_data, frame_rate=frame_rate, channels=2, sample_width=2)
-            if reverse_audio:
-                if cut:
-                    audio._data = audio._data[:chunk_frame_len]
-                yield audio.reverse()
+    @contextmanager
+    def _reuse_stream(self, key, open_stream, start_frame):
+        """
+        Hands out an open stream for key (see _stream_key) seeked to start_frame, or opens one with open_stream(start_frame)
+        if there isn't one. Afterwards it's kept open for next time, unless reading from it raised an error
+        """
+        stream = None
+        with self._open_streams_lock:
+            for index in range(len(self._open_streams) - 1, -1, -1):
+                if self._open_streams[index][0] == key:
+                    stream = self._open_streams.pop(index)[1]
+                    break
+        if stream is not None:
+            try:
+                stream.seek(start_frame)
+                self.streams_reused += 1
+            except miniaudio.DecodeError:
+                stream.close()
+                stream = None
+        if stream is None:
+            stream = open_stream(start_frame)
+            self.streams_opened += 1
+
+        failed = False
+        try:
+            yield stream
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if failed or not stream.reusable:
+                stream.close()
             else:
-                yield audio
-    
-    def _miniaudio_load_mp3(self, file, persistent_track_id, start_frame, num_chunks, chunk_frame_len, frame_rate=44_100):
+                self._keep_stream(key, stream)
+
+    def _keep_stream(self, key, stream):
+        with self._open_streams_lock:
+            self._open_streams.append((key, stream))
+            num_evicted = max(len(self._open_streams) - self.max_open_streams, 0) # Least recently used first
+            evicted = self._open_streams[:num_evicted]
+            del self._open_streams[:num_evicted]
+        for _, old_stream in evicted:
+            old_stream.close()
+
+    def _stream_key(self, file, output_rate):
+        """
+        What a MiniaudioDecoderStream from _open_decoder_stream decodes to, a kept stream only gets reused if this matches
+        """
+        return ("ma_decoder", file, self.sample_format, self.channels, output_rate)
 
-        try:
-            miniaudio_stream = miniaudio.mp3_stream_file(file, frames_to_read=chunk_frame_len, seek_frame=start_frame)
-            for samples in miniaudio_stream:
+    def close_streams(self):
+        """
+        Closes every decoder stream kept open for reuse
+        """
+        with self._open_streams_lock:
+            streams = self._open_streams
+            self._open_streams = []
+        for _, stream in streams:
+            stream.close()
 
-                byte_data = samples.tobytes()
-                audio = AudioSegment(data=byte_data, frame_rate=frame_rate, channels=2, sample_width=2)
+    def _scale_to_output(self, start_frame, chunk_frame_len, frame_rate, output_rate):
+        """
+        Positions come in at the file's own rate, they need scaling if miniaudio is converting to a different rate
+        """
+        if output_rate and output_rate != frame_rate:
+            scale = output_rate / frame_rate
+            return round(start_frame * scale), round(chunk_frame_len * scale), output_rate
+        return start_frame, chunk_frame_len, frame_rate
 
-                yield audio
+    def _load_converted(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100, persistent_track_id=None, total_frames=None, output_rate=None):
+        """
+        Loader used for every file type when sample_format is set. total_frames is the length of the file (at its own rate)
+        if known, it tells the memory map how far along decoding is (see MiniaudioDecoderStream)
+        """
+        output_rate = output_rate or self.output_rate
+        if reverse_audio:
+            yield from self._load_reversed(file, start_frame, num_chunks, chunk_frame_len, frame_rate, persistent_track_id, total_frames, output_rate)
+            return
+
+        total_frames = total_frames and self._scale_to_output(total_frames, 0, frame_rate, output_rate)[0]
+        start_frame, chunk_frame_len, frame_rate = self._scale_to_output(start_frame, chunk_frame_len, frame_rate, output_rate)
+        dtype = np.float32 if self.sample_format == "f32" else np.int16
+
+        open_stream = lambda start: self._open_decoder_stream(file, start, output_rate, persistent_track_id, total_frames)
+        with self._reuse_stream(self._stream_key(file, output_rate), open_stream, start_frame) as miniaudio_stream:
+            for _ in range(num_chunks):
+                block = chunk_pool.acquire(chunk_frame_len, self.channels, dtype)
+                num_frames = miniaudio_stream.read_into(block)
+
+                if not num_frames:
+                    break
 
-        except miniaudio.DecodeError:
-            # Miniaudio on windows is fucking stupid and can't resolve file names with non-ascii characters
-            # Create a hard link here with a set (ASCII) name that we can read from instead
-            hard_link_path = f"{self.app_folder}/cache/audio/{persistent_track_id}.mp3"
-            if not os.path.exists(hard_link_path):
-                os.link(file, hard_link_path)
+                yield AudioSegment(data=block[:num_frames], frame_rate=frame_rate, channels=self.channels, sample_width=2)
 
-            miniaudio_stream = miniaudio.mp3_stream_file(hard_link_path, frames_to_read=chunk_frame_len, seek_frame=start_frame)
-            for samples in miniaudio_stream:
+    def _load_reversed(self, file, start_frame, num_chunks, chunk_frame_len, frame_rate=44_100, persistent_track_id=None, total_frames=None, output_rate=None):
+        """
+        Plays any file type backwards, starting at start_frame. Instead of seeking before every chunk, this decodes 
+        forwards through a block of reverse_block_len ms that ends where the last one started, then hands out the 
+        block's chunks back to front (already reversed). Only one block is held at a time, however long the file is
+        """
+        output_rate = output_rate or self.output_rate
+        total_frames = total_frames and self._scale_to_output(total_frames, 0, frame_rate, output_rate)[0]
+        start_frame, chunk_frame_len, frame_rate = self._scale_to_output(start_frame, chunk_frame_len, frame_rate, output_rate)
+        dtype = np.float32 if self.sample_format == "f32" else np.int16
+
+        # Keep a whole number of chunks in a block so no chunk straddles two blocks
+        chunks_per_block = max(round(self.reverse_block_len / 1000 * frame_rate / chunk_frame_len), 1)
+        block = np.empty(shape=(chunks_per_block * chunk_frame_len, self.channels), dtype=dtype)
+
+        block_end = start_frame
+        open_stream = lambda start: self._open_decoder_stream(file, start, output_rate, persistent_track_id, total_frames)
+        with self._reuse_stream(self._stream_key(file, output_rate), open_stream, 0) as miniaudio_stream:
+            while num_chunks > 0 and block_end > 0:
+                block_start = max(block_end - block.shape[0], 0)
+                miniaudio_stream.seek(block_start)
+                num_frames = miniaudio_stream.read_into(block[:block_end - block_start])
+                if not num_frames:
+                    break
+
+                for chunk_end in range(num_frames, 0, -chunk_frame_len):
+                    chunk_start = max(chunk_end - chunk_frame_len, 0)
+                    chunk = chunk_pool.acquire(chunk_end - chunk_start, self.channels, dtype)
+                    np.copyto(chunk, block[chunk_start:chunk_end][::-1])
+                    yield AudioSegment(data=chunk, frame_rate=frame_rate, channels=self.channels, sample_width=2)
+                    num_chunks -= 1
+                    if not num_chunks:
+                        return
+                block_end = block_start
+
+    def load_wav(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100, total_frames=None, output_rate=None):
+
+        # 16 bit (and float) files that don't need converting get handed out as views of the memory mapped file,
+        # int16 ones stay int16 even if sample_format is "f32" (load_chunks converts them when it converts everything else)
+        output_rate = output_rate or self.output_rate
+        wav = open_mapped_wav(file)
+        if (wav is None or wav.channels != self.channels or (output_rate and output_rate != wav.rate)
+                or (wav.dtype == np.float32 and self.sample_format != "f32")):
+            yield from self._load_converted(file, start_frame, num_chunks, chunk_frame_len, reverse_audio, frame_rate, total_frames=total_frames, output_rate=output_rate)
+            return
+
+        for chunk_index in range(num_chunks):
+            if reverse_audio:
+                chunk_end = start_frame - chunk_frame_len*chunk_index
+                data = wav.chunk(chunk_end - chunk_frame_len, chunk_end, reverse=True)
+            else:
+                chunk_start = start_frame + chunk_frame_len*chunk_index
+                data = wav.chunk(chunk_start, chunk_start + chunk_frame_len)
+            if not len(data):
+                break
+            yield AudioSegment(data=data, frame_rate=frame_rate, channels=self.channels, sample_width=2)
+
+    def _miniaudio_load_ogg(self, file, start_frame, num_chunks, chunk_frame_len, reverse_audio=False, frame_rate=44_100, total_frames=None, output_rate=None):
+
+        if self.sample_format is not None or reverse_audio:
+            yield from self._load_converted(file, start_frame, num_chunks, chunk_frame_len, reverse_audio, frame_rate, total_frames=total_frames, output_rate=output_rate)
+            return
 
-                byte_data = samples.tobytes()
-                audio = AudioSegment(data=byte_data, frame_rate=frame_rate, channels=2, sample_width=2)
+        def open_stream(start_frame):
+            data = MemoryFile(file, self.track_read_ahead)
+            try:
+                return self.MiniaudioVorbisFileStream(file, start_frame, frames_to_read=chunk_frame_len, data=data)
+            except miniaudio.DecodeError:
+                data.close()
+                raise
 
-                yield audio
+        with self._reuse_stream(("stb_vorbis", file), open_stream, start_frame) as miniaudio_stream:
+            for _ in range(num_chunks):
+                block = chunk_pool.acquire(chunk_frame_len, 2, np.int16)
+                num_frames = miniaudio_stream.read_into(block)
+
+                if not num_frames:
+                    break
+
+                yield AudioSegment(data=block[:num_frames], frame_rate=frame_rate, channels=2, sample_width=2)
     
-    def _miniaudio_mp3_to_wav(self, file: str, persistent_track_id: int, frame_rate=44_100):
-                
-        # Try to delete files if there are too many (>3) in the cache
-        current_cached_files = glob(f"{self.app_folder}/cache/audio/*_reversed.wav")
-        if len(current_cached_files) > 3:
-            num_to_delete = len(current_cached_files) - 3
-            # Sort everything by when they were last modfied to choose deletion order
-            current_cached_files.sort(key=lambda path: os.path.getmtime(path))
-            for wav_file in current_cached_files[0:num_to_delete]:
-                try:
-                    os.remove(wav_file)
-                except OSError:
-                    # If we encounter an OSError, then it's likely the file is still open
-                    # Just leave it alone in this case
-                    pass
-                
-        # Windows path reading shenanigans
-        if not file.isascii():
-            hard_link_path = f"{self.app_folder}/cache/audio/{persistent_track_id}.mp3"
-            if not os.path.exists(hard_link_path):
-                os.link(file, hard_link_path)
-            file_stream = miniaudio.mp3_stream_file(hard_link_path)
-        else:
-            file_stream = miniaudio.mp3_stream_file(file)
+    def _miniaudio_load_mp3(self, file, persistent_track_id, start_frame, num_chunks, chunk_frame_len, frame_rate=44_100, reverse_audio=False, total_frames=None, output_rate=None):
+
+        if self.sample_format is not None or reverse_audio:
+            yield from self._load_converted(file, start_frame, num_chunks, chunk_frame_len, reverse_audio, frame_rate, persistent_track_id, total_frames, output_rate)
+            return
 
-        with wave.open(f"{self.app_folder}/cache/audio/{persistent_track_id}_reversed.wav", "wb") as fp:
-            fp.setparams((2, 2, frame_rate, 0, "NONE", "NONE"))
-            for samples in file_stream:
-                fp.writeframes(samples)
+        seek_index = self.seek_index(file, persistent_track_id)
+
+        def open_stream(start_frame):
+            data = MemoryFile(file, self.track_read_ahead)
+            try:
+                return self.MiniaudioDecoderStream(file, start_frame, seek_index=seek_index, data=data, total_frames=total_frames)
+            except miniaudio.DecodeError:
+                data.close()
+                raise
+        
+        with self._reuse_stream(("ma_decoder", file, None, 2, None), open_stream, start_frame) as miniaudio_stream:
+            for _ in range(num_chunks):
+                block = chunk_pool.acquire(chunk_frame_len, 2, np.int16)
+                num_frames = miniaudio_stream.read_into(block)
+
+                if not num_frames:
+                    break
+
+                yield AudioSegment(data=block[:num_frames], frame_rate=frame_rate, channels=2, sample_width=2)
 
 # class FFMPEGProcessHandler():
 #     """
@@ -295,7 +976,7 @@ class AudioPlayer():
         None
     """
 
-    def __init__(self, lock, channels=2, rate=44_100, buffersize_ms=50, encoding=16) -> None:
+    def __init__(self, lock, channels=2, rate=44_100, buffersize_ms=50, encoding=16, pull=False, sink=None) -> None:
         self.rate = rate
         self.pos = self.init_pos = 0
         self.frame_pos = 0
@@ -313,16 +994,44 @@ class AudioPlayer():
 
         self.base_fade_duration = 3000 # Keep original value for when we change speeds and need to adjust this
         self.fade_duration = self.base_fade_duration
+        self.fade_curve = "linear" # Shape of crossfades, one of CrossfadeCurve.SHAPES
         self.chunk_len = 50 # sets a size for how large audio chunks are (ms)
 
         self.filter = None
+        # Carries the interpolation phase from one chunk to the next when changing speed/resampling
+        self.resampler = StreamingResampler(channels)
 
         self.volume = 1
 
+        # By default miniaudio converts every track to self.rate while decoding (see _output_rate), so track changes
+        # stay seamless whatever rate the tracks are at. Turning this on reopens the output device at the sample rate of
+        # whatever track is playing instead, which skips the conversion but leaves a gap at every track boundary where the
+        # rate changes (crossfades play at the rate of the track that's fading out). Sinks whose rate is locked (a WAV
+        # FileSink that's been written to) stay at their rate either way, tracks at other rates get resampled
+        self.follow_track_rate = False
+
+        # Keep chunks in a float32 working buffer from decoding until they get written to the stream,
+        # so that fades, gains, mixes and resamples only get quantized back to int16 once
+        self.float_render = True
+
+        # Everything goes through this on its way to the stream so mixed audio that goes out of range
+        # gets limited smoothly (its gain state carries over from chunk to chunk)
+        self.limiter = SoftLimiter(rate, channels)
+
         self.app_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
-        self.stream = AudioStreamer(channels, rate, buffersize_ms, encoding)
+        # pull=True lets the device ask for each chunk as it needs it, see AudioStreamer
+        # Passing a sink (see tools/audiosinks.py) sends the output there instead of to the sound card
+        if sink is not None:
+            self.stream = sink
+            self.stream.set_rate(rate)
+        else:
+            self.stream = AudioStreamer(channels, rate, buffersize_ms, encoding, pull)
         self.decoder = AudioDecoder()
+        # Let miniaudio hand us chunks in our working format and channel count (and at our rate, when the output
+        # doesn't follow the track's rate), instead of converting them in Python
+        self.decoder.sample_format = "f32" if self.float_render else "s16"
+        self.decoder.channels = channels
 
         if os.path.exists(common_vars.music_database_path):
             self.reload_track_data()
@@ -330,13 +1039,40 @@ class AudioPlayer():
         else:
             self.track_data = {}
             self.track_id = None
+
+        # Tracks get decoded on a worker thread that stays up to decode_queue_depth ms ahead of playback (see DecodeQueue),
+        # 0 decodes on the player thread instead. The last 64 chunks' decode times (ms) are kept in decode_times
+        self.decode_queue_depth = 500
+        self.decode_times = deque(maxlen=64)
+        self._decode_queues = WeakSet()
+        self._decode_waits = 0 # From queues that are done
+
+        # Setting next_track_id starts decoding the start of that track in the background (see prefetch_track),
+        # prefetch_margin ms more than a crossfade needs
+        self.prefetch_next_track = True
+        self.prefetch_margin = 1000
+        self._prefetch = None
+        self._prefetch_lock = Lock()
         self.next_track_id = None
 
+        # The first head_cache_len ms of the tracks around the current one get decoded into cache/head in the background
+        # (see cache_head), so starting them plays pre-decoded audio while the decoder opens the file. head_cache_candidates
+        # gets set to the head_cache_neighbors tracks either side of the current one by the music database
+        self.head_cache = HeadCache(f"{self.app_folder}/cache/head", budget=128 * 2**20)
+        self.head_cache_len = 5000
+        self.head_cache_neighbors = 2
+        self._head_cache_candidates = []
+        self._head_cache_wake = Event()
+        self.head_cache_failures = 0 # Tracks whose head couldn't be cached, the last error is kept in head_cache_error
+        self.head_cache_error = None
+        Thread(target=self._fill_head_cache, daemon=True).start()
+
         # This will listen and respond to calls from the gui
         self.dispatcher = Dispatcher()
         self.dispatcher.map("/read", self.read)
         self.dispatcher.map("/write", self.write)
         self.dispatcher.map("/call", self.call_function)
+        self.dispatcher.map("/send", self.call_function)
 
         self.num_reads = 0
         self.start_read_time = time.time()
@@ -351,10 +1087,12 @@ class AudioPlayer():
 
     def read(self, address: str, *args):
         """
-        Function to get values in the audioplayer
+        Function to get values in the audioplayer. Streamer telemetry can be read through "stream.<attr>":
+        latency_ms, buffered_ms, buffer_target_ms, jitter_ms, underruns and overruns
         """
         try:
-            self.osc_client.send_message("/return", [getattr(self, attr) for attr in args])
+            # Dotted names reach into the player's parts, e.g. "stream.latency_ms" or "stream.underruns"
+            self.osc_client.send_message("/return", [reduce(getattr, attr.split("."), self) for attr in args])
         except AttributeError:
             self.osc_client.send_message("/return", None)
     
@@ -367,10 +1105,14 @@ class AudioPlayer():
     
     def call_function(self, address: str, func_name: str, *args):
         """
-        This function forwards parameters to call functions and returns their values
+        This function forwards parameters to call functions and returns their values. "/send" calls don't return anything,
+        so the gui doesn't have to wait on them
         """
         func = reduce(getattr, func_name.split("."), self)
-        self.osc_client.send_message("/return", func(*args))
+        if address == "/send":
+            func(*args)
+        else:
+            self.osc_client.send_message("/return", func(*args))
     
     def call_music_database_func(self, func_name, *args):
         self.osc_client.send_message("/call/music_database", (func_name, *args))
@@ -393,8 +1135,17 @@ class AudioPlayer():
     def status(self, new_status):
         #with self.lock:
             if not self.lock_status:
+                if new_status not in ("playing", "idle", "stopped") and new_status != self._status:
+                    self.stream.mark_command() # Time how long until the result is heard
                 self._status = new_status
 
+    @property
+    def command_latency_ms(self):
+        """
+        The latest measured time from a status change (seek, skip, change_track, ...) until its result was heard
+        """
+        return self.stream.command_latencies[-1] if self.stream.command_latencies else None
+
     
     @property
     def pause_flag(self):
@@ -409,6 +1160,39 @@ class AudioPlayer():
             self._pause_flag = value
     
 
+    @property
+    def decode_buffered_ms(self):
+        """
+        Audio decoded ahead and waiting in the decode queues (two of them during a crossfade)
+        """
+        return sum(decode_queue.buffered_ms for decode_queue in list(self._decode_queues))
+
+    @property
+    def decode_waits(self):
+        """
+        Times the player needed a chunk before the decode thread had one ready
+        """
+        return self._decode_waits + sum(decode_queue.waits for decode_queue in list(self._decode_queues))
+
+    @property
+    def decode_time_ms(self):
+        """
+        Average time it took to decode one chunk, over the last 64 chunks
+        """
+        decode_times = list(self.decode_times)
+        return sum(decode_times) / len(decode_times) if decode_times else 0
+
+
+    @property
+    def next_track_id(self):
+        return self._next_track_id
+    
+    @next_track_id.setter
+    def next_track_id(self, track_id):
+        self._next_track_id = track_id
+        self.prefetch_track(track_id)
+
+
     @property
     def speed(self):
         return self._speed
@@ -438,12 +1222,11 @@ class AudioPlayer():
         or EOF if end_pos is None.
 
         end_pos: int or None: stop reading at time = end_pos milliseconds, if None, read until EOF
-        """
 
-        file = self.track_data[track_id]["file"]
-        _, file_type = os.path.splitext(file)
-
-        num_frames = total_frames = self.get_track_length(track_id)[1]
+        If the track was prefetched from this position (see prefetch_track), the chunks already decoded in the
+        background get played first and the rest comes from the same decoder
+        """
+        total_frames = self.get_track_length(track_id)[1]
         self.next_track_length = (total_frames / self.track_data[track_id]["rate"])*1000
         self.next_total_frames = total_frames
         if self.bootup:
@@ -453,6 +1236,39 @@ class AudioPlayer():
                 self.pos = self.track_length
                 self.frame_pos = self.total_frames
 
+        self.num_chunks = self._plan_chunks(track_id, start_pos, end_pos)[1]
+        self._reserve_chunk_blocks()
+        audio_generator = self._take_prefetch(track_id, start_pos, end_pos)
+        if audio_generator is None:
+            audio_generator = self._open_track(track_id, self._output_rate(track_id), start_pos, end_pos)
+
+        if not self.decode_queue_depth:
+            yield from audio_generator
+            return
+        decode_queue = DecodeQueue(audio_generator, self.decode_queue_depth, self.decode_times)
+        self._decode_queues.add(decode_queue)
+        try:
+            yield from decode_queue
+        finally: # Also runs when a seek or skip drops this generator, that's what flushes the queue
+            decode_queue.close()
+            self._decode_queues.discard(decode_queue)
+            self._decode_waits += decode_queue.waits
+
+    def _reserve_chunk_blocks(self):
+        """
+        Sizes chunk_pool for the most chunks that can be held at once: a prefetched track start and the rest of a track
+        started from the head cache, two decode queues during a crossfade, plus the blocks mixing and output go through.
+        If the pool keeps fewer, steady-state playback allocates a new block for every chunk past that
+        """
+        held_ms = self.fade_duration + 2 * self.prefetch_margin + 2 * self.decode_queue_depth
+        chunk_pool.reserve(ceil(held_ms / self.chunk_len) + 32)
+
+    def _plan_chunks(self, track_id, start_pos=0, end_pos=None):
+        """
+        Returns (start_frame, num_chunks, chunk_frame_len) for reading track_id from start_pos to end_pos, see load_chunks
+        """
+        num_frames = total_frames = self.get_track_length(track_id)[1]
+
         if end_pos is not None and end_pos / 1000 * self.track_data[track_id]["rate"] < num_frames:
             num_frames -= (num_frames - end_pos)
             end_frame = round(end_pos / 1000 * self.track_data[track_id]["rate"])
@@ -477,31 +1293,212 @@ class AudioPlayer():
         #     start_frame = end_frame - round(-start_pos / 1000 * self.rate)
         #     num_frames -= start_frame
             
-            
         num_chunks = ceil(num_frames / (self.track_data[track_id]["rate"]/1000*self.chunk_len))
-        self.num_chunks = num_chunks
         chunk_frame_len = round(self.track_data[track_id]["rate"] * (self.chunk_len / 1000))
+        return start_frame, num_chunks, chunk_frame_len
+
+    def _output_rate(self, track_id):
+        """
+        The rate track_id gets decoded to: self.rate, or the track's own rate if the output follows it (see follow_track_rate)
+        """
+        return self.track_data[track_id]["rate"] if self.follow_track_rate else self.rate
+
+    def _open_track(self, track_id, output_rate, start_pos=0, end_pos=None):
+        """
+        Opens the decoder for track_id and yields its chunks at output_rate, without touching any of the player's playback
+        state or the decoder's settings (so it can run on the prefetch thread). Starting from the top, the head cache gets
+        played first if it has the track
+        """
+        start_frame, num_chunks, chunk_frame_len = self._plan_chunks(track_id, start_pos, end_pos)
+
+        audio_generator = None
+        if start_frame == 0 and not self.reverse_audio:
+            audio_generator = self._play_head(track_id, num_chunks, chunk_frame_len, output_rate)
+        if audio_generator is None:
+            audio_generator = self._decode_track(track_id, start_frame, num_chunks, chunk_frame_len, output_rate, self.reverse_audio)
+        for audio in audio_generator:
+            if self.float_render:
+                audio.to_float()
+            yield audio
+
+    def _decode_track(self, track_id, start_frame, num_chunks, chunk_frame_len, output_rate, reverse_audio=False):
+        """
+        The decoder's chunk generator for track_id, in the decoder's format (see _open_track)
+        """
+        file = self.track_data[track_id]["file"]
+        _, file_type = os.path.splitext(file)
+        total_frames = self.track_data[track_id]["length"]
 
         if file_type == ".wav":
-            audio_generator = self.decoder.load_wav(file, start_frame, num_chunks, chunk_frame_len, self.reverse_audio, self.track_data[track_id]["rate"])
+            audio_generator = self.decoder.load_wav(file, start_frame, num_chunks, chunk_frame_len, reverse_audio, self.track_data[track_id]["rate"], total_frames, output_rate)
         
         elif file_type == ".ogg":
-            audio_generator = self.decoder.load_ogg(file, start_frame, num_chunks, chunk_frame_len, self.reverse_audio, self.track_data[track_id]["rate"])
+            audio_generator = self.decoder.load_ogg(file, start_frame, num_chunks, chunk_frame_len, reverse_audio, self.track_data[track_id]["rate"], total_frames, output_rate)
         
         elif file_type == ".mp3":
             persistent_track_id = self.track_data[track_id]["persistent_id"]
-            # Streaming an mp3 in reverse is impossible, so we will instead create a wav file from the mp3 and read that instead
-            if self.reverse_audio:
-                if not os.path.exists(f"{self.app_folder}/cache/audio/{persistent_track_id}_reversed.wav"):
-                    self.decoder.mp3_to_wav(file, persistent_track_id)
-                reversed_file = f"{self.app_folder}/cache/audio/{persistent_track_id}_reversed.wav"
-                audio_generator = self.decoder.load_wav(reversed_file, start_frame, num_chunks, chunk_frame_len, True, self.track_data[track_id]["rate"])
-            else:
-                audio_generator = self.decoder.load_mp3(file, persistent_track_id, start_frame, num_chunks, chunk_frame_len, self.track_data[track_id]["rate"])
-        print(f"Using chunk_frame_len of {chunk_frame_len} for file {file}")
-        for audio in audio_generator:
-            yield audio
+            audio_generator = self.decoder.load_mp3(file, persistent_track_id, start_frame, num_chunks, chunk_frame_len, self.track_data[track_id]["rate"], reverse_audio, total_frames, output_rate)
+        return audio_generator
+
+    def _head_cache_name(self, track_id, chunk_frame_len, output_rate):
+        """
+        The head cache entry for the start of track_id as _decode_track would decode it at output_rate (None for the track's
+        own rate), None if that doesn't get cached: WAVs are read straight from the file already, and when miniaudio resamples,
+        a decoder started partway into the track doesn't pick up exactly where the cached audio ends
+        """
+        track = self.track_data[track_id]
+        if os.path.splitext(track["file"])[1] == ".wav" or output_rate not in (None, track["rate"]):
+            return None
+        try:
+            stat = os.stat(track["file"])
+        except OSError:
+            return None
+        return HeadCache.entry_name(track["persistent_id"], track["file"], stat.st_size, stat.st_mtime_ns, self.decoder.sample_format,
+                                    self.decoder.channels, chunk_frame_len, ceil(self.head_cache_len / self.chunk_len))
+
+    def _play_head(self, track_id, num_chunks, chunk_frame_len, output_rate):
+        """
+        Returns a generator of the start of track_id from the head cache followed by the rest of the track, or None if
+        it isn't cached
+        """
+        name = self._head_cache_name(track_id, chunk_frame_len, output_rate)
+        if name is None:
+            return None
+        head = self.head_cache.get(name, np.float32 if self.decoder.sample_format == "f32" else np.int16, self.decoder.channels)
+        if head is None:
+            return None
+        return self._continue_head(track_id, head, num_chunks, chunk_frame_len, output_rate)
+
+    def _continue_head(self, track_id, head, num_chunks, chunk_frame_len, output_rate):
+        head_chunks = min(ceil(len(head) / chunk_frame_len), num_chunks)
+        start_frame = head_chunks * chunk_frame_len
+        open_rest = lambda: self._decode_track(track_id, start_frame, num_chunks - head_chunks, chunk_frame_len, output_rate)
+        # The decoder opens (and gets ahead) in the background while the cached chunks play
+        rest = TrackPrefetch(None, open_rest, self.prefetch_margin) if num_chunks > head_chunks else None
+        try:
+            for chunk_start in range(0, start_frame, chunk_frame_len):
+                yield AudioSegment(data=head[chunk_start:chunk_start + chunk_frame_len], frame_rate=self.track_data[track_id]["rate"],
+                                   channels=self.decoder.channels, sample_width=2)
+            if rest is not None:
+                audio_generator = rest.take()
+                yield from audio_generator if audio_generator is not None else open_rest()
+        finally:
+            if rest is not None:
+                rest.cancel()
+
+    @property
+    def head_cache_candidates(self):
+        return self._head_cache_candidates
+
+    @head_cache_candidates.setter
+    def head_cache_candidates(self, track_ids):
+        self._head_cache_candidates = list(track_ids)
+        self._head_cache_wake.set()
+
+    def refresh_head_cache(self):
+        """
+        Has the music database set head_cache_candidates to the tracks around the current one (see MusicDatabase.get_neighbors)
+        """
+        if self.head_cache_neighbors:
+            self.call_music_database_func("get_neighbors", self.head_cache_neighbors, "&head_cache_candidates")
+
+    def cache_head(self, track_id):
+        """
+        Decodes the first head_cache_len ms of track_id into the head cache, unless it's there already (or doesn't get cached)
+        """
+        if track_id not in self.track_data:
+            return
+        track = self.track_data[track_id]
+        chunk_frame_len = self._plan_chunks(track_id)[2]
+        output_rate = self._output_rate(track_id)
+        name = self._head_cache_name(track_id, chunk_frame_len, output_rate)
+        if name is None or name in self.head_cache:
+            return
+
+        # Its own decoder rather than one from the decoder's pool (that one's for the tracks being played and scrubbed),
+        # which only has the OS read about as much of the file as the head needs
+        num_frames = min(ceil(self.head_cache_len / self.chunk_len) * chunk_frame_len, track["length"])
+        read_ahead = ceil(os.path.getsize(track["file"]) * num_frames / max(track["length"], 1)) + 2**16
+        sample_format = miniaudio.SampleFormat.FLOAT32 if self.decoder.sample_format == "f32" else miniaudio.SampleFormat.SIGNED16
+        data = MemoryFile(track["file"], read_ahead)
+        try:
+            stream = self.decoder.MiniaudioDecoderStream(track["file"], 0, self.decoder.channels, sample_format, output_rate or 0, data=data)
+        except miniaudio.DecodeError:
+            data.close()
+            raise
+        with stream:
+            head = np.empty(shape=(num_frames, self.decoder.channels), dtype=stream.dtype)
+            num_read = 0
+            while num_read < num_frames:
+                frames_read = stream.read_into(head[num_read:])
+                if not frames_read:
+                    break
+                num_read += frames_read
+        if num_read:
+            self.head_cache.put(name, head[:num_read])
+
+    def _fill_head_cache(self):
+        """
+        Runs on its own thread, caching the head of every track in head_cache_candidates (closest first) whenever they change
+        """
+        while True:
+            self._head_cache_wake.wait()
+            self._head_cache_wake.clear()
+            for track_id in self._head_cache_candidates:
+                if self._head_cache_wake.is_set(): # Start over with the new candidates
+                    break
+                try:
+                    self.cache_head(track_id)
+                except Exception as err: # Keep going with the other tracks, playing this one will run into it again
+                    self.head_cache_failures += 1
+                    self.head_cache_error = err
 
+    def _prefetch_key(self, track_id, start_pos, end_pos=None):
+        """
+        Everything that decides what _open_track decodes, a prefetch only gets used if this still matches
+        """
+        return (track_id, self.track_data[track_id]["file"], start_pos, end_pos, self.reverse_audio, self._output_rate(track_id))
+
+    def prefetch_track(self, track_id):
+        """
+        Starts decoding the start of track_id (its end when playing in reverse) in the background, the way a crossfade
+        or a skip will start it. Replaces (and drops) whatever was prefetched before. Called when next_track_id is set
+        """
+        with self._prefetch_lock:
+            if not self.prefetch_next_track or track_id is None or track_id not in self.track_data:
+                if self._prefetch is not None:
+                    self._prefetch.cancel()
+                self._prefetch = None
+                return
+
+            start_pos = self.get_track_length(track_id)[0] if self.reverse_audio else 0
+            key = self._prefetch_key(track_id, start_pos)
+            if self._prefetch is not None and self._prefetch.key == key:
+                return
+            if self._prefetch is not None:
+                self._prefetch.cancel()
+            self._reserve_chunk_blocks()
+            output_rate = self._output_rate(track_id)
+            self._prefetch = TrackPrefetch(key, lambda: self._open_track(track_id, output_rate, start_pos), self.fade_duration + self.prefetch_margin)
+
+    def _take_prefetch(self, track_id, start_pos, end_pos):
+        """
+        Returns the prefetched chunk generator if it's for this track and position, None otherwise
+        """
+        with self._prefetch_lock:
+            prefetch = self._prefetch
+            if prefetch is None or track_id not in self.track_data or prefetch.key != self._prefetch_key(track_id, start_pos, end_pos):
+                return None
+            self._prefetch = None
+        return prefetch.take()
+
+
+    def _track_frames(self, chunk: AudioSegment, track_id):
+        """
+        Number of frames of track_id that chunk covers. frame_pos and total_frames count frames at the track's own rate,
+        while chunks usually come out of the decoder converted to self.rate (see follow_track_rate)
+        """
+        return round(chunk.get_num_frames() * self.track_data[track_id]["rate"] / chunk.frame_rate)
 
     def get_track_length(self, track_id):
         num_frames = self.track_data[track_id]["length"]
@@ -545,7 +1542,15 @@ class AudioPlayer():
                         f"Audio Player Status: {self.status}\n" +\
                         f"Chunk Index: {chunk_index}/{num_chunks-1}, Chunk Length: {len(chunk)/self.speed:.3f}ms, " +\
                         f"Chunk Frame Length: {round(len(chunk._data)/self.speed)} frames\n" +\
-                        f"Audio chunk generation time: {chunk_gen_time}"
+                        f"Audio chunk generation time: {chunk_gen_time}\n" +\
+                        f"Stream Buffer: {self.stream.buffered_ms:.0f}/{self.stream.buffer_target_ms:.0f}ms, " +\
+                            f"Jitter: {self.stream.jitter_ms:.1f}ms, " +\
+                            f"{self.stream.underruns} underruns, {self.stream.overruns} overruns, " +\
+                            f"Command Latency: {self.command_latency_ms or 0:.0f}ms ({'pull' if self.stream.pull else 'push'} mode)\n" +\
+                        f"Decode Queue: {self.decode_buffered_ms:.0f}/{self.decode_queue_depth}ms, " +\
+                            f"Decode Time: {self.decode_time_ms:.2f}ms/chunk, {self.decode_waits} waits\n" +\
+                        f"Head Cache: {self.head_cache.size / 2**20:.1f}/{self.head_cache.budget / 2**20:.0f}MB, " +\
+                            f"{self.head_cache.hits} hits, {self.head_cache.misses} misses, {self.head_cache_failures} failed"
             #print(self.debug_string)
 
 
@@ -554,8 +1559,13 @@ class AudioPlayer():
         """
         Pauses the audio player. Note: this will block the player from doing anything
         """
-        self.stream.write( # This helps clear out any remaining data in the audio buffer (prevents popping sounds)
-            bytes(round(self.rate * self.stream.channels * self.stream.encoding // 8 * self.chunk_len / 1000))) 
+        # A chunk of silence helps clear out any remaining data in the audio buffer (prevents popping sounds). It goes
+        # through the limiter so the audio held back in its lookahead plays now rather than after the pause
+        silence = np.zeros(shape=(round(self.rate * self.chunk_len / 1000), self.stream.channels), dtype=np.float32)
+        silence = AudioSegment(silence, self.rate, self.stream.channels, self.stream.encoding // 8)
+        self.stream.write(mix([silence], limiter=self.limiter).buffer)
+        self.stream.mark_stopped()
+        self.limiter.reset()
         while self.pause_flag == True:
             time.sleep(0.05)
         return
@@ -586,6 +1596,7 @@ class AudioPlayer():
         self.track_id = next_track_id
         # This sets the next_track_id to be whatever's next in the database
         self.call_music_database_func("peek_right", 1, "&next_track_id")
+        self.refresh_head_cache()
 
 
     
@@ -615,25 +1626,18 @@ class AudioPlayer():
             args are of the form (audio_generator1, gain1), (audio_generator2, gain2), ...
             """
             for i in range(ceil(audio_len / chunk_len)):
-                for j in range(len(args)):
+                chunks = []
+                gains = []
+                for (audio_generator, gain) in args:
                     try:
-                        output_chunk = next(args[j][0]) + args[j][1]
-                        break
+                        chunks.append(next(audio_generator))
+                        gains.append(gain)
                     except StopIteration: # Ignore generators that are empty
                         pass
-                try:
-                    for (audio_generator, gain) in args[j+1:]:
-                        try:
-                            mix_chunk = next(audio_generator) + gain
-                            output_chunk *= mix_chunk + gain
-                        except ValueError:
-                            #mix_chunk = next(audio_generator) + gain
-                            output_chunk = (output_chunk * mix_chunk[:len(output_chunk)]) + mix_chunk[len(output_chunk):]
-                        except StopIteration:
-                            pass
-                except IndexError: # Handles case if args[j+1] doesn't exist (all but 1 generator empty)
-                    pass
-                yield output_chunk
+                if not chunks:
+                    return
+                # Sum everything in one go, the limiter in write_to_buffer takes care of anything that goes out of range
+                yield mix(chunks, gains)
         
         def prepend_chunk_generator(chunk_generator, *chunks):
             """
@@ -676,10 +1680,10 @@ class AudioPlayer():
                 self.write_to_buffer(chunk)
                 if self.reverse_audio:
                     self.pos -= len(chunk)
-                    self.frame_pos -= chunk.get_num_frames()
+                    self.frame_pos -= self._track_frames(chunk, self.track_id)
                 else:
                     self.pos += len(chunk)
-                    self.frame_pos += chunk.get_num_frames()
+                    self.frame_pos += self._track_frames(chunk, self.track_id)
                 if len(extra_chunk) != 0: # Sometimes lengths match up perfectly and extra chunk ends up being a zero len chunk
                     self.chunk_generator = prepend_chunk_generator(self.chunk_generator, extra_chunk)
             
@@ -733,7 +1737,8 @@ class AudioPlayer():
 
         if fade_duration > 0:
             for chunk, end_chunk_db, start_chunk_db in step_fade(self.chunk_generator, next_chunk_generator, 
-                                                                fade_duration=fade_duration, chunk_len=self.chunk_len, fade_type=fade_type): # Begin crossfade
+                                                                fade_duration=fade_duration, chunk_len=self.chunk_len, fade_type=fade_type,
+                                                                curve=self.fade_curve): # Begin crossfade
                 chunk: AudioSegment
                 if self.status == "change_track": # If we decide to change tracks during a transition, crossfade the (already crossfading) audio with the next track
                     self.status = "override_transition"
@@ -772,14 +1777,14 @@ class AudioPlayer():
                 self.write_to_buffer(chunk)
                 if self.reverse_audio:
                     self.pos -= len(chunk)
-                    self.frame_pos -= chunk.get_num_frames()
+                    self.frame_pos -= self._track_frames(chunk, self.track_id)
                     new_pos -= len(chunk)
-                    new_frame_pos -= chunk.get_num_frames()
+                    new_frame_pos -= self._track_frames(chunk, next_track_id)
                 else:
                     self.pos += len(chunk)
-                    self.frame_pos += chunk.get_num_frames()
+                    self.frame_pos += self._track_frames(chunk, self.track_id)
                     new_pos += len(chunk)
-                    new_frame_pos += chunk.get_num_frames()
+                    new_frame_pos += self._track_frames(chunk, next_track_id)
 
         # Once we are done with crossfades, update various variables
         self.pos = new_pos
@@ -796,6 +1801,7 @@ class AudioPlayer():
         
         # This is really fucked up way of setting the next_track_id to be whatever's next in the database
         self.call_music_database_func("peek_right", 1, "&next_track_id")
+        self.refresh_head_cache()
 
         if next_chunk_generator is not None:
             self.chunk_generator = next_chunk_generator
@@ -803,17 +1809,35 @@ class AudioPlayer():
         self.lock_status = True
 
 
+    def set_rate(self, rate):
+        """
+        Switches the output sample rate, along with everything that depends on it
+        """
+        # Play out the audio still held back in the limiter's lookahead
+        flushed = self.limiter.process(np.zeros(shape=(self.limiter.lookahead, self.stream.channels), dtype=np.float32))
+        if np.any(flushed):
+            self.stream.write(AudioSegment(flushed, self.rate, self.stream.channels, self.stream.encoding // 8).buffer)
+
+        self.stream.set_rate(rate)
+        self.rate = rate
+        self.limiter = SoftLimiter(rate, self.stream.channels)
+        self.resampler.reset()
+        self.speed = self.speed # Redesigns the low pass filter for the new rate
+
     def write_to_buffer(self, audio: AudioSegment):
         """
         This will handle checking if the pause button has been pressed (which activates the pause flag), 
         writes the raw audio byte data to the audio buffer (type of which depends on our audio api), will 
         also deal with speeding up and slowing down the audio.
         """
+        if self.follow_track_rate and audio.frame_rate != self.rate and not self.stream.rate_locked:
+            self.set_rate(audio.frame_rate)
         if self.volume < 1:
             audio = audio + amp_to_db(self.volume)
-        data = audio.data
         if self.speed != 1 or audio.frame_rate != self.rate:
-            data = change_speed(data, self.speed * audio.frame_rate/self.rate, filter=self.filter, dt=audio.dt)
+            audio = audio.change_speed(self.speed * audio.frame_rate/self.rate, filter=self.filter, resampler=self.resampler)
+        audio = mix([audio], limiter=self.limiter)
+        data = audio.buffer # If audio is float32, this is the only point where it gets converted back to int16
         self.get_debug_info()
         self.stream.write(data)
         if self.pause_flag == True:
@@ -846,15 +1870,17 @@ class AudioPlayer():
             i = 0
             while len(zw) != 0:
 
-                data = next(self.chunk_generator).data # Get track data bytes
+                track_chunk = next(self.chunk_generator)
+                data = track_chunk.data # Get track data bytes
 
                 # Change the speed of the audio to whatever the user has set, taking into account the sampling rate of the output data
-                data = change_speed(data, self.speed * self.track_data[self.track_id]["rate"]/self.rate)
+                # (chunks are usually converted to self.rate by the decoder already, see follow_track_rate)
+                data = change_speed(data, self.speed * track_chunk.frame_rate/self.rate, resampler=self.resampler)
 
                 # Frame rate is 44.1 kHz because the audio we use in the assets is 44.1 kHz, not necessaryily self.rate
                 zw_audio = AudioSegment(data=zw, frame_rate=44_100, channels=2, sample_width=2) + amp_to_db(self.volume)
 
-                # Even though track_audio could be any sampling rate, the above change_speed function will have resampled it to self.rate (44.1 kHz)
+                # Even though the track's chunks could be at any sampling rate, the above change_speed function will have resampled it to self.rate
                 track_audio = AudioSegment(data=data, frame_rate=self.rate, channels=2, sample_width=2)
 
                 # For the first few chunks, we want to fade down to the desired ducking volume (5 dB)
@@ -866,12 +1892,12 @@ class AudioPlayer():
 
                 # If chunk lengths match, mix together and play, otherwise cut off remaining zw audio and add extra audio data to extra_track_audio
                 if len(track_audio) == len(zw_audio):
-                    chunk = track_audio * zw_audio
+                    chunk = mix([track_audio, zw_audio], limiter=self.limiter)
                 else:
-                    extra_track_audio = track_audio[len(zw_audio):] # Note, this has already been resampled to self.rate
-                    chunk = track_audio[0:len(zw_audio)] * zw_audio
+                    extra_track_audio = AudioRope(self.rate) + track_audio[len(zw_audio):] # Note, this has already been resampled to self.rate
+                    chunk = mix([track_audio[0:len(zw_audio)], zw_audio], limiter=self.limiter)
 
-                self.stream.write(chunk.data)
+                self.stream.write(chunk.buffer)
 
                 self.get_debug_info()
                 # Change frame_pos by how many frames *would have* been read before accounting for resampling rather than self.rate
@@ -891,8 +1917,11 @@ class AudioPlayer():
 
             zwfp.setpos(21_563) # Set position to a specific point in the file
 
+            # From here on we're slowing down the already sped up/resampled audio in extra_track_audio, a different stream
+            self.resampler.reset()
+
             if extra_track_audio is None:
-                extra_track_audio = AudioSegment(data=bytes(0), frame_rate=self.rate, channels=2, sample_width=2)
+                extra_track_audio = AudioRope(self.rate)
 
             for i, speed in enumerate(speed_list):
                 chunk_len = speed * self.chunk_len
@@ -900,12 +1929,11 @@ class AudioPlayer():
                 num_frames = round(self.track_data[self.track_id]["rate"]*chunk_len / 1000)
 
                 while len(extra_track_audio) < chunk_len:
-                    extra_track_audio = extra_track_audio + next(self.chunk_generator) # This action will automatically resample the audio to self.rate
+                    extra_track_audio.append(next(self.chunk_generator)) # This action will automatically resample the audio to self.rate
 
-                data = extra_track_audio[:chunk_len].data # We cut based on milliseconds here, so sample rate shouldn't affect these
-                extra_track_audio = extra_track_audio[chunk_len:]
+                data = extra_track_audio.pop_front(chunk_len).data # We cut based on milliseconds here, so sample rate shouldn't affect these
                 
-                data = change_speed(data, speed) # No need to resample here since extra_track_audio will have done that automatically
+                data = change_speed(data, speed, resampler=self.resampler) # No need to resample here since extra_track_audio will have done that automatically
 
                 zw = zwfp.readframes(round(self.chunk_len*44_100/1000))
                 
@@ -914,7 +1942,7 @@ class AudioPlayer():
                 zw_audio = AudioSegment(data=zw, frame_rate=44_100, channels=2, sample_width=2) + amp_to_db(self.volume)
 
                 # This should always be the same length
-                self.stream.write((track_audio * zw_audio).data)
+                self.stream.write(mix([track_audio, zw_audio], limiter=self.limiter).buffer)
 
                 # Tell the main display to run the shaders to do the time stop effect
                 if i == 1:
@@ -933,7 +1961,7 @@ class AudioPlayer():
             # After the slow down effect has been done, read the rest of the time_stop.wav
             while len(zw) != 0:
                 zw_audio = AudioSegment(data=zw, frame_rate=44_100, channels=2, sample_width=2) + amp_to_db(self.volume)
-                self.stream.write(zw_audio.data)
+                self.stream.write(mix([zw_audio], frame_rate=self.rate, limiter=self.limiter).buffer)
                 zw = zwfp.readframes(round(self.chunk_len*self.rate/1000))
 
         time.sleep(5)
@@ -952,12 +1980,11 @@ class AudioPlayer():
                 num_frames = round(self.track_data[self.track_id]["rate"]*chunk_len / 1000)
 
                 while len(extra_track_audio) < chunk_len:
-                    extra_track_audio = extra_track_audio + next(self.chunk_generator) # This action will automatically resample the audio to self.rate
+                    extra_track_audio.append(next(self.chunk_generator)) # This action will automatically resample the audio to self.rate
                 
-                data = extra_track_audio[:chunk_len].data # We cut based on milliseconds here, so sample rate shouldn't affect these
-                extra_track_audio = extra_track_audio[chunk_len:]
+                data = extra_track_audio.pop_front(chunk_len).data # We cut based on milliseconds here, so sample rate shouldn't affect these
 
-                data = change_speed(data, speed) # No need to resample here since extra_track_audio will have done that automatically
+                data = change_speed(data, speed, resampler=self.resampler) # No need to resample here since extra_track_audio will have done that automatically
 
                 zw = zwfp.readframes(round(self.chunk_len*44_100/1000))
 
@@ -973,7 +2000,7 @@ class AudioPlayer():
                 else:
                     track_audio = track_audio + (min_db + amp_to_db(self.volume))
 
-                self.stream.write((track_audio * zw_audio).data)
+                self.stream.write(mix([track_audio, zw_audio], limiter=self.limiter).buffer)
                 self.get_debug_info()
                 if self.reverse_audio:
                     self.pos -= chunk_len
@@ -984,7 +2011,7 @@ class AudioPlayer():
                         
         # If there's any left over data, play it
         if len(extra_track_audio):
-            self.stream.write((extra_track_audio + amp_to_db(self.volume)).data)
+            self.stream.write(mix([extra_track_audio.to_segment()], [amp_to_db(self.volume)], limiter=self.limiter).buffer)
             self.get_debug_info()
             if self.reverse_audio:
                 self.pos -= len(extra_track_audio)
@@ -994,6 +2021,7 @@ class AudioPlayer():
                 self.frame_pos += round(len(extra_track_audio)*self.track_data[self.track_id]["rate"]/1000)
 
         # We can keep using self.chunk_generator, just keep playing the rest of the track
+        self.resampler.reset()
         self.status = "playing"
 
     
@@ -1027,10 +2055,10 @@ class AudioPlayer():
                 self.write_to_buffer(self.chunk)
                 if self.reverse_audio:
                     self.pos -= len(self.chunk)
-                    self.frame_pos -= chunk.get_num_frames()
+                    self.frame_pos -= self._track_frames(chunk, self.track_id)
                 else:
                     self.pos += len(self.chunk)
-                    self.frame_pos += chunk.get_num_frames()
+                    self.frame_pos += self._track_frames(chunk, self.track_id)
                 # Check current status
                 if self.status == "stopped":
                     break
@@ -1064,6 +2092,7 @@ class AudioPlayer():
             if self.status != "stopped":
                 self.lock_status = False
                 self.status = "playing"
+        self.stream.mark_stopped()
 
 if __name__ == "__main__" or __name__ == "<run_path>":
     try:
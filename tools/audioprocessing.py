@@ -1,5 +1,6 @@
 from __future__ import annotations
 from math import log10, ceil
+from functools import lru_cache
 import time
 import numpy as np
 from typing import TYPE_CHECKING, Generator
@@ -77,26 +78,90 @@ def db_to_amp(db):
 #             chunk = fade_out_chunk * fade_in_chunk
 #             yield chunk, fade_out_chunk_db, fade_in_chunk_db
 
+class CrossfadeCurve():
+
+    """
+    Per sample gain curve (amplitudes) for fading out over duration ms at a given sample rate, the fade in
+    curve is the same curve backwards. Built in one vectorized pass, get one through crossfade_curve so
+    it's only built once per (duration, chunk_len, shape, rate).
+
+    Shapes:
+        linear      : amplitude goes down in a straight line (what step_fade has always done)
+        equal_power : cos/sin curves, the summed power of a crossfade stays constant so there's no dip in the middle
+        logarithmic : straight line in dB down to -60 dB, then down to silence
+    """
+
+    SHAPES = ("linear", "equal_power", "logarithmic")
+
+    def __init__(self, duration, chunk_len=50, shape="linear", rate=44_100):
+        if shape not in self.SHAPES:
+            raise ValueError(f"fade curve shape must be one of {self.SHAPES}, not {shape}")
+        
+        self.duration = duration
+        self.chunk_len = chunk_len
+        self.shape = shape
+        self.rate = rate
+        self.num_chunks = ceil(duration / chunk_len)
+
+        t = np.linspace(0, 1, num=max(round(duration * rate / 1000), 1), endpoint=True, dtype=np.float32)
+        match shape:
+            case "linear":
+                curve = 1 - t
+            case "equal_power":
+                curve = np.cos(t * np.float32(np.pi / 2))
+            case "logarithmic":
+                floor = np.float32(db_to_amp(-60))
+                curve = (np.power(np.float32(10), t * np.float32(-3)) - floor) / (1 - floor) # -60 dB at t = 1
+        
+        # Chunks only ever get views of these, make sure nothing writes to the cached curve
+        self.fade_out = curve.astype(np.float32, copy=False)
+        self.fade_out[-1] = 0
+        self.fade_out.flags.writeable = False
+        self.fade_in = self.fade_out[::-1]
+    
+    def _slice(self, curve: np.ndarray, start_frame, num_frames):
+        gains = curve[start_frame:start_frame + num_frames]
+        if gains.shape[0] < num_frames: # Past the end of the fade, hold the last value
+            gains = np.concatenate((gains, np.full(num_frames - gains.shape[0], curve[-1], dtype=np.float32)))
+        return gains
+
+    def fade_out_gains(self, start_frame, num_frames):
+        return self._slice(self.fade_out, start_frame, num_frames)
+
+    def fade_in_gains(self, start_frame, num_frames):
+        return self._slice(self.fade_in, start_frame, num_frames)
+
+    def fade_out_db(self, start_frame):
+        return amp_to_db(float(self.fade_out[min(start_frame, self.fade_out.shape[0] - 1)]))
+
+    def fade_in_db(self, start_frame):
+        return amp_to_db(float(self.fade_in[min(start_frame, self.fade_in.shape[0] - 1)]))
+
+@lru_cache(maxsize=16)
+def crossfade_curve(duration, chunk_len=50, shape="linear", rate=44_100):
+    """
+    Returns the (cached) CrossfadeCurve for these settings
+    """
+    return CrossfadeCurve(duration, chunk_len, shape, rate)
+
 def step_fade(chunk_gen: Generator[AudioSegment], next_chunk_gen: Generator[AudioSegment] | None = None, 
-              fade_duration=3000, chunk_len=50, fade_type="fade_out"):
+              fade_duration=3000, chunk_len=50, fade_type="fade_out", curve="linear"):
     """
     Fades audio from one or two AudioSegment *generators*. Note: fade_duration MUST be >= chunk_len
+    curve is the shape of the fade, see CrossfadeCurve
     """
-    # Defines what proportion of the crossfade duration each chunk should make up
-    fade_list = [chunk_len / fade_duration] * (fade_duration // chunk_len) + [fade_duration % chunk_len / fade_duration]
-    if fade_list[-1] == 0:
-        fade_list.pop(-1)
-    
-    # Using fade_list, creates a map of what volume (in decibels) the starts and ends of each chunk should be at
-    db_list = [(amp_to_db(j[0]), amp_to_db(j[1]))
-            for j in [(1 - sum(fade_list[:i]), 1 - sum(fade_list[:i+1])) for i in range(len(fade_list))]]
-    x = 0 # loop index
-    while x < len(fade_list):
+    # Where we are in the fade out/fade in curves, in frames (the two tracks can have different sampling rates)
+    fade_out_frame = 0
+    fade_in_frame = 0
+
+    for x in range(ceil(fade_duration / chunk_len)):
         chunk = next(chunk_gen)
         
         if fade_type == "fade_out" or fade_type == "crossfade":
-            fade_out_chunk = chunk.fade(to_gain=db_list[x][1], from_gain=db_list[x][0], start=0, duration=len(chunk))
-            fade_out_chunk_db = db_list[x][0]
+            gains = crossfade_curve(fade_duration, chunk_len, curve, chunk.frame_rate)
+            fade_out_chunk_db = gains.fade_out_db(fade_out_frame)
+            fade_out_chunk = chunk.apply_envelope(gains.fade_out_gains(fade_out_frame, chunk.get_num_frames()))
+            fade_out_frame += chunk.get_num_frames()
         else:
             fade_out_chunk = 1
             fade_out_chunk_db = 0
@@ -107,8 +172,10 @@ def step_fade(chunk_gen: Generator[AudioSegment], next_chunk_gen: Generator[Audi
                 next_chunk = next(next_chunk_gen)
             if len(next_chunk) > len(chunk):
                 next_chunk = next_chunk[0:len(chunk)]
-            fade_in_chunk = next_chunk.fade(to_gain=db_list[-(x+1)][0], from_gain=db_list[-(x+1)][1], start=0, duration=len(next_chunk))
-            fade_in_chunk_db = db_list[-(x+1)][1]
+            gains = crossfade_curve(fade_duration, chunk_len, curve, next_chunk.frame_rate)
+            fade_in_chunk_db = gains.fade_in_db(fade_in_frame)
+            fade_in_chunk = next_chunk.apply_envelope(gains.fade_in_gains(fade_in_frame, next_chunk.get_num_frames()))
+            fade_in_frame += next_chunk.get_num_frames()
         else:
             fade_in_chunk = 1
             fade_in_chunk_db = 0
@@ -117,15 +184,61 @@ def step_fade(chunk_gen: Generator[AudioSegment], next_chunk_gen: Generator[Audi
         except TypeError:
             output_chunk = fade_in_chunk * fade_out_chunk
     
-        x += 1
         yield output_chunk, fade_out_chunk_db, fade_in_chunk_db
 
+class ResamplePlan():
+
+    """
+    Everything resample needs to stretch in_frames frames to out_frames frames, worked out ahead of time: for every
+    output frame, the indices of the two input frames around it and how far along between them it is.
+    Resampling is then two gathers and a multiply-add over all channels at once. Get plans through resample_plan,
+    which caches them, since nearly every chunk has the same frame count
+    """
+
+    def __init__(self, in_frames, out_frames):
+        self.in_frames = in_frames
+        self.out_frames = out_frames
+
+        # Same grid as np.interp(np.linspace(0, 1, out_frames, endpoint=False), np.linspace(0, 1, in_frames, endpoint=False), x),
+        # positions past the last input frame hold its value
+        positions = np.arange(out_frames) * (in_frames / out_frames) if out_frames else np.zeros(0)
+        self.left = np.minimum(positions.astype(np.intp), max(in_frames - 1, 0))
+        self.right = np.minimum(self.left + 1, max(in_frames - 1, 0))
+        self.weights = np.clip(positions - self.left, 0, 1)
+        self.weights_f32 = self.weights.astype(np.float32)
+        for array in (self.left, self.right, self.weights, self.weights_f32):
+            array.flags.writeable = False
+
+    def apply(self, data: np.ndarray) -> np.ndarray:
+        """
+        Resamples data, in the shape of [in_frames] or [in_frames, num_channels].
+        Returns float32 if data is float32, otherwise float64
+        """
+        weights = self.weights_f32 if data.dtype == np.float32 else self.weights
+        if data.ndim > 1:
+            weights = weights[:, None]
+        left = np.take(data, self.left, axis=0).astype(weights.dtype, copy=False)
+        out = np.take(data, self.right, axis=0).astype(weights.dtype, copy=False)
+        out -= left
+        out *= weights
+        out += left
+        return out
+
+@lru_cache(maxsize=32)
+def resample_plan(in_frames, out_frames):
+    """
+    Returns the (cached) ResamplePlan for stretching in_frames frames to out_frames.
+    resample_plan.cache_info() has the hit/miss counters
+    """
+    return ResamplePlan(in_frames, out_frames)
+
 def resample(channel_samples, scale=1.0):
         """
         Written by Nathan Whitehead
         Resample a sound to be a different length
         Sample must be mono.  May take some time for longer sounds
         sampled at 44100 Hz.
+        (Now also takes [num_samples, num_channels] arrays, resampling all channels at once)
 
         Keyword arguments:
         scale - scale factor for length of sound (2.0 means double length)
@@ -141,54 +254,414 @@ def resample(channel_samples, scale=1.0):
         # Both are OK, but since resampling will often involve
         # exact ratios (i.e. for 44100 to 22050 or vice versa)
         # using endpoint=False gets less noise in the resampled sound
-        return np.interp(
-            np.linspace(0.0, 1.0, n, endpoint=False), # where to interpret
-            np.linspace(0.0, 1.0, len(channel_samples), endpoint=False), # known positions
-            channel_samples, # known data points
-            )
+        # The linspace grids and interpolation weights for each (input, output) length only get worked out once,
+        # see ResamplePlan
+        return resample_plan(len(channel_samples), n).apply(channel_samples)
+
+@lru_cache(maxsize=64)
+def lowpass_kernel(cutoff_freq, sample_rate=44_100, num_taps=201):
+    """
+    Hamming windowed sinc low pass kernel, normalized to unity gain. Cached, so the array is read only
+    """
+    # The time domain equivalent of a frequency cutoff is the sinc function, hence its use here
+    kernel = np.sinc(2 * cutoff_freq * np.arange(-num_taps//2+1, num_taps//2+1) / sample_rate) * np.hamming(num_taps)
+    kernel /= np.sum(kernel)
+    kernel.flags.writeable = False
+    return kernel
+
+@lru_cache(maxsize=64)
+def lowpass_spectrum(cutoff_freq, sample_rate, num_taps, fft_size, dtype):
+    """
+    rfft of lowpass_kernel zero padded to fft_size, shaped [bins, 1] to broadcast over channels. Cached, so read only
+    """
+    spectrum = np.fft.rfft(lowpass_kernel(cutoff_freq, sample_rate, num_taps).astype(dtype), n=fft_size)[:, None]
+    spectrum.flags.writeable = False
+    return spectrum
 
 class FIRLowpassFilter():
 
     """
     Creates and handles low pass filtering. Can in theory be used for other signal filtering in the future
+
+    The filter keeps the last num_taps - 1 input samples between calls, so a stream filtered chunk by chunk
+    comes out the same as if it were filtered in one go. Filtering is either done directly (np.convolve per channel)
+    or with overlap-save FFT convolution (every block and channel in one batched rfft/irfft). method="auto" picks
+    whichever should be cheaper for the number of taps and the size of the chunk being filtered
+
+    Kernels come from an LRU cache keyed by (cutoff rounded to cutoff_step, sample rate, taps), so changing the
+    cutoff over and over (e.g. dragging the speed slider) doesn't design or allocate anything once a cutoff has been
+    used. When the kernel changes, the output crossfades from the old kernel to the new one over kernel_crossfade_ms
+    so the change doesn't click. A change that comes in during a crossfade waits for it to finish (only the latest one
+    is kept), swapping the kernel being faded to halfway through would jump
     """
 
-    def __init__(self, cutoff_freq, sample_rate=44_100, num_taps=201, num_channels=2):
+    # Rough cost of an FFT convolution (per fft_size * log2(fft_size)) relative to a direct one (per multiply-add),
+    # from benchmarks/fir_filter.py. Direct wins up to ~100 taps for 50 ms chunks, the FFT from there on
+    fft_cost_factor = 8
+
+    cutoff_step = 100 # Hz
+    kernel_crossfade_ms = 10
+
+    def __init__(self, cutoff_freq, sample_rate=44_100, num_taps=201, num_channels=2, method="auto"):
         
+        if method not in ("auto", "direct", "fft"):
+            raise ValueError("method must be one of 'auto', 'direct' or 'fft'")
+        self.method = method
+        self.history = np.zeros(shape=(num_taps - 1, num_channels)) # Last filter_len - 1 input samples
+        self._stream = np.zeros(shape=(0, num_channels)) # Work buffer holding history + data, reused between calls
+        self.kernel_key = None # (cutoff, sample rate, taps) of the current kernel
+        self._previous_key = None # Kernel we're crossfading away from
+        self._pending_key = None # Kernel to crossfade to next, once the current crossfade is done
+        self._crossfade_frame = 0
+        self.set_new_filter(cutoff_freq, sample_rate, num_taps)
+    
+    def set_new_filter(self, cutoff_freq, sample_rate=44_100, num_taps=201):
+        # This is just to change the filter without changing the padding samples
         if cutoff_freq <= 0 or cutoff_freq >= sample_rate / 2:
             raise ValueError("Cutoff frequency must be between 0 < freq < sample_rate/2")
         if num_taps % 2 == 0:
             raise ValueError("num_taps must be an odd number!")
         
-        # The time domain equivalent of a frequency cutoff is the sinc function, hence its use here
-        _fir_filter = np.sinc(2 * cutoff_freq * np.arange(-num_taps//2+1, num_taps//2+1) / sample_rate) * np.hamming(num_taps)
-        self.fir_filter = _fir_filter / np.sum(_fir_filter)
+        cutoff_freq = min(max(round(cutoff_freq / self.cutoff_step) * self.cutoff_step, self.cutoff_step), 
+                          ceil(sample_rate / 2 / self.cutoff_step - 1) * self.cutoff_step)
+        key = (cutoff_freq, sample_rate, num_taps)
+        if self._previous_key is not None and self.kernel_key[2] == num_taps:
+            self._pending_key = None if key == self.kernel_key else key
+            return
+        self._pending_key = None
+        if key == self.kernel_key:
+            return
+        
+        # Crossfade from the kernel the output is using (can only crossfade between kernels of the same length)
+        if self.kernel_key is not None and self.kernel_key[2] == num_taps:
+            self._previous_key = self.kernel_key
+            self._crossfade_frame = 0
+        else:
+            self._previous_key = None
+
+        self.kernel_key = key
+        self.fir_filter = lowpass_kernel(*key)
         self.filter_len = len(self.fir_filter)
-        self.padding = np.zeros(shape=(0,num_channels))
+
+        # Keep as much history as the new filter needs, older samples count as silence
+        if self.history.shape[0] != self.filter_len - 1:
+            history = np.zeros(shape=(self.filter_len - 1, self.history.shape[1]))
+            kept = min(self.history.shape[0], history.shape[0])
+            if kept:
+                history[-kept:] = self.history[-kept:]
+            self.history = history
     
-    def set_new_filter(self, cutoff_freq, sample_rate=44_100, num_taps=201):
-        # This is just to change the filter without changing the padding samples
-        _fir_filter = np.sinc(2 * cutoff_freq * np.arange(-num_taps//2+1, num_taps//2+1) / sample_rate) * np.hamming(num_taps)
-        self.fir_filter = _fir_filter / np.sum(_fir_filter)
-        self.filter_len = len(self.fir_filter)
+    def _fft_size(self, num_samples):
+        """
+        FFT size for overlap-save: 4x the filter length keeps the overhead per block low, no point in going past
+        the size that fits the whole chunk in a single block
+        """
+        overlap = self.filter_len - 1
+        return 1 << (max(overlap * 4, 16) - 1).bit_length() if num_samples + overlap > overlap * 4 \
+            else 1 << (num_samples + overlap - 1).bit_length()
+    
+    def _use_fft(self, num_samples):
+        if self.method != "auto":
+            return self.method == "fft"
+        fft_size = self._fft_size(num_samples)
+        num_blocks = -(-num_samples // (fft_size - self.filter_len + 1))
+        return num_blocks * fft_size * np.log2(fft_size) * self.fft_cost_factor < num_samples * self.filter_len
+    
+    def _convolve_fft(self, stream: np.ndarray, num_samples, kernel_key):
+        """
+        Overlap-save: cut stream into overlapping blocks of fft_size, convolve every block (and channel) at once
+        in the frequency domain and keep the last fft_size - overlap samples of each, which are free of wrap around
+        """
+        overlap = self.filter_len - 1
+        fft_size = self._fft_size(num_samples)
+        step = fft_size - overlap
+        num_blocks = -(-num_samples // step)
+
+        # Pad the end so the last block is full, blocks then are just a strided view of the buffer
+        total = num_blocks * step + overlap
+        if stream.shape[0] < total:
+            stream = np.concatenate((stream, np.zeros(shape=(total - stream.shape[0], stream.shape[1]), dtype=stream.dtype)))
+        blocks = np.lib.stride_tricks.as_strided(stream, shape=(num_blocks, fft_size, stream.shape[1]),
+                                                 strides=(step * stream.strides[0], *stream.strides))
+        
+        spectrum = lowpass_spectrum(*kernel_key, fft_size, stream.dtype)
+        filtered = np.fft.irfft(np.fft.rfft(blocks, axis=1) * spectrum, n=fft_size, axis=1)
+        return filtered[:, overlap:].reshape(-1, stream.shape[1])[:num_samples]
+    
+    def _convolve(self, stream: np.ndarray, num_samples, kernel_key):
+        """
+        Filters num_samples samples out of stream (history + data) with the kernel for kernel_key
+        """
+        if self._use_fft(num_samples):
+            return self._convolve_fft(stream, num_samples, kernel_key)
+        kernel = lowpass_kernel(*kernel_key)
+        filtered_data = np.empty(shape=(num_samples, stream.shape[1]), dtype=stream.dtype)
+        for channel in range(stream.shape[1]):
+            filtered_data[:, channel] = np.convolve(stream[:, channel], kernel, mode="valid")
+        return filtered_data
     
     def filter_signal(self, data: np.ndarray, dt):
         """
         Expects data in the shape of [num_samples, num_channels]
+        If dt is None (float data), the output is not clipped to an integer range
+        """
+        one_dim = data.ndim == 1
+        if one_dim:
+            data = data[:, None]
+        num_samples, num_channels = data.shape
+        overlap = self.filter_len - 1
+        if self.history.shape[1] != num_channels:
+            self.history = np.zeros(shape=(overlap, num_channels))
+
+        # Lay out history + data in the work buffer, only reallocating when it needs to grow
+        work_dtype = np.float32 if data.dtype == np.float32 else np.float64
+        if self._stream.shape[0] < overlap + num_samples or self._stream.shape[1] != num_channels or self._stream.dtype != work_dtype:
+            self._stream = np.empty(shape=(overlap + num_samples, num_channels), dtype=work_dtype)
+        stream = self._stream[:overlap + num_samples]
+        stream[:overlap] = self.history
+        stream[overlap:] = data
+        self.history[:] = stream[num_samples:]
+
+        filtered_data = self._convolve(stream, num_samples, self.kernel_key)
+
+        if self._previous_key is not None:
+            # Fade in the new kernel's output over the old one's
+            curve = crossfade_curve(self.kernel_crossfade_ms, self.kernel_crossfade_ms, "linear", self.kernel_key[1])
+            fade_in = curve.fade_in_gains(self._crossfade_frame, num_samples)[:, None]
+            previous = self._convolve(stream, num_samples, self._previous_key)
+            filtered_data = previous + (filtered_data - previous) * fade_in
+            self._crossfade_frame += num_samples
+            if self._crossfade_frame >= curve.fade_in.shape[0]:
+                self._previous_key = None
+                if self._pending_key is not None:
+                    self.set_new_filter(*self._pending_key)
+        
+        if one_dim:
+            filtered_data = filtered_data[:, 0]
+        if dt is None:
+            return filtered_data
+        return np.clip(filtered_data, np.iinfo(dt).min, np.iinfo(dt).max)
+
+class SoftLimiter():
+
+    """
+    Stateful lookahead limiter for float32 audio (normalized to -1.0 <= x <= 1.0).
+
+    Peaks above threshold_db get squashed along a tanh knee so nothing goes over ceiling_db. The gain
+    starts coming down lookahead_ms before a peak (the output is delayed by that much to allow for this),
+    and recovers at release_db_per_s afterwards. All of this state carries over between calls to process,
+    so the gain follows the audio across chunk boundaries rather than being worked out per chunk.
+
+    The audio is limited in place, and the delay line and every intermediate array are preallocated (the scratch
+    buffers grow to the longest chunk seen), so steady-state playback doesn't allocate anything in here
+    """
+
+    def __init__(self, sample_rate=44_100, num_channels=2, threshold_db=-1.0, ceiling_db=-0.1, lookahead_ms=5, release_db_per_s=40.0):
+        self.threshold = db_to_amp(threshold_db)
+        self.ceiling = db_to_amp(ceiling_db)
+        self.lookahead = max(1, round(lookahead_ms * sample_rate / 1000))
+        self.release = release_db_per_s / sample_rate # dB per frame
+        self.num_channels = num_channels
+
+        self._delay = np.zeros(shape=(self.lookahead, num_channels), dtype=np.float32) # Frames we've taken in but not output yet
+        self._next_delay = np.zeros_like(self._delay) # What process fills in as the next _delay, the two swap every call
+        self._targets = np.zeros(self.lookahead, dtype=np.float32) # Gain (dB) the frames in _delay need
+        self._smoothing = np.ones(self.lookahead - 1) # Last lookahead - 1 gains, for smoothing the attack
+        self._capacity = 0 # Longest chunk the scratch buffers fit, see _grow
+        self.reset()
+
+    def reset(self):
+        self._delay[:] = 0
+        self._targets[:] = 0
+        self._gain_db = 0.0 # Gain of the last frame we output, before smoothing
+        self._smoothing[:] = 1
+        self._idle = True # Nothing is being limited and the gain has fully recovered
+
+    def _grow(self, num_samples):
+        """
+        Makes room in the scratch buffers for chunks of num_samples frames
+        """
+        capacity = -(-num_samples // 4096) * 4096
+        lookahead = self.lookahead
+        window = lookahead + 1
+        self._magnitudes = np.empty(shape=(capacity, self.num_channels), dtype=np.float32)
+        self._peaks = np.empty(capacity, dtype=np.float32)
+        self._all_targets = np.empty(lookahead + capacity, dtype=np.float32) # _targets followed by this chunk's
+        # _lookahead_min's blocks, prefix and suffix minimums
+        num_blocks = -(-(lookahead + capacity) // window)
+        self._blocks = np.empty(shape=(num_blocks, window), dtype=np.float32)
+        self._prefix_min = np.empty_like(self._blocks)
+        self._suffix_min = np.empty_like(self._blocks)
+        self._min_gain = np.empty(capacity, dtype=np.float32)
+        self._ramp = self.release * np.arange(1, capacity + 1)
+        self._gain_db_buffer = np.empty(capacity)
+        self._gain = np.empty(lookahead - 1 + capacity) # _smoothing followed by this chunk's gains
+        self._summed = np.zeros(lookahead + capacity)
+        self._smoothed = np.empty(capacity)
+        self._smoothed32 = np.empty(capacity, dtype=np.float32)
+        self._capacity = capacity
+
+    def _target_gain(self, peaks: np.ndarray, out: np.ndarray):
+        """
+        Writes the gain (dB) each frame needs for its peak to land on the soft knee to out. Overwrites peaks
+        """
+        # Peaks under the threshold get raised to it, which the knee leaves alone (0 dB)
+        np.maximum(peaks, self.threshold, out=peaks)
+        knee = self.ceiling - self.threshold
+        np.subtract(peaks, self.threshold, out=out)
+        out /= knee
+        np.tanh(out, out=out)
+        out *= knee
+        out += self.threshold
+        out /= peaks
+        np.log10(out, out=out)
+        out *= 20
+
+    def _lookahead_min(self, targets: np.ndarray, out: np.ndarray):
+        """
+        Minimum over every window of lookahead + 1 consecutive targets (van Herk/Gil-Werman), in O(n) instead of
+        O(n*window), written to out (len(targets) - lookahead values)
+        """
+        window = self.lookahead + 1
+        num_blocks = -(-len(targets) // window)
+        flat = self._blocks.reshape(-1)
+        flat[:len(targets)] = targets
+        flat[len(targets):num_blocks * window] = np.inf
+        blocks = self._blocks[:num_blocks]
+        prefix_min = np.minimum.accumulate(blocks, axis=1, out=self._prefix_min[:num_blocks]).reshape(-1)
+        suffix_min = self._suffix_min[:num_blocks]
+        np.minimum.accumulate(blocks[:, ::-1], axis=1, out=suffix_min[:, ::-1])
+        suffix_min = suffix_min.reshape(-1)
+        np.minimum(suffix_min[:len(out)], prefix_min[window - 1:window - 1 + len(out)], out=out)
+
+    def process(self, data: np.ndarray) -> np.ndarray:
+        """
+        Expects float32 data in the shape of [num_samples, num_channels]. Limits it in place and returns it (a
+        contiguous copy if it wasn't contiguous), delayed by the lookahead
         """
-        min_val = np.iinfo(dt).min
-        max_val = np.iinfo(dt).max
         num_samples = data.shape[0]
-        padded_data = np.concatenate([self.padding, data])
-        self.padding = padded_data[-(self.filter_len - 1):]
-        start = self.filter_len + 1
-        end = start + num_samples
-        if data.ndim > 1:
-            return np.clip(np.apply_along_axis(np.convolve, 0, padded_data, self.fir_filter, mode="full")[start:end], min_val, max_val)
-        else:
-            return np.clip(np.convolve(padded_data, self.fir_filter, mode="full")[start:end], min_val, max_val)
+        if num_samples == 0:
+            return data
+        if not data.flags.c_contiguous:
+            data = np.ascontiguousarray(data)
+        if num_samples > self._capacity:
+            self._grow(num_samples)
+        lookahead = self.lookahead
+
+        magnitudes = np.abs(data, out=self._magnitudes[:num_samples])
+
+        # The delayed output is the end of the last call followed by the start of this one
+        delayed = min(lookahead, num_samples)
+        self._next_delay[:lookahead - delayed] = self._delay[delayed:]
+        self._next_delay[lookahead - delayed:] = data[num_samples - delayed:]
+        if delayed < num_samples:
+            # memoryviews move overlapping ranges without a temporary copy, numpy makes one
+            frames = memoryview(data).cast("B")
+            frame_size = data.itemsize * data.shape[1]
+            frames[delayed * frame_size:] = frames[:(num_samples - delayed) * frame_size]
+        data[:delayed] = self._delay[:delayed]
+        self._delay, self._next_delay = self._next_delay, self._delay
+
+        if self._idle and magnitudes.max() <= self.threshold:
+            return data
+        
+        # Peak of each frame over all channels (np.max along axis 1 is very slow for so few channels)
+        peaks = self._peaks[:num_samples]
+        peaks[:] = magnitudes[:, 0]
+        for channel in range(1, data.shape[1]):
+            np.maximum(peaks, magnitudes[:, channel], out=peaks)
+        
+        # Lookahead: every output frame takes the lowest gain needed over the next lookahead frames
+        targets = self._all_targets[:lookahead + num_samples]
+        targets[:lookahead] = self._targets
+        self._target_gain(peaks, targets[lookahead:])
+        self._targets[:] = targets[num_samples:]
+        min_gain = self._min_gain[:num_samples]
+        self._lookahead_min(targets, min_gain)
+
+        # Release: gain_db[i] = min(gain_db[i], gain_db[i-1] + release), worked out with a running minimum
+        ramp = self._ramp[:num_samples]
+        gain_db = self._gain_db_buffer[:num_samples]
+        gain_db[:] = min_gain # Mixing float32 and float64 in a ufunc makes numpy allocate a cast buffer, copying doesn't
+        gain_db -= ramp
+        np.minimum.accumulate(gain_db, out=gain_db)
+        np.minimum(gain_db, self._gain_db, out=gain_db)
+        np.add(ramp, gain_db, out=gain_db)
+        np.minimum(gain_db, 0, out=gain_db)
+        self._gain_db = gain_db[-1]
+
+        # Attack: average over the last lookahead frames, each of those gains already covers the current frame's peak
+        gain = self._gain[:lookahead - 1 + num_samples]
+        gain[:lookahead - 1] = self._smoothing
+        np.divide(gain_db, 20, out=gain[lookahead - 1:])
+        np.power(10, gain[lookahead - 1:], out=gain[lookahead - 1:])
+        self._smoothing[:] = gain[num_samples:]
+        summed = self._summed[:lookahead + num_samples] # summed[0] stays 0
+        np.cumsum(gain, out=summed[1:])
+        smoothed = np.subtract(summed[lookahead:], summed[:num_samples], out=self._smoothed[:num_samples])
+        smoothed /= lookahead
+
+        smoothed32 = self._smoothed32[:num_samples]
+        smoothed32[:] = smoothed
+        # A channel at a time, broadcasting the gain over the channels makes numpy allocate a buffer
+        for channel in range(data.shape[1]):
+            np.multiply(data[:, channel], smoothed32, out=data[:, channel])
+        self._idle = self._gain_db >= 0 and not self._targets.any() and (lookahead == 1 or self._smoothing.min() >= 1)
+        return data
+
+class StreamingResampler():
 
-def change_speed(song_data: bytes, speed: float, filter: FIRLowpassFilter | None = None, dt=np.int16):
+    """
+    Linear interpolation resampler for a stream of chunks. Unlike resample, which starts every chunk over at
+    phase zero and stretches it to a whole number of samples, this carries the fractional read position and the
+    last input frame over to the next chunk, so chunk edges line up exactly and the output length averages out
+    to exactly input length / ratio. All channels are interpolated at once, and the ratio can change on every call
+    """
+
+    def __init__(self, num_channels=2):
+        self.num_channels = num_channels
+        self.reset()
+    
+    def reset(self):
+        # Read positions count from the last frame of the previous chunk (0) followed by the new chunk (1 to n)
+        self._history = np.zeros(shape=(1, self.num_channels))
+        self._position = 1.0
+    
+    def process(self, data: np.ndarray, ratio: float) -> np.ndarray:
+        """
+        Expects data in the shape of [num_samples, num_channels]. ratio is the number of input frames per output frame
+        (the playback speed). Returns floating point data (float32 if data is float32)
+        """
+        if ratio <= 0:
+            raise ValueError("ratio must be > 0")
+        num_samples = data.shape[0]
+        out_dtype = np.float32 if data.dtype == np.float32 else np.float64
+        if num_samples == 0:
+            return np.empty(shape=(0, data.shape[1]), dtype=out_dtype)
+        if self._history.shape[1] != data.shape[1]:
+            self.num_channels = data.shape[1]
+            self.reset()
+
+        # Every output frame whose read position falls before the last input frame, the rest waits for the next chunk
+        num_out = max(ceil((num_samples - self._position) / ratio), 0)
+        positions = self._position + ratio * np.arange(num_out)
+        index = positions.astype(np.intp)
+        frac = (positions - index).astype(out_dtype)[:, None]
+
+        # np.take is a lot faster than fancy indexing along the first axis
+        frames = np.concatenate((self._history.astype(out_dtype), data.astype(out_dtype, copy=False)))
+        left = np.take(frames, index, axis=0)
+        out = np.take(frames, index + 1, axis=0)
+        out -= left
+        out *= frac
+        out += left
+
+        self._position += num_out * ratio - num_samples
+        self._history = data[-1:].astype(np.float64)
+        return out
+
+def change_speed(song_data: bytes, speed: float, filter: FIRLowpassFilter | None = None, dt=np.int16, 
+                 resampler: StreamingResampler | None = None):
     """
     This function manipulates the raw audio data to speed up or slow down a song by averaging audio samples
     or by cutting out audio samples. This process is slow when upsampling
@@ -197,9 +670,24 @@ def change_speed(song_data: bytes, speed: float, filter: FIRLowpassFilter | None
     # Convert bytes to numpy array (faster to deal with)
     channels = np.ndarray(shape=(len(song_data)//2//2, 2), dtype=dt, buffer=song_data, order="C")
 
-    channels = np.apply_along_axis(resample, axis=0, arr=channels, scale=1/speed)
+    channels = change_speed_array(channels, speed, filter=filter, dt=dt, resampler=resampler)
+
+    return channels.astype(dt).tobytes() # return as bytes
+
+def change_speed_array(channels: np.ndarray, speed: float, filter: FIRLowpassFilter | None = None, dt=np.int16, 
+                       resampler: StreamingResampler | None = None):
+    """
+    Same as change_speed, but works directly on an array in the shape of [num_samples, num_channels].
+    The output is left as floating point, it's up to the caller to cast it back to an integer dtype.
+    dt is only used to clip the filtered signal, set it to None if working with float data.
+    Pass a StreamingResampler when the chunks are consecutive pieces of the same stream
+    """
+    if resampler is not None:
+        channels = resampler.process(channels, speed)
+    else:
+        channels = resample(channels, scale=1/speed)
 
     if filter is not None and speed < 1: # If we're slowing down, we need to apply a low pass filter to the outgoing audio
         channels = filter.filter_signal(channels, dt)
 
-    return channels.astype(dt).tobytes() # return as bytes
\ No newline at end of file
+    return channels
\ No newline at end of file
@@ -1,9 +1,27 @@
 import numpy as np
-from tools.audioprocessing import db_to_amp, resample
+from collections import deque
+from tools.audioprocessing import db_to_amp, resample, change_speed_array, SoftLimiter
+from tools.bufferpool import chunk_pool
 
 class AudioSegment():
+    """
+    Holds a block of interleaved audio samples in a [num_frames, num_channels] numpy array.
 
-    def __init__(self, data: bytes, frame_rate: int = 44_100, channels: int = 2, sample_width: int = 2):
+    By default samples are kept in the integer dtype given by sample_width and every operation
+    converts back to that dtype right away. Calling to_float() switches the segment to a float32
+    working buffer (normalized to -1.0 <= x <= 1.0) where gains, fades, mixes and resamples no longer
+    clip or cast. The samples are then only quantized back to the integer dtype once, when the data is read.
+
+    Gain, fade and reverse don't touch the samples, they get recorded as pending operations
+    (a gain scalar, a list of fade envelopes and a reverse flag) and are all applied in one multiply and
+    clip pass whenever the samples are needed: when the data is read, or before slicing, concatenating,
+    mixing or resampling. For float32 segments that pass is fused with quantizing back to the integer dtype.
+
+    Slicing returns views into the same buffer rather than copies. Evaluating pending operations always
+    writes into a fresh block from the shared chunk_pool, so segments sharing a buffer never see each other's changes.
+    """
+
+    def __init__(self, data: bytes | np.ndarray, frame_rate: int = 44_100, channels: int = 2, sample_width: int = 2):
 
         match sample_width:
             case 1:
@@ -18,8 +36,12 @@ class AudioSegment():
         self.min_val = np.iinfo(self.dt).min
         self.max_val = np.iinfo(self.dt).max
             
-        # make sure buffer is a bytearray, else we won't be able to write to the array
-        self._data = np.ndarray(shape=(len(data)//channels//sample_width, channels), dtype=self.dt, buffer=bytearray(data), order="C")
+        if isinstance(data, np.ndarray):
+            # Wrap the array as is, no copy is made
+            self._data = data.reshape(-1, channels)
+        else:
+            # make sure buffer is a bytearray, else we won't be able to write to the array
+            self._data = np.ndarray(shape=(len(data)//channels//sample_width, channels), dtype=self.dt, buffer=bytearray(data), order="C")
 
         self.frame_rate = frame_rate
         self.channels = channels
@@ -27,13 +49,10 @@ class AudioSegment():
     
     def __add__(self, arg):
         if isinstance(arg, AudioSegment):
-            if self.frame_rate != arg.frame_rate:
-                arg._data = np.apply_along_axis(resample, axis=0, arr=arg._data, scale=self.frame_rate/arg.frame_rate).astype(self.dt)
-
-            self._data = np.concatenate((self._data, arg._data))
+            self._data = np.concatenate((self._data, self._match_samples(arg)))
             return self
         elif isinstance(arg, float | int | np.integer):
-            self._data = np.clip(self._data * db_to_amp(arg), a_min=self.min_val, a_max=self.max_val).astype(self.dt)
+            self._gain *= db_to_amp(arg) # Applied when the samples are evaluated
             return self
         else:
             raise TypeError(f"unsupported operand type(s) for +: 'AudioSegment' and {type(arg)}")
@@ -47,36 +66,15 @@ class AudioSegment():
     def __mul__(self, arg):
         if isinstance(arg, AudioSegment):
 
-            # If mixing between two different rates, resample the second argument to the first's rate, then mix
-            if self.frame_rate != arg.frame_rate:
-                arg._data = np.apply_along_axis(resample, axis=0, arr=arg._data, scale=self.frame_rate/arg.frame_rate).astype(self.dt)
-
-            self._data = self._data.astype(np.float32) # Cast to float32 incase we overflow from the sum of the signals
-
-            # data_max = np.max(self._data)
-            # arg_max = np.max(self._data)
-
-            try:
-                self._data = self._data + arg._data
-            except ValueError:
-                # If audio samples are close enough, add silence to fill the hole
-                if (frame_diff := self.get_num_frames() - arg.get_num_frames()) < np.ceil(self.frame_rate / 1000)\
-                    and frame_diff > -np.ceil(self.frame_rate / 1000):
-                    
-                    if frame_diff > 0:
-                        self._data = self._data + np.concatenate((arg._data, np.zeros(shape=(frame_diff, arg.channels))))
-                    else:
-                        self._data = np.concatenate((self._data, np.zeros(shape=(-frame_diff, self.channels)))) + arg._data
-                else:
-                    raise
-
-            max_val = np.max(np.abs(self._data))
-            if max_val > self.max_val: # If the sum of our signals would clip, normalize the signal to our dtype range
-                # norm_factor = ((data_max + arg_max)/2) / max_val
-                self._data = self._data * (self.max_val / max_val)
-            
-            self._data = self._data.astype(self.dt)
+            # Lengths are allowed to be off by less than a millisecond (from rounding), the gap gets filled with silence
+            arg_frames = round(arg.get_num_frames() * self.frame_rate / arg.frame_rate)
+            if abs(self.get_num_frames() - arg_frames) >= np.ceil(self.frame_rate / 1000):
+                raise ValueError(f"can't mix segments of {self.get_num_frames()} and {arg_frames} frames")
 
+            # Anything out of range gets clipped when quantizing, rather than normalizing the sum of every chunk
+            # to a different gain. Use mix with a SoftLimiter to keep peaks in range smoothly
+            mixed = mix([self, arg], frame_rate=self.frame_rate)._samples
+            self._data = mixed if self.is_float else self._quantize(mixed)
             return self
 
         elif isinstance(arg, int | np.integer):
@@ -99,31 +97,169 @@ class AudioSegment():
             if ms.step:
                 raise ValueError("slicing in steps is not supported!")
             
-            start = ms.start if ms.start is not None else 0
-            end = ms.stop if ms.stop is not None else len(self.data)
+            num_frames = self.get_num_frames()
+            start_frame = min(round(ms.start * self.frame_rate / 1000), num_frames) if ms.start is not None else 0
+            end_frame = min(round(ms.stop * self.frame_rate / 1000), num_frames) if ms.stop is not None else num_frames
 
-            start = min(start, len(self.data))
-            end = min(end, len(self.data))
+            return self._spawn(self._data[start_frame:end_frame])
+        else:
+            raise ValueError("indexing is not supported!")
 
-            start_frame = round(start * self.frame_rate / 1000)
-            end_frame = round(end * self.frame_rate / 1000)
+    def _spawn(self, data: np.ndarray):
+        """
+        Creates a new AudioSegment with the same properties as this one, but holding different samples
+        (with no pending operations)
+        """
+        segment = AudioSegment.__new__(AudioSegment)
+        segment.__dict__.update(self.__dict__)
+        segment._data = data
+        return segment
 
-            data = self._data[start_frame:end_frame]
+    @property
+    def _data(self) -> np.ndarray:
+        """
+        The samples with all pending gain/fade/reverse operations applied
+        """
+        if self._pending:
+            self._data = self._evaluate(self._samples.dtype)
+        return self._samples
 
-            return AudioSegment(data.tobytes(), self.frame_rate, self.channels, self.sample_width)
-        else:
-            raise ValueError("indexing is not supported!")
+    @_data.setter
+    def _data(self, data: np.ndarray):
+        self._samples = data
+        self._gain = 1.0
+        self._envelopes: list[tuple[int, np.ndarray]] = [] # (start frame, per frame amplitudes), in playback order
+        self._reversed = False
+
+    @property
+    def _pending(self):
+        return self._gain != 1 or self._envelopes or self._reversed
+
+    def _amp(self):
+        """
+        Folds the pending gain and fade envelopes into a single scalar, or a [num_frames, 1] array if there are fades.
+        Returns None if there's nothing to apply
+        """
+        if not self._envelopes:
+            return None if self._gain == 1 else np.float32(self._gain)
+        amp = np.full(self._samples.shape[0], self._gain, dtype=np.float32)
+        for start_frame, envelope in self._envelopes:
+            amp[start_frame:start_frame + envelope.shape[0]] *= envelope
+        return amp[:, None]
+
+    def _evaluate(self, dtype, scale=1.0) -> np.ndarray:
+        """
+        Returns the samples times scale with the pending operations applied, converted to dtype.
+        This is the single pass everything gets fused into: one multiply, and a clip and cast if dtype is an integer type.
+        The result is always a new block (or a view if there's nothing to compute), the samples are left untouched
+        """
+        samples = np.flip(self._samples, axis=0) if self._reversed else self._samples
+        amp = self._amp()
+        if amp is not None:
+            scale = amp * np.float32(scale)
+        elif scale == 1 and samples.dtype == dtype:
+            return samples # Reversing only, np.flip's view is all we need
+
+        out = chunk_pool.acquire(samples.shape[0], samples.shape[1], dtype)
+        if dtype == np.float32:
+            np.multiply(samples, scale, out=out, dtype=np.float32)
+            return out
 
+        info = np.iinfo(dtype)
+        scaled = chunk_pool.acquire(samples.shape[0], samples.shape[1], np.float32)
+        np.multiply(samples, scale, out=scaled, dtype=np.float32)
+        np.clip(scaled, info.min, info.max, out=scaled)
+        np.copyto(out, scaled, casting="unsafe")
+        return out
     
+    def _match_samples(self, arg: "AudioSegment"):
+        """
+        Returns the samples of another segment resampled to our frame rate and converted to our working dtype.
+        The other segment is left untouched
+        """
+        arg_data = arg._data
+        if self.frame_rate != arg.frame_rate:
+            arg_data = resample(arg_data, scale=self.frame_rate/arg.frame_rate)
+            if not arg.is_float:
+                arg_data = arg_data.astype(arg.dt)
+        if self.is_float and not arg.is_float:
+            arg_data = np.multiply(arg_data, np.float32(-1 / arg.min_val), dtype=np.float32)
+        elif not self.is_float and arg.is_float:
+            arg_data = arg._quantize(arg_data)
+        elif self.is_float:
+            arg_data = arg_data.astype(np.float32, copy=False)
+        return arg_data
+
     def get_num_frames(self):
-        return self._data.shape[0]
+        return self._samples.shape[0]
+    
+    @property
+    def is_float(self):
+        """
+        True if the samples are held in a float32 working buffer rather than the integer output dtype
+        """
+        return self._samples.dtype == np.float32
+    
+    def to_float(self):
+        """
+        Switches the samples to a float32 working buffer (normalized to -1.0 <= x <= 1.0).
+        Any gain, fade, mix or resample after this point skips the clip and cast back to the integer dtype
+        """
+        if not self.is_float:
+            self._data = self._evaluate(np.float32, scale=-1 / self.min_val)
+        return self
+    
+    def to_int(self):
+        """
+        Quantizes a float32 working buffer back to the integer dtype given by sample_width
+        """
+        if self.is_float:
+            self._data = self._quantize()
+        return self
+    
+    def _quantize(self, data: np.ndarray | None = None):
+        """
+        Converts float32 samples into the integer dtype in a single scale and clip pass.
+        With no data given, quantizes our own samples with the pending operations fused into the same pass
+        """
+        if data is None:
+            return self._evaluate(self.dt, scale=-self.min_val)
+        scaled = chunk_pool.acquire(data.shape[0], data.shape[1], np.float32)
+        np.multiply(data, np.float32(-self.min_val), out=scaled)
+        np.clip(scaled, self.min_val, self.max_val, out=scaled)
+        out = chunk_pool.acquire(data.shape[0], data.shape[1], self.dt)
+        np.copyto(out, scaled, casting="unsafe")
+        return out
+    
+    def _output(self):
+        """
+        Returns the samples in the integer dtype, quantizing and applying pending operations without storing the result
+        """
+        if self.is_float:
+            return self._quantize()
+        return self._evaluate(self.dt)
     
     @property
     def data(self):
         """
         Get data in the form of the raw byte data
         """
-        return self._data.tobytes()
+        return self._output().tobytes()
+    
+    @property
+    def buffer(self):
+        """
+        Get data as a memoryview of the raw byte data without copying it to a bytes object.
+        Float32 data gets quantized and reversed (non-contiguous) data gets laid out again into a pooled block
+        """
+        data = self._output()
+        if not data.flags.c_contiguous:
+            contiguous = chunk_pool.acquire(data.shape[0], data.shape[1], self.dt)
+            np.copyto(contiguous, data)
+            data = contiguous
+        if data.size == 0:
+            return memoryview(bytes(0))
+        return memoryview(data).cast("B")
     
     def fade(self, to_gain=0, from_gain=0, start=0, duration="end"):
 
@@ -133,21 +269,179 @@ class AudioSegment():
         to_amp = db_to_amp(to_gain)
         from_amp = db_to_amp(from_gain)
 
+        num_frames = self._samples.shape[0]
         start_frame = round(start * self.frame_rate / 1000)
 
         if duration == "end":
-            end_frame = self._data.shape[0]
+            end_frame = num_frames
         else:
-            end_frame = min(start_frame + round(duration * self.frame_rate / 1000), self._data.shape[0])
-        
-        frame_duration = end_frame - start_frame
-        
-        amp_array = np.linspace(from_amp, to_amp, num=frame_duration, endpoint=True)
-
-        self._data[start_frame:end_frame] = np.clip(self._data[start_frame:end_frame].T * amp_array, a_min=self.min_val, a_max=self.max_val).T.astype(self.dt)
+            end_frame = min(start_frame + round(duration * self.frame_rate / 1000), num_frames)
 
+        return self.apply_envelope(np.linspace(from_amp, to_amp, num=max(end_frame - start_frame, 0), endpoint=True, dtype=np.float32), start_frame)
+    
+    def apply_envelope(self, gains: np.ndarray, start_frame=0):
+        """
+        Multiplies the audio by a per frame gain curve (amplitudes, not dB) starting at start_frame.
+        Like fade, this only gets applied when the samples are evaluated. gains is never written to, so it can be
+        a view of a cached curve
+        """
+        gains = gains[:max(self._samples.shape[0] - start_frame, 0)]
+        # Envelopes get multiplied into the samples along with the pending gain when they're evaluated
+        self._envelopes.append((start_frame, gains))
         return self
     
     def reverse(self):
-        self._data = np.flip(self._data, axis=0)
-        return self
\ No newline at end of file
+        # Pending fades are kept in playback order, so they have to be mirrored along with the samples
+        num_frames = self._samples.shape[0]
+        self._envelopes = [(num_frames - start_frame - envelope.shape[0], envelope[::-1]) for start_frame, envelope in self._envelopes]
+        self._reversed = not self._reversed
+        return self
+    
+    def change_speed(self, speed: float, filter=None, resampler=None):
+        """
+        Resamples the audio to play back at speed times the original rate, low pass filtering if we slow down.
+        Float32 segments stay in float32, integer segments are cast back to their dtype.
+        Pass a StreamingResampler if this segment continues the stream the resampler was last used on.
+
+        Unlike the other operations, this returns a new AudioSegment since the frame count changes
+        and callers still need the original length to keep track of the song position
+        """
+        if self.is_float and not self._envelopes and not self._reversed:
+            # Resampling is linear, so a plain gain can stay pending and be fused into quantizing the output
+            data = change_speed_array(self._samples, speed, filter=filter, dt=None, resampler=resampler)
+            segment = self._spawn(data.astype(np.float32, copy=False))
+            segment._gain = self._gain
+            return segment
+        data = change_speed_array(self._data, speed, filter=filter, dt=None if self.is_float else self.dt, resampler=resampler)
+        return self._spawn(data.astype(np.float32 if self.is_float else self.dt))
+
+
+def mix(segments: list[AudioSegment], gains: list[float] | None = None, frame_rate: int | None = None, limiter: SoftLimiter | None = None):
+    """
+    Sums any number of segments (each with its own gain in dB) into a float32 AudioSegment.
+    Each input is scaled (with its pending gain/fade operations) and added in one pass, segments at a different
+    frame rate are resampled to frame_rate (the first segment's by default). Shorter segments are padded with silence.
+
+    Nothing is normalized or clipped here. Pass a SoftLimiter to limit the sum, the limiter keeps its state
+    between calls so the same one should be used for every chunk of a stream
+    """
+    if gains is None:
+        gains = [0] * len(segments)
+    first = segments[0]
+    frame_rate = frame_rate or first.frame_rate
+    template = AudioSegment(np.zeros(shape=(0, first.channels), dtype=np.float32), frame_rate, first.channels, first.sample_width)
+
+    inputs = []
+    for segment, gain in zip(segments, gains):
+        if segment.frame_rate == frame_rate and not segment._reversed:
+            # Fold the pending operations and the int -> float normalization into the gain we mix with
+            amp = segment._amp()
+            scale = db_to_amp(gain) * (1 if segment.is_float else -1 / segment.min_val)
+            inputs.append((segment._samples, np.float32(scale) if amp is None else amp * np.float32(scale)))
+        else:
+            inputs.append((template._match_samples(segment), np.float32(db_to_amp(gain))))
+
+    num_frames = max(samples.shape[0] for samples, _ in inputs)
+    out = chunk_pool.acquire(num_frames, first.channels, np.float32)
+    samples, scale = inputs[0]
+    np.multiply(samples, scale, out=out[:samples.shape[0]], dtype=np.float32)
+    out[samples.shape[0]:] = 0
+    if len(inputs) > 1:
+        scratch = chunk_pool.acquire(num_frames, first.channels, np.float32)
+        for samples, scale in inputs[1:]:
+            n = samples.shape[0]
+            np.multiply(samples, scale, out=scratch[:n], dtype=np.float32)
+            out[:n] += scratch[:n]
+
+    if limiter is not None:
+        out = limiter.process(out)
+    return template._spawn(out)
+
+
+class AudioRope():
+    """
+    Accumulates audio as a deque of blocks instead of one contiguous buffer.
+
+    Appending an AudioSegment is O(1) (no concatenation of everything we already have) and taking
+    audio off the front is O(1) amortized: if the requested audio lies within the first block we
+    get a view of it, otherwise only the requested frames get copied. Contiguous data is only
+    built when something actually needs it (pop_front across blocks, or to_segment).
+    """
+
+    def __init__(self, frame_rate: int = 44_100, channels: int = 2, sample_width: int = 2):
+        # Empty segment used to resample/convert appended audio and to create the segments we hand out
+        self._template = AudioSegment(bytes(0), frame_rate, channels, sample_width)
+        self._blocks: deque[np.ndarray] = deque()
+        self._front = 0 # Number of frames already taken from the first block
+        self._num_frames = 0
+
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+    
+    def __len__(self):
+        """
+        Returns audio length in milliseconds
+        """
+        return round(1000 * (self._num_frames / self.frame_rate))
+    
+    def __add__(self, arg):
+        if isinstance(arg, AudioSegment):
+            return self.append(arg)
+        else:
+            raise TypeError(f"unsupported operand type(s) for +: 'AudioRope' and {type(arg)}")
+    
+    def get_num_frames(self):
+        return self._num_frames
+    
+    def append(self, segment: AudioSegment):
+        """
+        Adds audio to the end of the rope, resampling it to our frame rate if needed.
+        The rope works in float32 if the first segment added to it is float32
+        """
+        if not self._blocks and self._template.is_float != segment.is_float:
+            self._template._data = self._template._data.astype(np.float32 if segment.is_float else self._template.dt)
+        data = self._template._match_samples(segment)
+        if data.shape[0]:
+            self._blocks.append(data)
+            self._num_frames += data.shape[0]
+        return self
+    
+    def pop_front(self, ms) -> AudioSegment:
+        """
+        Removes the first ms milliseconds from the rope and returns them as an AudioSegment
+        """
+        num_frames = min(round(ms * self.frame_rate / 1000), self._num_frames)
+        self._num_frames -= num_frames
+
+        pieces = []
+        while num_frames > 0:
+            block = self._blocks[0]
+            end = min(self._front + num_frames, block.shape[0])
+            pieces.append(block[self._front:end])
+            num_frames -= end - self._front
+            if end == block.shape[0]:
+                self._blocks.popleft()
+                self._front = 0
+            else:
+                self._front = end
+        
+        if len(pieces) == 1:
+            return self._template._spawn(pieces[0])
+        elif pieces:
+            return self._template._spawn(np.concatenate(pieces))
+        else:
+            return self._template._spawn(self._template._data[0:0])
+    
+    def to_segment(self) -> AudioSegment:
+        """
+        Returns everything in the rope as a single AudioSegment without consuming it
+        """
+        if not self._blocks:
+            return self._template._spawn(self._template._data[0:0])
+        # Collapse into a single block so calling this again doesn't copy again
+        self._blocks[0] = self._blocks[0][self._front:]
+        self._front = 0
+        if len(self._blocks) > 1:
+            self._blocks = deque([np.concatenate(self._blocks)])
+        return self._template._spawn(self._blocks[0])
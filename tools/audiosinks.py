@@ -0,0 +1,115 @@
+import wave
+from collections import deque
+
+
+class AudioSink():
+    """
+    Stands in for AudioStreamer as AudioPlayer's output (AudioPlayer(sink=...)), for when the audio shouldn't
+    go to a sound card: write() never waits for a device, so the player renders as fast as the CPU allows.
+
+    Has the same telemetry attributes as AudioStreamer so the debug info and /read keep working,
+    there's never an underrun or anything buffered though.
+    """
+    pull = False
+    buffered_ms = 0
+    buffer_target_ms = 0
+    latency_ms = 0
+
+    def __init__(self, channels=2, rate=44_100, encoding=16):
+        self.channels = channels
+        self.rate = rate
+        self.encoding = encoding
+        self.frame_size = channels * encoding // 8
+
+        self.frames_written = 0
+        self.underruns = 0
+        self.overruns = 0
+        self.jitter_ms = 0
+        self.command_latencies = deque(maxlen=32)
+
+    @property
+    def seconds_written(self):
+        return self.frames_written / self.rate
+
+    def write(self, data: bytes | memoryview):
+        self.frames_written += len(memoryview(data).cast("B")) // self.frame_size
+
+    @property
+    def rate_locked(self):
+        """
+        Whether set_rate can't be used anymore (see FileSink)
+        """
+        return False
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+    def mark_command(self):
+        pass
+
+    def mark_stopped(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class NullSink(AudioSink):
+    """
+    Throws everything away (only counting the frames)
+    """
+
+
+class FileSink(AudioSink):
+    """
+    Writes everything to a file, as a WAV file if the path ends in .wav and as raw interleaved samples otherwise.
+
+    A WAV file only has one sample rate, so it can't follow a rate change once frames have been written to it
+    (rate_locked), AudioPlayer then resamples tracks at other rates to the file's rate even with follow_track_rate on.
+    A raw file just keeps going at the new rate.
+    """
+
+    def __init__(self, path, channels=2, rate=44_100, encoding=16):
+        super().__init__(channels, rate, encoding)
+        self.path = path
+        self.is_wav = path.lower().endswith(".wav")
+        self._fp = open(path, "wb")
+        self._wav = None
+        if self.is_wav:
+            self._wav = wave.open(self._fp, "wb")
+            self._wav.setnchannels(channels)
+            self._wav.setsampwidth(encoding // 8)
+            self._wav.setframerate(rate)
+
+    def write(self, data: bytes | memoryview):
+        super().write(data)
+        if self._wav is not None:
+            self._wav.writeframesraw(data)
+        else:
+            self._fp.write(data)
+
+    @property
+    def rate_locked(self):
+        return self._wav is not None and self.frames_written > 0
+
+    def set_rate(self, rate):
+        if rate == self.rate:
+            return
+        if self._wav is not None:
+            if self.frames_written:
+                raise ValueError(f"Can't change the rate of {self.path} to {rate} after writing to it at {self.rate}")
+            self._wav.setframerate(rate)
+        super().set_rate(rate)
+
+    def close(self):
+        if self._fp.closed:
+            return
+        if self._wav is not None:
+            self._wav.close() # Fills in the header's sizes
+        self._fp.close()
@@ -0,0 +1,87 @@
+import weakref
+from collections import deque
+from threading import Lock
+import numpy as np
+
+
+class BufferPool():
+    """
+    A pool of preallocated sample blocks that decoders decode into and AudioSegments render into,
+    so that steady-state playback doesn't allocate a new buffer for every chunk.
+
+    Blocks are handed out as [num_frames, channels] views of an array over a bytearray. A block goes back into
+    circulation on its own once nothing uses it anymore, so there's no need to release blocks by hand: every view
+    (numpy view, AudioSegment, memoryview of one) keeps that array alive, and a weakref callback puts the block back
+    on its free list when the array goes. So acquire just takes the first free block that's big enough.
+
+    max_blocks has to cover every chunk that can be held at once or the pool runs dry and allocates during playback,
+    the player raises it to fit its prefetch and decode queue depths (see reserve)
+    """
+
+    def __init__(self, max_blocks=64):
+        self.max_blocks = max_blocks # Max number of blocks kept per (dtype, channels) pair
+        # Blocks nothing uses anymore, least recently freed first. Appended to from whichever thread lets go of a block,
+        # deque appends and pops are atomic so that doesn't need the lock
+        self._free: dict[tuple[np.dtype, int], deque[bytearray]] = {}
+        self._num_blocks: dict[tuple[np.dtype, int], int] = {} # Blocks kept (free or in use)
+        self._refs = {} # id(block) -> weakref to the array the block is handed out as
+        self._lock = Lock()
+
+        self.allocations = 0 # Number of times we had to allocate a new block
+        self.reuses = 0 # Number of times a free block was handed out again
+
+    def _hand_out(self, block: bytearray, free: deque, num_frames: int, channels: int, dtype: np.dtype):
+        array = np.frombuffer(block, dtype=dtype)
+        self._refs[id(block)] = weakref.ref(array, lambda _, block=block: free.append(block))
+        return array.reshape(-1, channels)[:num_frames]
+
+    def acquire(self, num_frames: int, channels: int = 2, dtype=np.int16) -> np.ndarray:
+        """
+        Returns an uninitialized [num_frames, channels] array, reusing a free block if there is one
+        """
+        dtype = np.dtype(dtype)
+        key = (dtype, channels)
+        nbytes = num_frames * channels * dtype.itemsize
+        with self._lock:
+            free = self._free.get(key)
+            if free is None:
+                free = self._free[key] = deque()
+                self._num_blocks[key] = 0
+            for _ in range(len(free)):
+                block = free.popleft()
+                if len(block) >= nbytes:
+                    self.reuses += 1
+                    return self._hand_out(block, free, num_frames, channels, dtype)
+                free.append(block) # Too small for this one, it'll do for the next
+
+            self.allocations += 1
+            # Round the capacity up so chunks that are a few frames longer (e.g. after resampling) still fit
+            capacity = -(-num_frames // 256) * 256
+            block = bytearray(capacity * channels * dtype.itemsize)
+            if self._num_blocks[key] < self.max_blocks:
+                self._num_blocks[key] += 1
+                return self._hand_out(block, free, num_frames, channels, dtype)
+            return np.frombuffer(block, dtype=dtype).reshape(-1, channels)[:num_frames]
+
+    def reserve(self, max_blocks: int):
+        """
+        Makes sure the pool keeps at least max_blocks blocks per (dtype, channels) pair
+        """
+        with self._lock:
+            self.max_blocks = max(self.max_blocks, max_blocks)
+
+    def stats(self):
+        """
+        Returns (allocations, reuses, number of blocks held)
+        """
+        with self._lock:
+            return self.allocations, self.reuses, sum(self._num_blocks.values())
+
+    def reset_stats(self):
+        with self._lock:
+            self.allocations = 0
+            self.reuses = 0
+
+
+# Shared by the decoders and AudioSegment
+chunk_pool = BufferPool()
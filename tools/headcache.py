@@ -0,0 +1,106 @@
+import hashlib
+import mmap
+import os
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+
+class HeadCache():
+    """
+    The first few seconds of tracks' decoded audio, kept as raw sample files in folder. Starting one of those
+    tracks plays from a memory map of its file right away while the decoder opens the track and catches up.
+
+    Entries are named by a hash of everything that decides what the decoder puts out (see entry_name), so a
+    changed file or output format just misses. Once the files take more than budget bytes the least recently used
+    ones get deleted. A file's modification time is when it was last used, so that order survives restarts
+    """
+
+    def __init__(self, folder, budget=128 * 2**20):
+        self.folder = folder
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # name -> size in bytes, least recently used first
+        self._lock = Lock()
+        self._scan()
+
+    def _scan(self):
+        try:
+            files = list(os.scandir(self.folder))
+        except OSError:
+            return
+        entries = []
+        for entry in files:
+            try:
+                if entry.name.endswith(".tmp"): # Left over from a write that didn't finish
+                    os.remove(entry.path)
+                elif entry.name.endswith(".pcm"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name[:-4], stat.st_size))
+            except OSError:
+                pass
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self.size += size
+
+    @staticmethod
+    def entry_name(*key):
+        """
+        File name for an entry, from anything that identifies what's in it (track, file size and date, output format...)
+        """
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, name):
+        return os.path.join(self.folder, f"{name}.pcm")
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def get(self, name, dtype, channels) -> np.ndarray | None:
+        """
+        Returns the entry as a read only [num_frames, channels] array of a memory map of its file, or None if there isn't one
+        """
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+        path = self._path(name)
+        try:
+            with open(path, "rb") as fp:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (OSError, ValueError): # Deleted from under us (or empty, which can't be mapped)
+            with self._lock:
+                self.size -= self._entries.pop(name, 0)
+                self.misses += 1
+            return None
+        self.hits += 1
+        # The map closes when the last chunk viewing it is gone
+        return np.frombuffer(data, dtype=dtype).reshape(-1, channels)
+
+    def put(self, name, frames: np.ndarray):
+        """
+        Saves frames as the entry name, then deletes the least recently used entries until the cache fits in its budget
+        """
+        if frames.nbytes > self.budget:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(name)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as fp:
+            fp.write(np.ascontiguousarray(frames).data)
+        os.replace(temp_path, path) # So a half written entry never gets played
+
+        with self._lock:
+            self.size += frames.nbytes - self._entries.pop(name, 0)
+            self._entries[name] = frames.nbytes
+            while self.size > self.budget:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.size -= old_size
+                try:
+                    os.remove(self._path(old_name))
+                except OSError:
+                    pass # Still mapped on Windows, the next scan picks it up again
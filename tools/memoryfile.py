@@ -0,0 +1,98 @@
+import mmap
+import os
+from threading import Thread
+from miniaudio import ffi
+
+# Bytes per read when reading ahead without madvise, network shares and SD cards do a lot better with a few large
+# sequential reads than with the many small ones a decoder makes as it goes
+READ_SIZE = 2**20
+
+
+class MemoryFile():
+    """
+    A track's (still compressed) file memory mapped for miniaudio's and stb_vorbis' memory decoders to decode from.
+    Opening it doesn't read anything, the OS pages the file in as the decoder gets to it.
+
+    To keep the decoder from waiting on a read for every page, the OS gets asked to read read_ahead_len bytes ahead in
+    the background from wherever decoding (re)starts (see read_ahead), and again each time the decoder gets halfway
+    through that (see advance). That's madvise where Python has it (not on Windows), elsewhere a background thread reads
+    that part of the file so it's in the OS cache by the time the decoder gets there.
+    Files are opened with Python's open(), which handles non-ASCII paths on Windows too.
+
+    With madvise, advance also drops the pages more than read_ahead_len away from the decoder out of the map, so an open
+    track keeps at most about 2 * read_ahead_len of its file in memory however long it is (they stay in the OS cache
+    and fault back in if a seek goes back there)
+
+    pointer is a char* cdata to the data, valid until close()
+    """
+
+    def __init__(self, path, read_ahead_len=16 * 2**20):
+        self.path = path
+        self.read_ahead_len = read_ahead_len
+        self._map = None
+        self._ahead_start = 0 # The range read ahead last
+        self._ahead_end = 0
+        with open(path, "rb", buffering=0) as fp:
+            self.size = os.fstat(fp.fileno()).st_size
+            if self.size:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(self._map, "madvise"):
+                    self._map.madvise(mmap.MADV_SEQUENTIAL)
+        # An empty file can't be mapped, it just fails to decode
+        self.pointer = ffi.from_buffer(self._map if self._map is not None else bytearray(1))
+        self.read_ahead(0)
+
+    def read_ahead(self, offset):
+        """
+        Has the OS start reading read_ahead_len bytes from offset in the background, returns right away
+        """
+        if self._map is None or not self.read_ahead_len or not 0 <= offset < self.size:
+            return
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY # madvise wants a page aligned start
+        length = min(self.read_ahead_len, self.size - start)
+        self._ahead_start, self._ahead_end = start, start + length
+        if hasattr(self._map, "madvise"):
+            self._map.madvise(mmap.MADV_WILLNEED, start, length)
+        else:
+            Thread(target=self._read_range, args=(start, length), daemon=True).start()
+
+    def advance(self, offset):
+        """
+        Tells the file decoding has got to offset. Reads ahead again from there once offset is halfway through (or outside
+        of) the range read ahead last, and drops the pages that are out of the budget
+        """
+        if self._map is None or not self.read_ahead_len:
+            return
+        if self._ahead_start <= offset and (offset - self._ahead_start < self.read_ahead_len // 2 or self._ahead_end >= self.size):
+            return
+        self.read_ahead(offset)
+        if hasattr(self._map, "madvise"):
+            # Whatever the decoder is past (or ahead of, playing backwards) by more than read_ahead_len
+            behind = max(offset - self.read_ahead_len, 0)
+            behind -= behind % mmap.ALLOCATIONGRANULARITY
+            if behind:
+                self._map.madvise(mmap.MADV_DONTNEED, 0, behind)
+            ahead = -(-self._ahead_end // mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+            if ahead < self.size:
+                self._map.madvise(mmap.MADV_DONTNEED, ahead, self.size - ahead)
+
+    def _read_range(self, start, length):
+        try:
+            with open(self.path, "rb", buffering=0) as fp:
+                fp.seek(start)
+                buffer = bytearray(min(READ_SIZE, length))
+                while length > 0 and fp.readinto(buffer):
+                    length -= len(buffer)
+        except OSError:
+            pass # Only ever a head start, the decoder reads it itself either way
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        if self.pointer is not None:
+            ffi.release(self.pointer) # The map can't be closed while cffi holds on to it
+            self.pointer = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -363,7 +363,26 @@ class MusicDatabase():
             return track_pointer
         else:
             return self.data["tracks"][track_pointer][key]
-    
+
+    def get_neighbors(self, n):
+        """
+        The ids of the tracks up to n away from the current one in play order (shuffled if shuffle is on), closest first
+        and the next one before the previous one. With shuffle on, the playlist's neighbors follow after the shuffled ones,
+        since those are what's right next to the current track on screen
+        """
+        orders = [self.shuffled_valid_pointers, self.valid_pointers] if self._shuffle else [self.valid_pointers]
+        neighbors = []
+        for valid_pointers in orders:
+            if self.track_pointer not in valid_pointers:
+                continue
+            current_pos = valid_pointers.index(self.track_pointer)
+            for distance in range(1, n + 1):
+                for direction in (1, -1):
+                    track_pointer = valid_pointers[(current_pos + direction * distance) % len(valid_pointers)]
+                    if track_pointer != self.track_pointer and track_pointer not in neighbors:
+                        neighbors.append(track_pointer)
+        return neighbors
+
     @staticmethod
     def _get_hash_from_file(file):
         buf_size = 65536
@@ -0,0 +1,148 @@
+import numpy as np
+from threading import Event
+
+
+class RingBuffer():
+    """
+    A fixed size single-producer/single-consumer ring buffer of audio frames, backed by a preallocated numpy array.
+
+    The producer (the player thread) calls write(), the consumer (the audio device's callback) calls read().
+    Each side only ever moves its own index forward, and an index is only moved after the frames it covers
+    have been copied, so the two threads never need to share a lock. Both indices count frames since the start
+    and only get wrapped when indexing into the array, which means write_index - read_index is always
+    the number of frames waiting to be played.
+
+    When the buffer is full, write() waits for the consumer to signal that it freed some space instead of polling.
+    """
+
+    def __init__(self, capacity: int, channels: int = 2, dtype=np.int16):
+        self.capacity = capacity # In frames
+        self.target = capacity # How full write() lets the buffer get, can be lowered to keep latency down
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.frame_size = self.channels * self.dtype.itemsize
+
+        self._buffer = np.zeros(shape=(capacity, channels), dtype=self.dtype)
+        # read() hands out a view of this rather than of _buffer, since the device copies the data out only after
+        # read() returned, by which time the producer could already be overwriting that part of _buffer
+        self._out = np.zeros(shape=(capacity, channels), dtype=self.dtype)
+        # The copies go through flat byte views, slicing memoryviews costs a fraction of what slicing arrays does
+        self._buffer_bytes = memoryview(self._buffer).cast("B")
+        self._out_bytes = memoryview(self._out).cast("B")
+        self._read_index = 0
+        self._write_index = 0
+        self._space_freed = Event()
+        self._producer_waiting = False # Setting the event takes a lock, so the consumer only does it when someone waits
+
+        # Number of times the consumer asked for more frames than there were (after having had enough),
+        # not counting the buffer running dry after the producer stopped on purpose (see mark_stopped and clear)
+        self.underruns = 0
+        self.overruns = 0 # Number of times the producer found the buffer full and had to wait for the consumer
+        self._starved = True # No underruns get counted until the first write
+
+    def __len__(self):
+        """
+        Number of frames waiting to be read
+        """
+        return self._write_index - self._read_index
+
+    @property
+    def frames_written(self):
+        """
+        Total number of frames written since the buffer was created
+        """
+        return self._write_index
+
+    @property
+    def frames_read(self):
+        """
+        Total number of frames read since the buffer was created
+        """
+        return self._read_index
+
+    def free(self):
+        """
+        Number of frames that can be written without waiting
+        """
+        return max(min(self.target, self.capacity) - (self._write_index - self._read_index), 0)
+
+    def write(self, data: bytes | memoryview | np.ndarray, timeout=None):
+        """
+        Copies data (raw bytes of interleaved frames, or a [num_frames, channels] array) into the buffer,
+        waiting for space whenever the buffer is full.
+        Returns the number of frames written, which is less than len(data) only if timeout ran out
+        """
+        data = memoryview(data).cast("B") if isinstance(data, np.ndarray) else memoryview(data)
+        if data.itemsize != 1:
+            data = data.cast("B")
+        total_frames = len(data) // self.frame_size
+        frame_size = self.frame_size
+
+        written = 0
+        while written < total_frames:
+            free = self.free()
+            if not free:
+                self.overruns += 1
+                self._producer_waiting = True
+                self._space_freed.clear()
+                # The consumer may have made room before it saw _producer_waiting, check again before going to sleep
+                timed_out = not self.free() and not self._space_freed.wait(timeout)
+                self._producer_waiting = False
+                if timed_out:
+                    break
+                continue
+
+            num_frames = min(free, total_frames - written)
+            start = self._write_index % self.capacity
+            first = min(num_frames, self.capacity - start)
+            self._buffer_bytes[start * frame_size:(start + first) * frame_size] = \
+                data[written * frame_size:(written + first) * frame_size]
+            if first < num_frames:
+                self._buffer_bytes[:(num_frames - first) * frame_size] = \
+                    data[(written + first) * frame_size:(written + num_frames) * frame_size]
+
+            written += num_frames
+            self._write_index += num_frames
+            self._starved = False
+
+        return written
+
+    def read(self, max_frames: int) -> memoryview:
+        """
+        Takes up to max_frames frames out of the buffer and returns them as raw bytes.
+        The returned memoryview is only valid until the next call to read()
+        """
+        num_frames = min(max_frames, len(self), self.capacity)
+        if num_frames < max_frames and not self._starved:
+            self.underruns += 1
+            self._starved = True
+        if not num_frames:
+            return memoryview(b"")
+
+        frame_size = self.frame_size
+        start = self._read_index % self.capacity
+        first = min(num_frames, self.capacity - start)
+        out = self._out_bytes[:num_frames * frame_size]
+        out[:first * frame_size] = self._buffer_bytes[start * frame_size:(start + first) * frame_size]
+        if first < num_frames:
+            out[first * frame_size:] = self._buffer_bytes[:(num_frames - first) * frame_size]
+
+        self._read_index += num_frames
+        if self._producer_waiting:
+            self._space_freed.set()
+        return out
+
+    def mark_stopped(self):
+        """
+        The producer stopped writing on purpose (pausing, stopping), what's in the buffer still gets read but running dry
+        after that isn't an underrun. The next write() starts counting them again
+        """
+        self._starved = True
+
+    def clear(self):
+        """
+        Drops everything waiting to be read. Only call this when the consumer is stopped
+        """
+        self._read_index = self._write_index
+        self._starved = True
+        self._space_freed.set()
@@ -0,0 +1,167 @@
+import os
+import struct
+import zipfile
+import numpy as np
+
+# Bitrates (kbps) by (MPEG version 1 or 2, layer), MPEG 2.5 uses the MPEG 2 tables
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates by the header's version bits (3 -> MPEG 1, 2 -> MPEG 2, 0 -> MPEG 2.5)
+SAMPLE_RATES = {3: (44_100, 48_000, 32_000), 2: (22_050, 24_000, 16_000), 0: (11_025, 12_000, 8_000)}
+
+# dr_mp3 adds this to the encoder delay from the LAME tag and takes it off the padding
+DECODER_DELAY = 529
+
+
+def parse_frame_header(header: int):
+    """
+    Returns (frame length in bytes, samples per frame, sample rate, MPEG version) for a 32 bit MP3 frame header,
+    or None if it isn't a valid one
+    """
+    if header >> 21 != 0x7FF:
+        return None
+    version_bits = (header >> 19) & 3
+    layer = 4 - ((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 15
+    rate_index = (header >> 10) & 3
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = 1 if version_bits == 3 else 2
+    rate = SAMPLE_RATES[version_bits][rate_index]
+    bitrate = BITRATES[(version, layer)][bitrate_index] * 1000
+    padding = (header >> 9) & 1
+
+    if layer == 1:
+        return (12 * bitrate // rate + padding) * 4, 384, rate, version
+    if layer == 2 or version == 1:
+        return 144 * bitrate // rate + padding, 1152, rate, version
+    return 72 * bitrate // rate + padding, 576, rate, version
+
+
+class Mp3SeekIndex():
+    """
+    Where every frame of an MP3 starts in the file and which sample it starts at, so a seek can jump straight
+    to the right frame instead of decoding everything before it (which is what ma_decoder does for MP3s).
+
+    Sample positions here are "raw", counted from the first audio frame. Decoders give positions with the
+    LAME tag's encoder delay cut off the start, raw = position + delay.
+    """
+
+    # Frames decoded ahead of the frame we want, MP3 frames can borrow bits from the frames before them
+    # (the bit reservoir) and the first decoded frame only has half of its overlap
+    WARMUP_FRAMES = 10
+
+    def __init__(self, offsets, frame_starts, rate, delay, num_frames, file_size, mtime_ns):
+        self.offsets = offsets # Byte offset of every audio frame, plus the end of the last one
+        self.frame_starts = frame_starts # Raw sample position of every audio frame, plus the end of the last one
+        self.rate = rate
+        self.delay = delay
+        self.num_frames = num_frames # Decoded length (what get_file_info reports)
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def build(cls, path):
+        """
+        Scans the frame headers of an MP3 file (no decoding). Raises ValueError if it doesn't find any audio in it
+        """
+        with open(path, "rb") as fp:
+            data = fp.read()
+            stat = os.fstat(fp.fileno())
+
+        pos = 0
+        if data[:3] == b"ID3" and len(data) >= 10: # Skip an ID3v2 tag (its size is 4 x 7 bit "syncsafe" bytes)
+            size = data[6] << 21 | data[7] << 14 | data[8] << 7 | data[9]
+            pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+        offsets = []
+        frame_samples = []
+        rate = None
+        delay = padding = 0
+        while pos + 4 <= len(data):
+            frame = parse_frame_header(struct.unpack_from(">I", data, pos)[0])
+            if frame is None or (rate is not None and frame[2] != rate):
+                pos = data.find(b"\xff", pos + 1) # Resync on the next possible frame
+                if pos < 0:
+                    break
+                continue
+            length, samples, frame_rate, version = frame
+
+            if rate is None:
+                rate = frame_rate
+                tag = cls._read_info_tag(data, pos, version)
+                if tag is not None: # The first frame is a Xing/Info frame, it holds no audio
+                    delay, padding = tag
+                    pos += length
+                    continue
+
+            offsets.append(pos)
+            frame_samples.append(samples)
+            pos += length
+
+        if not offsets:
+            raise ValueError(f"No MP3 frames found in {path}")
+        offsets.append(min(pos, len(data)))
+        frame_starts = np.concatenate(([0], np.cumsum(frame_samples, dtype=np.int64)))
+        num_frames = int(frame_starts[-1]) - delay - padding
+        if num_frames <= 0: # A broken LAME tag, or a file cut off right after it
+            raise ValueError(f"No MP3 audio found in {path}")
+        return cls(np.array(offsets, dtype=np.int64), frame_starts, rate, delay, num_frames, stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _read_info_tag(data, pos, version):
+        """
+        Returns (delay, padding) as dr_mp3 applies them if the frame at pos is a Xing/Info frame, None otherwise.
+        The frame header at pos has been read already, anything after it may be cut off
+        """
+        mono = (data[pos + 3] >> 6) == 3
+        side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+        tag = pos + 4 + (0 if data[pos + 1] & 1 else 2) + side_info # The CRC bit is 0 when there's a CRC
+        if data[tag:tag + 4] not in (b"Xing", b"Info") or len(data) < tag + 8:
+            return None
+        flags = struct.unpack_from(">I", data, tag + 4)[0]
+        lame = tag + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+        if data[lame:lame + 4] != b"LAME" or len(data) < lame + 24:
+            return 0, 0
+        encoder_delay = data[lame + 21] << 4 | data[lame + 22] >> 4
+        encoder_padding = (data[lame + 22] & 15) << 8 | data[lame + 23]
+        return encoder_delay + DECODER_DELAY, max(encoder_padding - DECODER_DELAY, 0)
+
+    def frame_at(self, position):
+        """
+        Index of the audio frame that decoder position (delay already cut off) falls into
+        """
+        return int(np.searchsorted(self.frame_starts, position + self.delay, side="right")) - 1
+
+    def is_current(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == self.file_size and stat.st_mtime_ns == self.mtime_ns
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as fp:
+            np.savez_compressed(fp, offsets=self.offsets, frame_starts=self.frame_starts,
+                                info=np.array([self.rate, self.delay, self.num_frames, self.file_size, self.mtime_ns], dtype=np.int64))
+        os.replace(temp_path, path) # So a half written index never gets loaded
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns the index saved at path, or None if there isn't a readable one
+        """
+        try:
+            with np.load(path) as saved:
+                rate, delay, num_frames, file_size, mtime_ns = (int(value) for value in saved["info"])
+                return cls(saved["offsets"], saved["frame_starts"], rate, delay, num_frames, file_size, mtime_ns)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
@@ -0,0 +1,87 @@
+import mmap
+import os
+import struct
+from functools import lru_cache
+import numpy as np
+
+
+class MappedWavFile():
+    """
+    A WAV file's sample data memory mapped as a read only [num_frames, channels] array, so chunks can be
+    handed out as views of the file (reversed chunks as views with a negative stride) without reading or copying.
+    The OS pages the file in as chunks get used.
+
+    Only plain 16 bit PCM and 32 bit float files can be mapped like this, anything else raises ValueError.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fp:
+            file_size = os.fstat(fp.fileno()).st_size
+            riff, _, wave_id = struct.unpack("<4sI4s", fp.read(12))
+            if riff != b"RIFF" or wave_id != b"WAVE":
+                raise ValueError(f"{path} is not a WAV file")
+
+            fmt = None
+            data_offset = data_size = None
+            # Walk the chunks, we only care about "fmt " and "data"
+            while data_offset is None:
+                header = fp.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"{path} has no data chunk")
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = fp.read(chunk_size)
+                    fp.seek(chunk_size & 1, os.SEEK_CUR)
+                elif chunk_id == b"data":
+                    data_offset = fp.tell()
+                    # Files written while streaming can have a placeholder size, trust the file size over it
+                    data_size = min(chunk_size, file_size - data_offset)
+                else:
+                    fp.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+            if fmt is None:
+                raise ValueError(f"{path} has no fmt chunk")
+            format_tag, self.channels, self.rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+            if format_tag == 0xFFFE: # WAVE_FORMAT_EXTENSIBLE, the actual format is the start of the sub format GUID
+                format_tag, = struct.unpack("<H", fmt[24:26])
+
+            if format_tag == 1 and bits == 16:
+                self.dtype = np.dtype(np.int16)
+            elif format_tag == 3 and bits == 32:
+                self.dtype = np.dtype(np.float32)
+            else:
+                raise ValueError(f"Can't map {path} ({bits} bit, format {format_tag})")
+
+            self.num_frames = data_size // block_align
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.frames = np.frombuffer(self._map, dtype=self.dtype, count=self.num_frames * self.channels, offset=data_offset)
+        self.frames = self.frames.reshape(self.num_frames, self.channels)
+
+    def chunk(self, start_frame, end_frame, reverse=False):
+        """
+        View of frames start_frame to end_frame, back to front if reverse
+        """
+        view = self.frames[max(start_frame, 0):max(end_frame, 0)]
+        return view[::-1] if reverse else view
+
+
+@lru_cache(maxsize=8)
+def _open_mapped_wav(path, mtime_ns):
+    try:
+        return MappedWavFile(path)
+    except (ValueError, OSError, struct.error):
+        return None
+
+
+def open_mapped_wav(path) -> MappedWavFile | None:
+    """
+    Returns a (cached) MappedWavFile for path, or None if the file can't be mapped.
+    The cache is keyed on the modification time too, so a file that gets rewritten is mapped again
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _open_mapped_wav(path, mtime_ns)